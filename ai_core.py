@@ -1,67 +1,268 @@
-import pdfplumber
-import google.generativeai as genai
 import streamlit as st
-import faiss
 import numpy as np
 import io
 import json
-from gtts import gTTS
+import re
+import hashlib
+import zlib
+import mimetypes
+import multiprocessing
 import os
-import requests
-from PIL import Image
+import random
+import sys
+import threading
+import time
+import types
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from settings import get_setting
+from artifact_versions import TTS_BACKEND, TTS_LANGUAGE
+from rate_limit import RateLimiter
+from providers import get_embedder, get_generator
+from tracing import in_request, span, traced
+from vector_store import build_vector_index
+from database_utils import (get_cached_embeddings, add_cached_embeddings,
+                            get_cached_section_summaries, add_cached_section_summary)
+from chat_cache import get_query_embedding, find_cached_answer, store_answer
 
-# --- Configuration ---
-try:
-    genai.configure(api_key=st.secrets["GOOGLE_API_KEY"])
-except Exception:
-    pass
+# The heavy libraries (pdfplumber, faiss, requests, gTTS, PIL, the Gemini client)
+# are imported where they are used, so importing this module stays cheap and
+# pages that never read a PDF or call a model don't pay for them.
+
+# --- OCR Settings ---
+# Which OCR engine reads scanned pages: "ocr_space" (cloud) or "tesseract" (local)
+OCR_BACKEND = get_setting("OCR_BACKEND", "ocr_space")
+OCR_SPACE_URL = get_setting("OCR_SPACE_URL", "https://api.ocr.space/parse/image")
+OCR_RESOLUTION = 300
+# A page with fewer digital characters than this is treated as a scan
+MIN_DIGITAL_CHARS_PER_PAGE = get_setting("MIN_DIGITAL_CHARS_PER_PAGE", 100)
+# How many pages are sent to OCR at the same time
+OCR_CONCURRENCY = get_setting("OCR_CONCURRENCY", 4)
+# How many processes render pages to images (0 = one per CPU)
+OCR_RENDER_PROCESSES = get_setting("OCR_RENDER_PROCESSES", 0)
+OCR_MAX_RETRIES = get_setting("OCR_MAX_RETRIES", 3)
+OCR_RETRY_BACKOFF = get_setting("OCR_RETRY_BACKOFF", 1.0)
+# Pages are joined with a blank line between them
+PAGE_SEPARATOR = "\n\n"
+
+# --- Chunking Settings ---
+# Rough size of a token in English text; good enough for budgeting
+CHARS_PER_TOKEN = 4
+CHUNK_MAX_TOKENS = get_setting("CHUNK_MAX_TOKENS", 400)
+CHUNK_OVERLAP_TOKENS = get_setting("CHUNK_OVERLAP_TOKENS", 0)
+# How far back from the budget a chunk may end to land on a sentence or paragraph boundary
+CHUNK_SNAP_TOLERANCE_CHARS = get_setting("CHUNK_SNAP_TOLERANCE_CHARS", 400)
+_SENTENCE_END = re.compile(r'[.!?]["\')\]]?\s')
+
+# --- Embedding Settings ---
+# The embedder itself (Gemini API or a local model) is chosen in providers.py
+# The API accepts at most 100 texts per request; keep the payload modest too
+EMBED_BATCH_SIZE = get_setting("EMBED_BATCH_SIZE", 100)
+EMBED_MAX_BATCH_CHARS = get_setting("EMBED_MAX_BATCH_CHARS", 60000)
+EMBED_CONCURRENCY = get_setting("EMBED_CONCURRENCY", 4)
+# Embedding requests per minute across all threads (0 = no limit)
+EMBED_REQUESTS_PER_MINUTE = get_setting("EMBED_REQUESTS_PER_MINUTE", 1500)
+EMBED_MAX_RETRIES = get_setting("EMBED_MAX_RETRIES", 3)
+EMBED_RETRY_BACKOFF = get_setting("EMBED_RETRY_BACKOFF", 1.0)
+_embed_rate_limiter = RateLimiter(EMBED_REQUESTS_PER_MINUTE)
+
+# --- Generation Settings ---
+# The generation model (Gemini API or a local stub) is chosen in providers.py
+# Generation requests per minute across all threads (0 = no limit)
+GENERATION_REQUESTS_PER_MINUTE = get_setting("GENERATION_REQUESTS_PER_MINUTE", 300)
+GENERATION_MAX_RETRIES = get_setting("GENERATION_MAX_RETRIES", 3)
+GENERATION_RETRY_BACKOFF = get_setting("GENERATION_RETRY_BACKOFF", 2.0)
+_generation_rate_limiter = RateLimiter(GENERATION_REQUESTS_PER_MINUTE)
+
+# --- Page Rendering (runs in worker processes) ---
+_render_pdf = None
+
+def _init_render_worker(pdf_path):
+    # Each worker process opens the PDF once and keeps it for all its pages
+    global _render_pdf
+    import pdfplumber
+    _render_pdf = pdfplumber.open(pdf_path)
+
+def _render_page_png(page_index, resolution):
+    with io.BytesIO() as image_bytes:
+        _render_pdf.pages[page_index].to_image(resolution=resolution).save(image_bytes, format="PNG")
+        return image_bytes.getvalue()
+
+# --- OCR Backends ---
+def ocr_image_with_retry(image_bytes, api_key, filename="page.png", max_retries=None, backoff=None):
+    """
+    Sends one image to OCR.space and returns its text.
+    Network errors, rate limits (429) and server errors (5xx) are retried with
+    exponential backoff. Raises RuntimeError if OCR.space reports a processing error.
+    """
+    import requests
+    max_retries = OCR_MAX_RETRIES if max_retries is None else max_retries
+    backoff = OCR_RETRY_BACKOFF if backoff is None else backoff
+    mime_type = mimetypes.guess_type(filename)[0] or 'image/png'
+    for attempt in range(max_retries + 1):
+        try:
+            r = requests.post(OCR_SPACE_URL,
+                              files={'filename': (filename, image_bytes, mime_type)},
+                              data={'isOverlayRequired': False, 'apikey': api_key, 'language': 'eng'},
+                              timeout=120)
+            if r.status_code == 429 or r.status_code >= 500:
+                raise requests.HTTPError(f"OCR.space returned HTTP {r.status_code}", response=r)
+            r.raise_for_status()
+            result = r.json()
+            break
+        except (requests.ConnectionError, requests.Timeout, requests.HTTPError) as e:
+            retryable = e.response is None or e.response.status_code == 429 or e.response.status_code >= 500
+            if not retryable or attempt == max_retries:
+                raise
+            # Back off 1x, 2x, 4x ... with a little jitter so workers don't retry in lockstep
+            time.sleep(backoff * (2 ** attempt) * (1 + random.random() * 0.25))
+
+    if result.get('IsErroredOnProcessing'):
+        raise RuntimeError(result.get('ErrorMessage'))
+    return result.get('ParsedResults')[0].get('ParsedText') or ""
+
+def ocr_image_with_tesseract(image_bytes):
+    """
+    Reads one image with a local Tesseract install. Needs the `tesseract` binary on PATH.
+    """
+    import pytesseract
+    from PIL import Image
+    with Image.open(io.BytesIO(image_bytes)) as image:
+        return pytesseract.image_to_string(image, lang='eng')
+
+def ocr_image(image_bytes, filename="page.png", backend=None):
+    """
+    Returns the text in an image using the configured OCR backend.
+    Raises on failure so callers can decide how to report it.
+    """
+    backend = backend or OCR_BACKEND
+    if backend == "tesseract":
+        return ocr_image_with_tesseract(image_bytes)
+    if backend == "ocr_space":
+        return ocr_image_with_retry(image_bytes, get_setting("OCR_SPACE_API_KEY"), filename)
+    raise ValueError(f"Unknown OCR backend: {backend}")
+
+_spawn_lock = threading.Lock()
+
+def _submit_render(render_pool, *args):
+    """
+    Submits a page to the render pool, which starts its processes on demand.
+    A spawned process first re-runs the parent's __main__ module, and under
+    Streamlit that is the page script currently running. So while the pool may
+    be starting one, __main__ is an empty module; the workers only need ai_core.
+    """
+    with _spawn_lock:
+        main_module = sys.modules["__main__"]
+        placeholder = sys.modules["__main__"] = types.ModuleType("__main__")
+        try:
+            return render_pool.submit(_render_page_png, *args)
+        finally:
+            # Streamlit may have started another script run meanwhile; keep its module then
+            if sys.modules["__main__"] is placeholder:
+                sys.modules["__main__"] = main_module
+
+def _render_and_ocr(render_pool, page_index, backend, progress=None):
+    try:
+        with span("pdf.render_page", page=page_index) as s:
+            image_bytes = _submit_render(render_pool, page_index, OCR_RESOLUTION).result()
+            s.set(bytes=len(image_bytes))
+        if progress is not None:
+            progress.add("pages_rendered")
+        with span("ocr.page", page=page_index, backend=backend or OCR_BACKEND, bytes=len(image_bytes)) as s:
+            text = ocr_image(image_bytes, backend=backend)
+            s.set(chars=len(text))
+        if progress is not None:
+            progress.add("pages_ocrd")
+        return text, None
+    except Exception as e:
+        return "", str(e)
 
 # --- CORE FUNCTIONS ---
 
+def iter_pdf_pages(pdf_path, concurrency=None, render_processes=None, backend=None, progress=None):
+    """
+    Yields (page_index, text, error) for every page of a PDF, in page order, as soon
+    as each page is ready.
+    Every page gets a fast digital read. Pages with too little digital text (scans,
+    image-only figures) are rendered in a process pool and sent to OCR through a pool
+    of `concurrency` threads while the following pages are still being read.
+    Reading never runs more than a few pages ahead of the consumer, so memory stays
+    bounded however long the document is.
+    `progress`, if given, is told about pages_total, pages_read, pages_rendered and
+    pages_ocrd through its set(name, value) and add(name) methods.
+    """
+    import pdfplumber
+    concurrency = max(1, concurrency or OCR_CONCURRENCY)
+    render_processes = render_processes or OCR_RENDER_PROCESSES or os.cpu_count() or 1
+    max_pages_ahead = concurrency * 2
+    render_pool = None
+    ocr_pool = ThreadPoolExecutor(max_workers=concurrency)
+    pending = deque()
+
+    def finish(page_index, digital_text, future):
+        if future is None:
+            return page_index, digital_text, None
+        ocr_text, error = future.result()
+        # Keep whatever little digital text there was if OCR found nothing better
+        if len(ocr_text.strip()) > len(digital_text.strip()):
+            return page_index, ocr_text, error
+        return page_index, digital_text, error
+
+    try:
+        with pdfplumber.open(pdf_path) as pdf:
+            if progress is not None:
+                progress.set("pages_total", len(pdf.pages))
+            for i, page in enumerate(pdf.pages):
+                with span("pdf.read_page", page=i) as s:
+                    page_text = page.extract_text(x_tolerance=2, layout=True) or ""
+                    s.set(chars=len(page_text))
+                if progress is not None:
+                    progress.add("pages_read")
+                future = None
+                if len(page_text.strip()) < MIN_DIGITAL_CHARS_PER_PAGE:
+                    if render_pool is None:
+                        # Only documents that actually contain scans pay for starting processes.
+                        # Spawned, not forked: this process runs threads (OCR, workers, tracing)
+                        # whose locks a fork would copy in whatever state they are in.
+                        # See _submit_render for how the workers avoid re-running a page script.
+                        render_pool = ProcessPoolExecutor(max_workers=render_processes,
+                                                          mp_context=multiprocessing.get_context("spawn"),
+                                                          initializer=_init_render_worker, initargs=(pdf_path,))
+                    future = ocr_pool.submit(in_request(_render_and_ocr), render_pool, i, backend, progress)
+                page.close()
+                pending.append((i, page_text, future))
+
+                # Hand back finished pages from the front; wait if we are too far ahead
+                while pending and (pending[0][2] is None or pending[0][2].done() or len(pending) > max_pages_ahead):
+                    yield finish(*pending.popleft())
+
+        while pending:
+            yield finish(*pending.popleft())
+    finally:
+        for _, _, future in pending:
+            if future is not None:
+                future.cancel()
+        ocr_pool.shutdown(wait=True)
+        if render_pool is not None:
+            render_pool.shutdown(wait=True)
+
+@traced("extract_text_from_pdf")
 def extract_text_from_pdf(pdf_path):
     """
-    The ultimate text extraction function. It tries a digital read first.
-    If that fails, it uses the Cloud OCR API page by page.
+    The ultimate text extraction function. Every page gets a digital read first.
+    Only pages with too little digital text (scans, image-only figures) are sent
+    to OCR, several at a time; all other pages keep their digital text.
     """
     print(f"Attempting to read document: {pdf_path}")
-    full_text = ""
     try:
-        with pdfplumber.open(pdf_path) as pdf:
-            # First, try the fast, digital method
-            for page in pdf.pages:
-                page_text = page.extract_text(x_tolerance=2, layout=True)
-                if page_text:
-                    full_text += page_text + "\n"
-            
-            # If digital text is very short, assume it's a scan. Use Cloud OCR.
-            if len(full_text.strip()) < 100 * len(pdf.pages):
-                print("Digital text seems minimal. Attempting Cloud OCR fallback page by page...")
-                full_text = "" # Reset text
-                api_key = st.secrets["OCR_SPACE_API_KEY"]
-                
-                for i, page in enumerate(pdf.pages):
-                    # Convert the page to an image in memory
-                    with io.BytesIO() as image_bytes:
-                        page.to_image(resolution=300).save(image_bytes, format="PNG")
-                        image_bytes.seek(0)
-                        
-                        # --- THIS IS THE FIX ---
-                        # We now send a proper filename with the image data.
-                        r = requests.post('https://api.ocr.space/parse/image',
-                                          files={'filename': ('page.png', image_bytes, 'image/png')},
-                                          data={'isOverlayRequired': False, 'apikey': api_key, 'language': 'eng'})
-                        
-                        r.raise_for_status()
-                        result = r.json()
-                        
-                        if result.get('IsErroredOnProcessing'):
-                            st.error(f"OCR Error on page {i+1}: {result.get('ErrorMessage')}")
-                            continue
-                        
-                        page_ocr_text = result.get('ParsedResults')[0].get('ParsedText')
-                        if page_ocr_text:
-                            full_text += page_ocr_text + "\n\n"
-                            
+        page_texts = []
+        for i, page_text, error in iter_pdf_pages(pdf_path):
+            if error:
+                st.error(f"OCR Error on page {i+1}: {error}")
+            if page_text.strip():
+                page_texts.append(page_text)
+        full_text = PAGE_SEPARATOR.join(page_texts)
+
     except Exception as e:
         st.error(f"Error processing PDF: {e}")
         return None
@@ -75,18 +276,9 @@ def extract_text_from_pdf(pdf_path):
 # --- Other functions remain the same ---
 def extract_text_from_image(image_file_bytes, filename):
     try:
-        api_key = st.secrets["OCR_SPACE_API_KEY"]
-        payload = {'isOverlayRequired': False, 'apikey': api_key, 'language': 'eng'}
-        files_data = {filename: image_file_bytes}
-        r = requests.post('https://api.ocr.space/parse/image', files=files_data, data=payload)
-        r.raise_for_status()
-        result = r.json()
-        if result.get('IsErroredOnProcessing'):
-            st.error(f"OCR Error: {result.get('ErrorMessage')}")
-            return None
-        return result.get('ParsedResults')[0].get('ParsedText')
+        return ocr_image(image_file_bytes, filename)
     except Exception as e:
-        st.error(f"Error during API call to OCR.space: {e}")
+        st.error(f"Error during OCR: {e}")
         return None
 
 def split_text_into_chunks(text, chunk_size=1500, chunk_overlap=200):
@@ -99,83 +291,676 @@ def split_text_into_chunks(text, chunk_size=1500, chunk_overlap=200):
         start += chunk_size - chunk_overlap
     return chunks
 
+def _find_chunk_end(text, max_chars, tolerance_chars):
+    """
+    Picks where a chunk starting at text[0] should end: the last paragraph break,
+    else the last sentence end, else the last space within `tolerance_chars` before
+    `max_chars`. Falls back to a hard cut at `max_chars`.
+    """
+    if len(text) <= max_chars:
+        return len(text)
+    window_start = max(1, max_chars - tolerance_chars)
+    window = text[window_start:max_chars]
+    paragraph = window.rfind("\n\n")
+    if paragraph != -1:
+        return window_start + paragraph
+    sentence_ends = [m.end() for m in _SENTENCE_END.finditer(window)]
+    if sentence_ends:
+        return window_start + sentence_ends[-1]
+    space = max(window.rfind(" "), window.rfind("\n"))
+    if space != -1:
+        return window_start + space
+    return max_chars
+
+def _skip_whitespace(text, position):
+    while position < len(text) and text[position].isspace():
+        position += 1
+    return position
+
+def iter_chunk_spans(pages, max_tokens=None, overlap_tokens=None, tolerance_chars=None):
+    """
+    Cuts a document into chunks without copying it, page by page.
+    Takes (page_number, page_text) pairs and yields (start, end, page_number, text)
+    for each chunk, where start/end are offsets into the pages joined with
+    PAGE_SEPARATOR (blank pages skipped) and page_number is where the chunk starts.
+    Chunks are budgeted by approximate token count (CHARS_PER_TOKEN) and end on a
+    paragraph or sentence boundary when there is one within `tolerance_chars` of
+    the budget. Only about one page plus one chunk of text is held at a time.
+    """
+    max_chars = (max_tokens or CHUNK_MAX_TOKENS) * CHARS_PER_TOKEN
+    overlap_chars = (CHUNK_OVERLAP_TOKENS if overlap_tokens is None else overlap_tokens) * CHARS_PER_TOKEN
+    tolerance_chars = tolerance_chars or CHUNK_SNAP_TOLERANCE_CHARS
+
+    buffer = ""
+    buffer_offset = 0  # offset of buffer[0] in the joined text
+    page_starts = []   # (offset, page_number) for every page still in the buffer
+    text_length = 0
+
+    def page_at(offset):
+        for start, page_number in reversed(page_starts):
+            if start <= offset:
+                return page_number
+        return page_starts[0][1]
+
+    def cut(final):
+        nonlocal buffer, buffer_offset
+        while buffer and (final or len(buffer) > max_chars):
+            end = _find_chunk_end(buffer, max_chars, tolerance_chars)
+            chunk_text = buffer[:end].rstrip()
+            if chunk_text:
+                yield (buffer_offset, buffer_offset + len(chunk_text), page_at(buffer_offset), chunk_text)
+            # Step back by the overlap (to a word start), but always move forward
+            next_start = end
+            if overlap_chars and end < len(buffer):
+                space = buffer.find(" ", max(1, end - overlap_chars), end)
+                next_start = space if space != -1 else end
+            next_start = _skip_whitespace(buffer, next_start)
+            buffer = buffer[next_start:]
+            buffer_offset += next_start
+            while len(page_starts) > 1 and page_starts[1][0] <= buffer_offset:
+                page_starts.pop(0)
+
+    for page_number, page_text in pages:
+        if not page_text.strip():
+            continue
+        if text_length:
+            buffer += PAGE_SEPARATOR
+            text_length += len(PAGE_SEPARATOR)
+        page_starts.append((text_length, page_number))
+        buffer += page_text
+        text_length += len(page_text)
+        # Leading whitespace of the document never starts a chunk
+        if buffer_offset == 0 and buffer[:1].isspace():
+            skip = _skip_whitespace(buffer, 0)
+            buffer = buffer[skip:]
+            buffer_offset = skip
+        yield from cut(final=False)
+    yield from cut(final=True)
+
+def split_text_into_spans(text, **options):
+    """
+    Chunks an in-memory text as a single page. Returns a list of (start, end, page_number)
+    spans; for text that is still in pages, use iter_chunk_spans to get page numbers.
+    """
+    return [(start, end, page_number) for start, end, page_number, _ in iter_chunk_spans([(0, text)], **options)]
+
+def _split_into_batches(items, text_length=len):
+    # Respect both the per-request item limit and a payload size limit
+    batches, batch, batch_chars = [], [], 0
+    for item in items:
+        item_chars = text_length(item)
+        if batch and (len(batch) >= EMBED_BATCH_SIZE or batch_chars + item_chars > EMBED_MAX_BATCH_CHARS):
+            batches.append(batch)
+            batch, batch_chars = [], 0
+        batch.append(item)
+        batch_chars += item_chars
+    if batch:
+        batches.append(batch)
+    return batches
+
+def _error_status(error):
+    """The HTTP status of an API error, if it carries one."""
+    code = getattr(error, "code", None)
+    if isinstance(code, int):
+        return code
+    return getattr(getattr(error, "response", None), "status_code", None)
+
+def _is_transient_error(error):
+    """
+    Rate limits (429), server errors (5xx), connection failures and timeouts
+    are worth retrying; anything else (bad key, bad request...) fails the same way again.
+    """
+    import requests
+    status = _error_status(error)
+    if status is not None:
+        return status == 429 or status >= 500
+    return isinstance(error, (ConnectionError, TimeoutError, requests.ConnectionError, requests.Timeout))
+
+_PAYLOAD_ERROR = re.compile(r"too large|too long|too many|payload|size|exceed", re.IGNORECASE)
+
+def _is_payload_error(error):
+    """Errors that mean the request was too big, so a smaller one could succeed."""
+    status = _error_status(error)
+    return status == 413 or (status == 400 and bool(_PAYLOAD_ERROR.search(str(error))))
+
+@traced("embed.batch")
+def _embed_batch(texts, task_type):
+    """
+    Embeds one batch. Transient errors are retried with backoff. If the request
+    was too large the batch is split in half and each half sent on its own.
+    Any other error is raised at once, so a bad key or a used-up quota fails
+    the upload straight away instead of after minutes of retries.
+    """
+    embedder = get_embedder()
+    for attempt in range(EMBED_MAX_RETRIES + 1):
+        try:
+            if embedder.remote:
+                _embed_rate_limiter.acquire()
+            return embedder.embed(texts, task_type)
+        except Exception as e:
+            if _is_payload_error(e) and len(texts) > 1:
+                break
+            if not _is_transient_error(e) or attempt == EMBED_MAX_RETRIES:
+                raise
+            time.sleep(EMBED_RETRY_BACKOFF * (2 ** attempt) * (1 + random.random() * 0.25))
+
+    middle = len(texts) // 2
+    return _embed_batch(texts[:middle], task_type) + _embed_batch(texts[middle:], task_type)
+
+def embed_texts(texts, task_type="retrieval_document"):
+    """
+    Embeds a list of texts and returns one vector per text. Raises on failure.
+    Vectors are looked up in the persistent embedding cache first, keyed by
+    (embedder name, task_type, hash of the text). Only the missing texts are sent,
+    split into size-limited batches that run concurrently under a rate limit (one
+    at a time for local embedders). Each batch is cached as soon as it succeeds,
+    so a failed upload never pays for them again.
+    """
+    embedder = get_embedder()
+    model = embedder.name
+    with span("embed.texts", model=model, task_type=task_type, texts=len(texts)) as s:
+        return _embed_texts(texts, task_type, embedder, model, s)
+
+def _embed_texts(texts, task_type, embedder, model, trace):
+    text_hashes = [hashlib.sha256(text.encode("utf-8")).hexdigest() for text in texts]
+    vectors = {text_hash: np.frombuffer(blob, dtype='float32').tolist()
+               for text_hash, blob in get_cached_embeddings(model, task_type, list(set(text_hashes))).items()}
+
+    # Identical texts (repeated boilerplate) are only embedded once
+    missing = {}
+    for text_hash, text in zip(text_hashes, texts):
+        if text_hash not in vectors:
+            missing.setdefault(text_hash, text)
+    trace.set(cache_hits=len(vectors), cache_misses=len(missing))
+
+    if missing:
+        def embed_and_cache(batch_hashes):
+            embeddings = _embed_batch([missing[h] for h in batch_hashes], task_type)
+            add_cached_embeddings(model, task_type,
+                                  [(h, np.asarray(e, dtype='float32').tobytes()) for h, e in zip(batch_hashes, embeddings)])
+            return batch_hashes, embeddings
+
+        hash_batches = _split_into_batches(list(missing), lambda h: len(missing[h]))
+        with ThreadPoolExecutor(max_workers=EMBED_CONCURRENCY if embedder.remote else 1) as pool:
+            for batch_hashes, embeddings in pool.map(in_request(embed_and_cache), hash_batches):
+                vectors.update(zip(batch_hashes, embeddings))
+
+    return [vectors[text_hash] for text_hash in text_hashes]
+
+def faiss_index_to_bytes(index):
+    import faiss
+    with io.BytesIO() as bio:
+        faiss.write_index(index, faiss.PyCallbackIOWriter(bio.write))
+        return bio.getvalue()
+
+def faiss_index_from_bytes(faiss_index_data):
+    import faiss
+    return faiss.read_index(faiss.PyCallbackIOReader(io.BytesIO(faiss_index_data).read))
+
 def create_embeddings(text_chunks):
     if not text_chunks: return None
     try:
-        result = genai.embed_content(model="models/embedding-001", content=text_chunks, task_type="retrieval_document")
-        embeddings = result['embedding']
-        dimension = len(embeddings[0])
-        index = faiss.IndexFlatL2(dimension)
-        index.add(np.array(embeddings).astype('float32'))
-        with io.BytesIO() as bio:
-            faiss.write_index(index, faiss.PyCallbackIOWriter(bio.write))
-            return bio.getvalue()
+        embeddings = embed_texts(text_chunks)
+        index, _ = build_vector_index(np.array(embeddings).astype('float32'))
+        return faiss_index_to_bytes(index)
     except Exception:
         return None
 
-def get_chat_response(faiss_index_data, user_question, text_chunks):
-    try:
-        index = faiss.read_index(faiss.PyCallbackIOReader(io.BytesIO(faiss_index_data).read))
-        question_embedding_result = genai.embed_content(model='models/embedding-001', content=user_question, task_type="retrieval_query")
-        question_embedding = question_embedding_result['embedding']
-        distances, indices = index.search(np.array([question_embedding]).astype('float32'), k=5)
-        context = ""
-        for i in indices[0]:
-            if i >= 0 and i < len(text_chunks):
-                context += text_chunks[i] + "\n\n"
-        prompt = f"""
+# --- Context assembly ---
+# Candidates fetched from the index; the token budget decides how many make it into the prompt
+CONTEXT_TOP_K = get_setting("CONTEXT_TOP_K", 8)
+CONTEXT_MAX_TOKENS = get_setting("CONTEXT_MAX_TOKENS", 1500)
+# Word-trigram overlap above which a hit is treated as a repeat of one already kept
+CONTEXT_DUPLICATE_THRESHOLD = get_setting("CONTEXT_DUPLICATE_THRESHOLD", 0.8)
+# Neighbouring chunks from split_text_into_chunks share this many characters
+LEGACY_CHUNK_OVERLAP = 200
+
+def estimate_tokens(text):
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+def _join_overlapping(left, right, max_overlap=LEGACY_CHUNK_OVERLAP):
+    """
+    Joins two neighbouring chunks, writing the text they share only once.
+    """
+    for size in range(min(len(left), len(right), max_overlap), 0, -1):
+        if left.endswith(right[:size]):
+            return left + right[size:]
+    return left + "\n\n" + right
+
+def _shingles(text):
+    words = text.lower().split()
+    return {" ".join(words[i:i + 3]) for i in range(max(1, len(words) - 2))}
+
+def _merge_hits(hits, text_chunks):
+    """
+    Groups hits on neighbouring chunks into one contiguous passage each.
+    `hits` is a list of (chunk_id, distance). Returns a list of dicts with the
+    passage's chunk ids, text and best (smallest) distance.
+    """
+    groups = []
+    for chunk_id, distance in sorted(hits):
+        last = groups[-1] if groups else None
+        if last is not None and chunk_id == last["ids"][-1] + 1:
+            last["ids"].append(chunk_id)
+            last["distance"] = min(last["distance"], distance)
+            if hasattr(text_chunks, "span"):
+                # Span chunks are contiguous, so the passage is one slice of the text
+                start, _ = text_chunks.span(last["ids"][0])
+                _, end = text_chunks.span(chunk_id)
+                last["text"] = text_chunks.full_text[start:end]
+            else:
+                last["text"] = _join_overlapping(last["text"], text_chunks[chunk_id])
+        else:
+            groups.append({"ids": [chunk_id], "text": text_chunks[chunk_id], "distance": distance})
+    return groups
+
+def assemble_context(hits, text_chunks, max_tokens=None, duplicate_threshold=None):
+    """
+    Turns search hits into the context for a prompt. Neighbouring hits are merged
+    into one passage (so overlapping text appears once), passages that mostly repeat
+    a better one are dropped, and the best passages are added until `max_tokens`
+    is reached. The chosen passages are returned in document order.
+    Returns (context, chunk_ids, stats).
+    """
+    max_tokens = max_tokens or CONTEXT_MAX_TOKENS
+    duplicate_threshold = duplicate_threshold or CONTEXT_DUPLICATE_THRESHOLD
+
+    kept, kept_shingles, tokens = [], [], 0
+    duplicates = over_budget = 0
+    for group in sorted(_merge_hits(hits, text_chunks), key=lambda g: g["distance"]):
+        shingles = _shingles(group["text"])
+        if any(len(shingles & other) / len(shingles | other) >= duplicate_threshold for other in kept_shingles):
+            duplicates += 1
+            continue
+        group_tokens = estimate_tokens(group["text"])
+        if tokens + group_tokens > max_tokens:
+            if kept:
+                over_budget += 1
+                continue
+            # Even the best passage is too long: keep as much of it as fits
+            group["text"] = group["text"][:max_tokens * CHARS_PER_TOKEN]
+            group_tokens = estimate_tokens(group["text"])
+        kept.append(group)
+        kept_shingles.append(shingles)
+        tokens += group_tokens
+
+    kept.sort(key=lambda g: g["ids"][0])
+    context = "\n\n".join(group["text"] for group in kept)
+    chunk_ids = sorted(chunk_id for group in kept for chunk_id in group["ids"])
+    stats = {"hits": len(hits), "passages": len(kept), "duplicates_dropped": duplicates,
+             "over_budget_dropped": over_budget, "context_tokens": estimate_tokens(context)}
+    return context, chunk_ids, stats
+
+def embed_query(question, dimension=None, embedding_model=None):
+    """
+    Returns the embedding for a search question, through the query-embedding cache.
+    Raises ValueError if the searched index was built by another embedder: its
+    `embedding_model` name (when recorded) or its `dimension` doesn't match the current one.
+    """
+    embedder = get_embedder()
+    if embedding_model is not None and embedding_model != embedder.name:
+        raise ValueError(f"This index was built with a different embedding model ({embedding_model}, "
+                         f"now {embedder.name}). Please upload the document again.")
+    if dimension is not None and dimension != embedder.dimension:
+        raise ValueError(f"This index was built with a different embedding model ({dimension} dimensions, "
+                         f"{embedder.name} makes {embedder.dimension}). Please upload the document again.")
+    with span("embed.query", model=embedder.name, cache_hit=True) as s:
+        def embed(q):
+            s.set(cache_hit=False)
+            return embed_texts([q], task_type="retrieval_query")[0]
+        return get_query_embedding(question, embed, model=embedder.name)
+
+def _retrieve_context(faiss_index, user_question, text_chunks, embedding_model=None):
+    """
+    Embeds the question (through the query-embedding cache), fetches the top
+    CONTEXT_TOP_K chunks and assembles them into a deduplicated, budgeted context.
+    Returns (question_embedding, chunk_ids, context, context_stats).
+    """
+    index = faiss_index_from_bytes(faiss_index) if isinstance(faiss_index, bytes) else faiss_index
+    question_embedding = embed_query(user_question, index.d, embedding_model)
+    with span("faiss.search", k=CONTEXT_TOP_K, vectors=index.ntotal):
+        distances, indices = index.search(question_embedding.reshape(1, -1), k=CONTEXT_TOP_K)
+    hits = [(int(i), float(d)) for i, d in zip(indices[0], distances[0]) if i >= 0 and i < len(text_chunks)]
+    with span("context.assemble", hits=len(hits)) as s:
+        context, chunk_ids, context_stats = assemble_context(hits, text_chunks)
+        s.set(chunks=len(chunk_ids), tokens=context_stats["context_tokens"])
+    return question_embedding, chunk_ids, context, context_stats
+
+def _chat_prompt(context, user_question):
+    return f"""
         Answer the following user question based ONLY on the provided context. If the answer is not available in the context, clearly say "I could not find the answer in the document."
         CONTEXT: {context}
         USER QUESTION: {user_question}
         """
-        model = genai.GenerativeModel('gemini-1.5-flash-latest')
-        response = model.generate_content(prompt)
-        return response.text, context
+
+def get_chat_response(faiss_index, user_question, text_chunks, cache_key=None, embedding_model=None):
+    """
+    Answers a question from the document. `faiss_index` can be a loaded index
+    (preferred, see working_set.py) or the serialized bytes from the database;
+    `embedding_model` is the name of the embedder that built it, if recorded.
+    Query embeddings are cached by normalized question. When `cache_key` (the
+    document's working-set key) is given, an answer to a near-identical question
+    that retrieved the same chunks is reused instead of calling the model again.
+    """
+    try:
+        question_embedding, chunk_ids, context, _ = _retrieve_context(faiss_index, user_question, text_chunks,
+                                                                      embedding_model)
+
+        if cache_key is not None:
+            cached = find_cached_answer(cache_key, chunk_ids, question_embedding)
+            if cached:
+                return cached
+
+        prompt = _chat_prompt(context, user_question)
+        with span("generate.answer", model=get_generator().name, prompt_tokens=estimate_tokens(prompt)):
+            answer = get_generator().generate(prompt)
+
+        if cache_key is not None:
+            store_answer(cache_key, chunk_ids, question_embedding, answer, context)
+        return answer, context
     except Exception as e:
         return f"An error occurred during chat: {e}", ""
 
-def generate_insights(full_text):
-    truncated_text = full_text[:15000]
-    prompt = f"""
-    Analyze the following document text and provide a structured analysis in JSON format.
-    The JSON object should have the following keys:
-    - "one_sentence_summary": A single, concise sentence that summarizes the entire document.
-    - "key_concepts": A list of 5 to 7 of the most important keywords or concepts found in the text.
-    - "main_arguments": A brief summary (2-3 sentences) of the main purpose, arguments, or findings presented in the document.
-    Here is the document text:
+def stream_chat_response(faiss_index, user_question, text_chunks, cache_key=None, embedding_model=None):
+    """
+    The streaming version of get_chat_response.
+    Returns (pieces, stats): `pieces` is a generator of answer text that yields
+    tokens as the model produces them (pass it to st.write_stream), and `stats`
+    is a dict the generator fills in as it runs: context, cached,
+    retrieval_seconds, time_to_first_token and total_seconds, plus the estimated
+    prompt_tokens and context_tokens and the assemble_context counts.
+    The assembled answer is stored in the answer cache once the stream finishes.
+    """
+    stats = {"context": "", "cached": False, "retrieval_seconds": None,
+             "time_to_first_token": None, "total_seconds": None,
+             "prompt_tokens": None, "context_tokens": None}
+
+    def pieces():
+        started_at = time.perf_counter()
+        try:
+            question_embedding, chunk_ids, context, context_stats = _retrieve_context(
+                faiss_index, user_question, text_chunks, embedding_model)
+            prompt = _chat_prompt(context, user_question)
+            stats.update(context_stats)
+            stats["context"] = context
+            stats["prompt_tokens"] = estimate_tokens(prompt)
+            stats["retrieval_seconds"] = time.perf_counter() - started_at
+
+            cached = find_cached_answer(cache_key, chunk_ids, question_embedding) if cache_key is not None else None
+            if cached:
+                stats["cached"] = True
+                stats["time_to_first_token"] = time.perf_counter() - started_at
+                yield cached[0]
+                return
+
+            parts = []
+            with span("generate.stream", model=get_generator().name, prompt_tokens=stats["prompt_tokens"]) as s:
+                for text in get_generator().stream(prompt):
+                    if stats["time_to_first_token"] is None:
+                        stats["time_to_first_token"] = time.perf_counter() - started_at
+                        s.set(time_to_first_token_ms=stats["time_to_first_token"] * 1000)
+                    parts.append(text)
+                    yield text
+
+            if cache_key is not None and parts:
+                store_answer(cache_key, chunk_ids, question_embedding, "".join(parts), context)
+        except Exception as e:
+            yield f"An error occurred during chat: {e}"
+        finally:
+            stats["total_seconds"] = time.perf_counter() - started_at
+
+    return pieces(), stats
+
+# --- Document summarization (map-reduce) ---
+# Long documents are cut into sections that are summarized concurrently,
+# then the summaries stand in for the document in the final prompt
+SUMMARY_SECTION_TOKENS = get_setting("SUMMARY_SECTION_TOKENS", 3000)
+SUMMARY_CONCURRENCY = get_setting("SUMMARY_CONCURRENCY", 4)
+# Text longer than this is summarized (again) before the final prompt
+SUMMARY_REDUCE_MAX_TOKENS = get_setting("SUMMARY_REDUCE_MAX_TOKENS", 6000)
+# Bump when the section prompt changes, so old cached summaries are not reused
+SUMMARY_PROMPT_VERSION = 1
+# Sections may only end after a line or a sentence
+_SECTION_UNIT = re.compile(r"(?<=\n)|(?<=[.!?] )")
+
+def generate_text(prompt):
+    """
+    Sends one prompt to the generation provider under the shared rate limit,
+    retrying transient errors with backoff. Returns the response text. Raises on failure.
+    """
+    generator = get_generator()
+    for attempt in range(GENERATION_MAX_RETRIES + 1):
+        if generator.remote:
+            _generation_rate_limiter.acquire()
+        try:
+            with span("generate.text", model=generator.name, prompt_tokens=estimate_tokens(prompt), attempt=attempt):
+                return generator.generate(prompt)
+        except Exception as e:
+            # A bad key, a bad request or a blocked response fails the same way again
+            if not _is_transient_error(e) or attempt == GENERATION_MAX_RETRIES:
+                raise
+            time.sleep(GENERATION_RETRY_BACKOFF * (2 ** attempt) * (1 + random.random() * 0.25))
+
+def split_into_sections(text, target_tokens=None):
+    """
+    Splits a document into sections of about `target_tokens` for summarizing.
+    Where a section ends is decided by a hash of the line or sentence it ends on
+    rather than by position, so after a small edit the sections resynchronize and
+    everything away from the edit keeps its cached summary.
+    """
+    target_chars = (target_tokens or SUMMARY_SECTION_TOKENS) * CHARS_PER_TOKEN
+    min_chars, max_chars = target_chars // 2, target_chars * 2
+    sections, current, current_length = [], [], 0
+    for unit in _SECTION_UNIT.split(text):
+        # A run with no line or sentence break is cut at max_chars
+        for piece in (unit[i:i + max_chars] for i in range(0, len(unit), max_chars)):
+            current.append(piece)
+            current_length += len(piece)
+            # Each piece ends a section with a chance proportional to its length,
+            # which makes sections average about target_chars
+            at_boundary = (current_length >= min_chars
+                           and zlib.crc32(piece.encode("utf-8")) % min_chars < len(piece))
+            if at_boundary or current_length >= max_chars:
+                sections.append("".join(current))
+                current, current_length = [], 0
+    if current:
+        sections.append("".join(current))
+    return [section for section in sections if section.strip()]
+
+def _section_prompt(section):
+    return f"""
+    You are summarizing one section of a longer document. Write a dense summary of about 150 words
+    that keeps the section's key terms, claims, methods and findings. Do not add an introduction.
+    SECTION TEXT:
     ---
-    {truncated_text}
+    {section}
     ---
     """
+
+def summarize_sections(sections):
+    """
+    The map step: returns one summary per section, in order. Summaries are cached
+    by (model, prompt version, section hash), and the missing ones are generated
+    concurrently under the generation rate limit.
+    """
+    section_hashes = [hashlib.sha256(section.encode("utf-8")).hexdigest() for section in sections]
+    summaries = get_cached_section_summaries(get_generator().name, SUMMARY_PROMPT_VERSION, list(set(section_hashes)))
+    missing = {}
+    for section_hash, section in zip(section_hashes, sections):
+        if section_hash not in summaries:
+            missing.setdefault(section_hash, section)
+
+    def summarize(item):
+        section_hash, section = item
+        summary = generate_text(_section_prompt(section)).strip()
+        add_cached_section_summary(get_generator().name, SUMMARY_PROMPT_VERSION, section_hash, summary)
+        return section_hash, summary
+
+    with span("summarize.sections", sections=len(sections), cache_hits=len(sections) - len(missing),
+              cache_misses=len(missing)), ThreadPoolExecutor(max_workers=SUMMARY_CONCURRENCY) as pool:
+        summaries.update(pool.map(in_request(summarize), missing.items()))
+    return [summaries[section_hash] for section_hash in section_hashes]
+
+def summarize_document(full_text):
+    """
+    Condenses a whole document into text that fits one prompt: the text itself
+    when it is short enough, otherwise its section summaries in order (summarized
+    again, level by level, until they fit SUMMARY_REDUCE_MAX_TOKENS).
+    """
+    text = full_text
+    while estimate_tokens(text) > SUMMARY_REDUCE_MAX_TOKENS:
+        condensed = "\n\n".join(summarize_sections(split_into_sections(text)))
+        if len(condensed) >= len(text):
+            # The summaries stopped getting shorter; send what fits
+            return condensed[:SUMMARY_REDUCE_MAX_TOKENS * CHARS_PER_TOKEN]
+        text = condensed
+    return text
+
+# --- Text to speech ---
+# TTS_BACKEND and TTS_LANGUAGE are in artifact_versions.py, since stored audio is keyed by them
+TTS_URL = get_setting("TTS_URL", "http://127.0.0.1:8767/tts")
+AUDIO_FOLDER = "audio_summaries"
+# Synthesized segments are kept here by hash, so unchanged sentences are never re-rendered
+AUDIO_SEGMENT_FOLDER = os.path.join(AUDIO_FOLDER, "segments")
+# Segments are cut at sentence ends; the first one is short so playback can start sooner
+TTS_SEGMENT_CHARS = get_setting("TTS_SEGMENT_CHARS", 500)
+TTS_FIRST_SEGMENT_CHARS = get_setting("TTS_FIRST_SEGMENT_CHARS", 150)
+TTS_CONCURRENCY = get_setting("TTS_CONCURRENCY", 4)
+TTS_MAX_RETRIES = get_setting("TTS_MAX_RETRIES", 3)
+TTS_RETRY_BACKOFF = get_setting("TTS_RETRY_BACKOFF", 1.0)
+# One MPEG-1 Layer III frame (128 kbit/s, 44.1 kHz, mono) with no audio data: 26 ms of silence
+_SILENT_MP3_FRAME = b"\xff\xfb\x90\xc4" + bytes(413)
+
+def split_into_speech_segments(text, max_chars=None, first_max_chars=None):
+    """
+    Splits text into segments of whole sentences for synthesis. A sentence longer
+    than a segment gets a segment of its own.
+    """
+    max_chars = max_chars or TTS_SEGMENT_CHARS
+    limit = first_max_chars or TTS_FIRST_SEGMENT_CHARS
+    sentence_ends = [m.end() for m in _SENTENCE_END.finditer(text)] + [len(text)]
+    segments, start, previous_end = [], 0, 0
+    for end in sentence_ends:
+        if end - start > limit and previous_end > start:
+            segments.append(text[start:previous_end])
+            start, limit = previous_end, max_chars
+        previous_end = end
+    segments.append(text[start:])
+    return [segment.strip() for segment in segments if segment.strip()]
+
+def _synthesize_segment(text):
+    """
+    Returns the MP3 bytes for one segment, reusing the segment cache and
+    retrying the TTS engine with backoff.
+    """
+    segment_hash = hashlib.sha256(f"{TTS_BACKEND}:{TTS_LANGUAGE}:{text}".encode("utf-8")).hexdigest()
+    segment_path = os.path.join(AUDIO_SEGMENT_FOLDER, f"{segment_hash}.mp3")
+    if os.path.exists(segment_path):
+        with open(segment_path, "rb") as f:
+            return f.read()
+
+    with span("tts.segment", backend=TTS_BACKEND, chars=len(text)) as s:
+        audio = _synthesize_segment_audio(text)
+        s.set(bytes=len(audio))
+    os.makedirs(AUDIO_SEGMENT_FOLDER, exist_ok=True)
+    temporary_path = f"{segment_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(temporary_path, "wb") as f:
+        f.write(audio)
+    os.replace(temporary_path, segment_path)
+    return audio
+
+def _synthesize_segment_audio(text):
+    for attempt in range(TTS_MAX_RETRIES + 1):
+        try:
+            if TTS_BACKEND == "stub":
+                # About 15 characters of speech per second
+                audio = _SILENT_MP3_FRAME * max(1, len(text) * 5 // 2)
+            elif TTS_BACKEND == "http":
+                import requests
+                response = requests.post(TTS_URL, json={"text": text, "lang": TTS_LANGUAGE}, timeout=60)
+                response.raise_for_status()
+                audio = response.content
+            else:
+                from gtts import gTTS
+                with io.BytesIO() as bio:
+                    gTTS(text=text, lang=TTS_LANGUAGE).write_to_fp(bio)
+                    audio = bio.getvalue()
+            break
+        except Exception as e:
+            # gTTS raises its own error for a failed request, with the requests error as its context
+            transient = _is_transient_error(e) or (e.__context__ is not None and _is_transient_error(e.__context__))
+            if not transient or attempt == TTS_MAX_RETRIES:
+                raise
+            time.sleep(TTS_RETRY_BACKOFF * (2 ** attempt) * (1 + random.random() * 0.25))
+    return audio
+
+@traced("tts.synthesize")
+def synthesize_speech(text, audio_path, on_segment=None):
+    """
+    Reads `text` aloud into an MP3 at `audio_path`. The text is split at sentence
+    ends and the segments are synthesized concurrently; MP3 frames can simply be
+    concatenated, so the segments are written to the file in order as they finish.
+    `on_segment(index, audio_bytes)` is called on the calling thread for each
+    segment in order, as soon as it is ready, so the first part can be played
+    while the rest is still rendering.
+    """
+    segments = split_into_speech_segments(text)
+    os.makedirs(os.path.dirname(audio_path) or ".", exist_ok=True)
+    temporary_path = f"{audio_path}.{os.getpid()}.tmp"
+    with ThreadPoolExecutor(max_workers=TTS_CONCURRENCY) as pool, open(temporary_path, "wb") as f:
+        for index, audio in enumerate(pool.map(in_request(_synthesize_segment), segments)):
+            f.write(audio)
+            if on_segment is not None:
+                on_segment(index, audio)
+    os.replace(temporary_path, audio_path)
+    return audio_path
+
+def generate_insights(full_text):
+    """
+    Returns the insights JSON (one_sentence_summary, key_concepts, main_arguments)
+    for the whole document, built from summarize_document.
+    """
     try:
-        model = genai.GenerativeModel('gemini-1.5-flash-latest')
-        response = model.generate_content(prompt)
-        json_response = response.text.strip().replace("```json", "").replace("```", "")
+        document_text = summarize_document(full_text)
+        prompt = f"""
+        Analyze the following document text and provide a structured analysis in JSON format.
+        Long documents are given as summaries of their sections, in order.
+        The JSON object should have the following keys:
+        - "one_sentence_summary": A single, concise sentence that summarizes the entire document.
+        - "key_concepts": A list of 5 to 7 of the most important keywords or concepts found in the text.
+        - "main_arguments": A brief summary (2-3 sentences) of the main purpose, arguments, or findings presented in the document.
+        Here is the document text:
+        ---
+        {document_text}
+        ---
+        """
+        json_response = generate_text(prompt).strip().replace("```json", "").replace("```", "")
         insights = json.loads(json_response)
         return insights
     except Exception as e:
         return {"error": str(e)}
 
-def generate_audio_summary(full_text, document_id):
-    truncated_text = full_text[:15000]
-    prompt = f"""
-    You are an expert summarizer. Read the following document text and create a concise, easy-to-understand summary of about 200-300 words.
-    The summary should be suitable for a short audio overview or podcast segment.
-    DOCUMENT TEXT:
-    ---
-    {truncated_text}
-    ---
+def generate_audio_summary(full_text, audio_name, on_segment=None):
+    """
+    Writes a 200-300 word spoken summary of the whole document (built from
+    summarize_document) to audio_summaries/<audio_name>.mp3.
+    `on_segment` is passed to synthesize_speech for progressive playback.
+    Returns (audio_path, summary_text), or (None, None) on failure.
     """
     try:
-        model = genai.GenerativeModel('gemini-1.5-flash-latest')
-        response = model.generate_content(prompt)
-        summary_text = response.text
-        tts = gTTS(text=summary_text, lang='en')
-        audio_folder = "audio_summaries"
-        os.makedirs(audio_folder, exist_ok=True)
-        audio_path = os.path.join(audio_folder, f"{document_id}.mp3")
-        tts.save(audio_path)
+        document_text = summarize_document(full_text)
+        prompt = f"""
+        You are an expert summarizer. Read the following document text and create a concise, easy-to-understand summary of about 200-300 words.
+        The summary should be suitable for a short audio overview or podcast segment.
+        Long documents are given as summaries of their sections, in order.
+        DOCUMENT TEXT:
+        ---
+        {document_text}
+        ---
+        """
+        summary_text = generate_text(prompt)
+        audio_path = synthesize_speech(summary_text, os.path.join(AUDIO_FOLDER, f"{audio_name}.mp3"), on_segment)
         return audio_path, summary_text
     except Exception as e:
         print(f"Error generating audio summary: {e}")
-        return None, None
\ No newline at end of file
+        return None, None
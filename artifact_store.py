@@ -0,0 +1,118 @@
+import hashlib
+import json
+import os
+from artifact_versions import INSIGHTS_PROMPT_VERSION, AUDIO_PROMPT_VERSION, AUDIO_TTS_ENGINE
+from database_utils import get_artifact, save_artifact, delete_artifacts
+from document_store import document_content_hash, load_document_text
+from providers import get_generator
+
+# Things generated from a document's text. Each is stored once per
+# (content hash, artifact type, prompt version, model), so any process can
+# serve it, and changing a prompt version or model simply misses the old rows.
+INSIGHTS = "insights"
+AUDIO_SUMMARY = "audio_summary"
+
+def _artifact_key(artifact_type):
+    if artifact_type == INSIGHTS:
+        return INSIGHTS_PROMPT_VERSION, get_generator().name
+    return AUDIO_PROMPT_VERSION, f"{get_generator().name}+{AUDIO_TTS_ENGINE}"
+
+def _load(content_hash, artifact_type):
+    prompt_version, model = _artifact_key(artifact_type)
+    try:
+        row = get_artifact(content_hash, artifact_type, prompt_version, model)
+    except Exception as e:
+        print(f"Database Error while reading artifact: {e}")
+        return None
+    # An audio row is only valid while its file is still there
+    if row and row['file_path'] and not os.path.exists(row['file_path']):
+        return None
+    return row
+
+def get_stored_insights(doc_info):
+    """
+    Returns the stored insights for a document row, or None if there are none yet.
+    """
+    row = _load(document_content_hash(doc_info), INSIGHTS)
+    return json.loads(row['payload']) if row else None
+
+def get_document_insights(doc_info):
+    """
+    Returns the insights dict for a document row, generating and storing them
+    only if no valid stored copy exists. Errors come back as {"error": ...} and
+    are not stored.
+    """
+    from ai_core import generate_insights
+
+    insights = get_stored_insights(doc_info)
+    if insights is not None:
+        return insights
+    full_text, _ = load_document_text(doc_info)
+    if not full_text:
+        return None
+    insights = generate_insights(full_text)
+    if "error" not in insights:
+        prompt_version, model = _artifact_key(INSIGHTS)
+        save_artifact(document_content_hash(doc_info), INSIGHTS, prompt_version, model, json.dumps(insights))
+    return insights
+
+def get_stored_audio(doc_info):
+    """
+    Returns (audio_path, summary_text) for a document row, or (None, None).
+    """
+    row = _load(document_content_hash(doc_info), AUDIO_SUMMARY)
+    if not row:
+        return None, None
+    return row['file_path'], json.loads(row['payload'])['summary_text']
+
+def get_document_audio(doc_info, on_segment=None):
+    """
+    Returns (audio_path, summary_text) for a document row, generating the audio
+    only if no valid stored copy exists. Returns (None, None) on failure.
+    `on_segment` gets each audio segment while a new summary is synthesized.
+    """
+    from ai_core import generate_audio_summary
+
+    audio_path, summary_text = get_stored_audio(doc_info)
+    if audio_path:
+        return audio_path, summary_text
+    full_text, _ = load_document_text(doc_info)
+    if not full_text:
+        return None, None
+    content_hash = document_content_hash(doc_info)
+    prompt_version, model = _artifact_key(AUDIO_SUMMARY)
+    # Named by content and key, so documents with the same file share one MP3
+    key_hash = hashlib.sha256(f"{prompt_version}:{model}".encode("utf-8")).hexdigest()[:8]
+    audio_path, summary_text = generate_audio_summary(full_text, f"{content_hash}-{key_hash}", on_segment)
+    if audio_path:
+        save_artifact(content_hash, AUDIO_SUMMARY, prompt_version, model,
+                      json.dumps({"summary_text": summary_text}), audio_path)
+    return audio_path, summary_text
+
+def _remove_files(file_paths):
+    for file_path in set(file_paths):
+        try:
+            os.remove(file_path)
+        except FileNotFoundError:
+            pass
+
+def invalidate_artifacts(content_hash, artifact_type=None):
+    """
+    Deletes the stored artifacts (and audio files) for a document's content, so
+    the next request generates them again.
+    """
+    _remove_files(delete_artifacts(content_hash=content_hash, artifact_type=artifact_type))
+
+def purge_stale_artifacts():
+    """
+    Deletes artifacts made with an older prompt version or another model.
+    Returns how many files were removed.
+    """
+    file_paths = []
+    for artifact_type in (INSIGHTS, AUDIO_SUMMARY):
+        file_paths += delete_artifacts(artifact_type=artifact_type, keep=_artifact_key(artifact_type))
+    _remove_files(file_paths)
+    return len(file_paths)
+
+if __name__ == '__main__':
+    print(f"Removed stale artifacts ({purge_stale_artifacts()} audio file(s)).")
@@ -0,0 +1,16 @@
+"""
+Everything a stored artifact is keyed by besides the model (see artifact_store.py).
+Kept out of ai_core so looking up a stored artifact doesn't load the AI stack.
+"""
+from settings import get_setting
+
+# Bump these when the final prompts change; stored artifacts are keyed by them
+INSIGHTS_PROMPT_VERSION = 1
+AUDIO_PROMPT_VERSION = 1
+
+# Which engine reads summaries aloud: "gtts" (Google Translate TTS), "http" (POSTs
+# {"text", "lang"} to TTS_URL and gets MP3 back, e.g. a self-hosted engine) or "stub"
+# (offline: silent MP3 frames as long as the speech would be, for tests and benchmarks)
+TTS_BACKEND = get_setting("TTS_BACKEND", "gtts")
+TTS_LANGUAGE = get_setting("TTS_LANGUAGE", "en")
+AUDIO_TTS_ENGINE = f"{TTS_BACKEND}-{TTS_LANGUAGE}"
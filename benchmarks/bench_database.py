@@ -0,0 +1,151 @@
+"""
+Compares the pooled database layer against the old connect-per-call access
+pattern under concurrent sessions.
+
+Each simulated session repeats what one Streamlit rerun of the chat page does:
+look up the user, list their documents, load one document, load its chat
+history, and every few reruns save a question/answer pair.
+
+    python -m benchmarks.bench_database --sessions 8 --reruns 200
+
+Prints a JSON report.
+"""
+import argparse
+import contextlib
+import json
+import os
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+import database_setup
+import database_utils
+import upgrade_database
+
+
+# --- The old access pattern: a fresh connection per call, rollback journal, no indexes ---
+def _legacy_connect(database):
+    conn = sqlite3.connect(database)
+    conn.row_factory = sqlite3.Row
+    return conn
+
+def legacy_rerun(database, username, user_id, doc_id, write):
+    conn = _legacy_connect(database)
+    conn.execute("SELECT * FROM users WHERE username = ?", (username,)).fetchone()
+    conn.close()
+    conn = _legacy_connect(database)
+    conn.execute("SELECT * FROM documents WHERE user_id = ? ORDER BY uploaded_at DESC", (user_id,)).fetchall()
+    conn.close()
+    conn = _legacy_connect(database)
+    conn.execute("SELECT * FROM documents WHERE id = ?", (doc_id,)).fetchone()
+    conn.close()
+    conn = _legacy_connect(database)
+    conn.execute("SELECT * FROM messages WHERE document_id = ? ORDER BY timestamp ASC", (doc_id,)).fetchall()
+    conn.close()
+    if write:
+        for role in ("user", "assistant"):
+            conn = _legacy_connect(database)
+            conn.execute("INSERT INTO messages (document_id, role, content) VALUES (?, ?, ?)", (doc_id, role, "benchmark"))
+            conn.commit()
+            conn.close()
+
+def pooled_rerun(database, username, user_id, doc_id, write):
+    database_utils.get_user(username)
+    database_utils.get_documents_by_user(user_id)
+    database_utils.get_single_document(doc_id)
+    database_utils.get_messages_by_doc_id(doc_id)
+    if write:
+        database_utils.add_messages(doc_id, [("user", "benchmark"), ("assistant", "benchmark")])
+
+
+# --- Setup ---
+def build_database(path, users, documents_per_user, messages_per_document, tuned):
+    """
+    Creates and fills a benchmark database. `tuned` adds the WAL journal and
+    indexes from database_setup; otherwise the tables look like the original schema.
+    """
+    # Keep stdout for the JSON report
+    with contextlib.redirect_stdout(sys.stderr):
+        database_setup.setup_database(path)
+        upgrade_database.upgrade(path)
+    conn = sqlite3.connect(path)
+    if not tuned:
+        conn.execute("DROP INDEX IF EXISTS idx_messages_document_timestamp")
+        conn.execute("DROP INDEX IF EXISTS idx_documents_user_uploaded")
+        conn.execute("PRAGMA journal_mode = DELETE")
+    rng = random.Random(42)
+    doc_ids = []
+    for u in range(users):
+        user_id = conn.execute("INSERT INTO users (username, password_hash) VALUES (?, ?)", (f"user{u}", "x")).lastrowid
+        for d in range(documents_per_user):
+            doc_id = conn.execute(
+                "INSERT INTO documents (user_id, original_filename, storage_path, faiss_index) VALUES (?, ?, ?, ?)",
+                (user_id, f"doc{d}.pdf", f"{path}-{u}-{d}.pdf", os.urandom(3 * 1024))
+            ).lastrowid
+            doc_ids.append((f"user{u}", user_id, doc_id))
+    # Spread the messages over all documents, interleaved like real use
+    conn.executemany(
+        "INSERT INTO messages (document_id, role, content) VALUES (?, ?, ?)",
+        [(rng.choice(doc_ids)[2], "user", "x" * 200) for _ in range(messages_per_document * len(doc_ids))]
+    )
+    conn.commit()
+    conn.close()
+    return doc_ids
+
+def run_sessions(rerun, database, doc_ids, sessions, reruns, write_every):
+    latencies = []
+    lock = threading.Lock()
+
+    def session(seed):
+        rng = random.Random(seed)
+        username, user_id, doc_id = rng.choice(doc_ids)
+        local = []
+        for i in range(reruns):
+            started = time.perf_counter()
+            rerun(database, username, user_id, doc_id, write=(i % write_every == 0))
+            local.append(time.perf_counter() - started)
+        with lock:
+            latencies.extend(local)
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=session, args=(s,)) for s in range(sessions)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "reruns_per_second": round(len(latencies) / elapsed, 1),
+        "p50_ms": round(statistics.median(latencies) * 1000, 3),
+        "p95_ms": round(latencies[int(len(latencies) * 0.95) - 1] * 1000, 3),
+        "seconds": round(elapsed, 3),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=8, help="Concurrent browser sessions.")
+    parser.add_argument("--reruns", type=int, default=200, help="Reruns per session.")
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--documents-per-user", type=int, default=10)
+    parser.add_argument("--messages-per-document", type=int, default=200)
+    parser.add_argument("--write-every", type=int, default=5, help="Save a question/answer pair every N reruns.")
+    args = parser.parse_args()
+
+    report = {"config": vars(args)}
+    with tempfile.TemporaryDirectory() as workdir:
+        for name, rerun, tuned in (("connect_per_call", legacy_rerun, False), ("pooled", pooled_rerun, True)):
+            database = os.path.join(workdir, f"{name}.db")
+            doc_ids = build_database(database, args.users, args.documents_per_user, args.messages_per_document, tuned)
+            database_utils.DATABASE_NAME = database
+            report[name] = run_sessions(rerun, database, doc_ids, args.sessions, args.reruns, args.write_every)
+    report["speedup"] = round(report["pooled"]["reruns_per_second"] / report["connect_per_call"]["reruns_per_second"], 2)
+    print(json.dumps(report, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""
+Import-time report for app.py and every page: how long each entry point's
+imports take on a cold interpreter, which heavy libraries they pull in, and the
+slowest modules, from `python -X importtime`.
+
+Each entry point runs in a fresh process. Streamlit itself and its secrets are
+loaded first (the server has both before it runs any page) and are not counted.
+
+    python -m benchmarks.bench_imports --repeat 5 --output imports.json
+
+Exits with status 1 when an entry point loads a library listed for it in
+MUST_STAY_LAZY, so a regression in cold start fails loudly.
+"""
+import argparse
+import ast
+import glob
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Libraries that take a noticeable part of a second to import
+HEAVY_MODULES = ("google.generativeai", "pdfplumber", "faiss", "gtts", "PIL", "requests", "numpy", "pandas")
+# Entry points that never touch AI code, and what they must not load
+MUST_STAY_LAZY = {
+    "app.py": HEAVY_MODULES,
+    "pages/2_My_Documents.py": HEAVY_MODULES,
+    "pages/1_Upload_Document.py": ("google.generativeai", "pdfplumber", "faiss", "gtts"),
+    "pages/3_Chat.py": ("google.generativeai", "pdfplumber", "gtts"),
+    "pages/4_Insight_Panel.py": ("google.generativeai", "pdfplumber", "faiss", "gtts"),
+    "pages/5_Audio_Overview.py": ("google.generativeai", "pdfplumber", "faiss", "gtts"),
+}
+PRELUDE = "import streamlit as st\nst.secrets.load_if_toml_exists()\n"
+MARKER = "--- entry point imports ---"
+
+
+def entry_point_imports(path):
+    """Returns the source of the top-level import statements of a script."""
+    with open(os.path.join(REPO_ROOT, path)) as f:
+        tree = ast.parse(f.read())
+    return "\n".join(ast.unparse(node) for node in tree.body if isinstance(node, (ast.Import, ast.ImportFrom)))
+
+def parse_importtime(stderr):
+    """
+    Returns [(module, self_us, cumulative_us, depth)] for the imports that ran
+    after the marker, in the order Python finished them.
+    """
+    lines = stderr.splitlines()
+    start = lines.index(MARKER) + 1 if MARKER in lines else 0
+    modules = []
+    for line in lines[start:]:
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        modules.append((name.strip(), int(self_us), int(cumulative_us), len(name) - len(name.lstrip()) - 1))
+    return modules
+
+def measure_entry_point(path):
+    code = PRELUDE + f"import sys\nprint({MARKER!r}, file=sys.stderr, flush=True)\n" + entry_point_imports(path)
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", code], cwd=REPO_ROOT,
+                            capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"{path}: imports failed\n{result.stderr[-2000:]}")
+    modules = parse_importtime(result.stderr)
+    loaded = {name for name, _, _, _ in modules}
+    return {
+        "seconds": sum(cumulative for _, _, cumulative, depth in modules if depth == 0) / 1e6,
+        "modules": len(modules),
+        "heavy": sorted(m for m in HEAVY_MODULES if m in loaded),
+        "slowest": sorted(((name, self_us) for name, self_us, _, _ in modules), key=lambda m: -m[1])[:10],
+    }
+
+def import_report(repeat=3):
+    """
+    Measures every entry point `repeat` times and returns {path: report}, with
+    the median import time and any MUST_STAY_LAZY violations.
+    """
+    paths = ["app.py"] + sorted(os.path.relpath(p, REPO_ROOT) for p in glob.glob(os.path.join(REPO_ROOT, "pages", "*.py")))
+    report = {}
+    for path in paths:
+        runs = [measure_entry_point(path) for _ in range(repeat)]
+        last = runs[-1]
+        report[path] = {
+            "import_seconds_p50": round(statistics.median(run["seconds"] for run in runs), 4),
+            "modules_imported": last["modules"],
+            "heavy_modules": last["heavy"],
+            "should_be_lazy": sorted(set(last["heavy"]) & set(MUST_STAY_LAZY.get(path, ()))),
+            "slowest_modules_ms": {name: round(self_us / 1000, 2) for name, self_us in last["slowest"]},
+        }
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=3, help="fresh-process runs per entry point")
+    parser.add_argument("--output", help="also write the JSON report to this file")
+    args = parser.parse_args()
+
+    from benchmarks.bench_pipeline import git_commit
+    report = {**git_commit(), "entry_points": import_report(args.repeat)}
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text)
+
+    violations = {path: r["should_be_lazy"] for path, r in report["entry_points"].items() if r["should_be_lazy"]}
+    if violations:
+        print(f"Heavy libraries loaded at import time: {violations}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,233 @@
+"""
+End-to-end benchmark of the document pipeline against local stand-ins for every
+external service, so results depend only on the code (and the configured stub
+latencies), not on the network or API quotas.
+
+It generates synthetic PDFs (digital and scanned pages), starts the OCR, Gemini
+and TTS stubs from benchmarks/stub_services.py, runs the app's modules in a
+scratch directory (own database, vector store and caches), and times each stage:
+
+    extract_text_from_pdf, split_text_into_chunks, iter_chunk_spans,
+    create_embeddings, ingest_pdf (the streaming upload pipeline),
+    the database_utils calls, get_chat_response, stream_chat_response,
+    generate_insights and synthesize_speech.
+
+    python -m benchmarks.bench_pipeline --pages 40 --scanned-fraction 0.25 --output before.json
+
+Prints a JSON report (also written to --output) tagged with the git commit, so
+runs from different commits can be compared. It includes the import-time report
+of benchmarks/bench_imports.py for app.py and the pages.
+"""
+import argparse
+import contextlib
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks import stub_services
+from benchmarks.bench_imports import import_report
+from benchmarks.synthetic_pdfs import make_synthetic_pdf, VOCABULARY
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+# --- Timing ---
+class StageTimer:
+    """Collects the duration of every call per stage name."""
+
+    def __init__(self):
+        self.stages = {}
+
+    def run(self, name, function, *args, **kwargs):
+        started_at = time.perf_counter()
+        result = function(*args, **kwargs)
+        self.stages.setdefault(name, []).append(time.perf_counter() - started_at)
+        return result
+
+    def report(self):
+        report = {}
+        for name, durations in self.stages.items():
+            ordered = sorted(durations)
+            report[name] = {
+                "calls": len(durations),
+                "total_seconds": round(sum(durations), 4),
+                "mean_seconds": round(statistics.mean(durations), 5),
+                "p50_seconds": round(ordered[len(ordered) // 2], 5),
+                "p95_seconds": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))], 5),
+            }
+        return report
+
+def git_commit():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], cwd=REPO_ROOT, capture_output=True,
+                                text=True, check=True).stdout.strip()
+        dirty = bool(subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=REPO_ROOT,
+                                    capture_output=True, text=True).stdout.strip())
+        return {"commit": commit, "dirty": dirty}
+    except Exception:
+        return {"commit": None, "dirty": None}
+
+
+# --- Setup ---
+def start_stubs(args):
+    """Starts the three service stubs and points the app's settings at them."""
+    servers = {}
+    for service, latency in (("ocr", args.ocr_latency), ("gemini", args.gemini_latency), ("tts", args.tts_latency)):
+        servers[service] = stub_services.start_in_background(service, latency, args.failure_rate)
+    # Settings are read when the app's modules are imported, so this must come first
+    os.environ.update({
+        "OCR_BACKEND": "ocr_space",
+        "OCR_SPACE_URL": f"{servers['ocr'][1]}/parse/image",
+        "OCR_SPACE_API_KEY": "stub",
+        "GEMINI_API_ENDPOINT": servers["gemini"][1],
+        "GOOGLE_API_KEY": "stub",
+        "EMBEDDING_BACKEND": "gemini",
+        "GENERATION_BACKEND": "gemini",
+        "TTS_BACKEND": "http",
+        "TTS_URL": f"{servers['tts'][1]}/tts",
+        "OCR_RETRY_BACKOFF": "0.05",
+        "EMBED_RETRY_BACKOFF": "0.05",
+        "GENERATION_RETRY_BACKOFF": "0.05",
+        "TTS_RETRY_BACKOFF": "0.05",
+    })
+    return servers
+
+def service_stats(servers):
+    return {service: {key: value for key, value in server.RequestHandlerClass.stats.items() if key != "lock"}
+            for service, (server, _) in servers.items()}
+
+def clear_embedding_cache():
+    from database_utils import db_connection
+    with db_connection() as conn, conn:
+        conn.execute("DELETE FROM embedding_cache")
+
+
+# --- Stages ---
+def run_benchmark(args, timer):
+    import ai_core
+    import database_setup
+    import database_utils
+    import upgrade_database
+    from ingest import ingest_pdf
+    from working_set import get_document_working_set
+
+    database_setup.setup_database()
+    upgrade_database.upgrade()
+    database_utils.add_user("benchmark", "not-a-real-hash")
+    user_id = database_utils.get_user("benchmark")["id"]
+
+    corpus = []
+    for number in range(args.documents):
+        path = os.path.abspath(f"document_{number}.pdf")
+        info = make_synthetic_pdf(path, args.pages, args.scanned_fraction, args.words_per_page, seed=number)
+        corpus.append({"path": path, **info})
+
+    pages = sum(doc["pages"] for doc in corpus)
+    totals = {"pages": pages, "scanned_pages": sum(doc["scanned_pages"] for doc in corpus), "chunks": 0}
+    for number, doc in enumerate(corpus):
+        # The stages the upload page used to run one after another
+        full_text = timer.run("extract_text_from_pdf", ai_core.extract_text_from_pdf, doc["path"])
+        chunks = timer.run("split_text_into_chunks", ai_core.split_text_into_chunks, full_text)
+        spans = timer.run("iter_chunk_spans", lambda: list(ai_core.iter_chunk_spans([(0, full_text)])))
+        totals["chunks"] += len(spans)
+        clear_embedding_cache()
+        timer.run("create_embeddings", ai_core.create_embeddings, chunks)
+
+        # The streaming pipeline the upload worker runs now, with a cold embedding cache
+        clear_embedding_cache()
+        result = timer.run("ingest_pdf", ingest_pdf, doc["path"])
+
+        # The text and chunks saved are the ones the index was built from
+        doc_id = timer.run("database_utils.add_document", database_utils.add_document, user_id,
+                           f"document_{number}.pdf", doc["path"], result["faiss_index"],
+                           f"benchmark-{number}", result["index_type"],
+                           (result["full_text_blob"], result["chunks_blob"]), None, result["embedding_model"])
+        timer.run("database_utils.get_documents_by_user", database_utils.get_documents_by_user, user_id)
+        doc_info = dict(timer.run("database_utils.get_single_document", database_utils.get_single_document, doc_id))
+        working_set = timer.run("working_set.load", get_document_working_set, doc_info)
+
+        for q in range(args.questions):
+            question = f"What does the {VOCABULARY[q % len(VOCABULARY)]} {VOCABULARY[(q * 7) % len(VOCABULARY)]} show?"
+            answer, _ = timer.run("get_chat_response", ai_core.get_chat_response,
+                                  working_set["index"], question, working_set["chunks"])
+            pieces, stats = ai_core.stream_chat_response(working_set["index"], question + " Explain.",
+                                                         working_set["chunks"])
+            timer.run("stream_chat_response", lambda: "".join(pieces))
+            timer.stages.setdefault("stream_chat_response.time_to_first_token", []).append(
+                stats["time_to_first_token"] or 0.0)
+            timer.run("database_utils.add_messages", database_utils.add_messages, doc_id,
+                      [("user", question), ("assistant", answer)])
+            timer.run("database_utils.get_recent_messages", database_utils.get_recent_messages, doc_id)
+
+        if args.insights:
+            timer.run("generate_insights", ai_core.generate_insights, full_text)
+        if args.audio:
+            summary = " ".join(full_text.split()[:300])
+            timer.run("synthesize_speech", ai_core.synthesize_speech, summary, f"audio_{number}.mp3")
+
+    return totals
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--documents", type=int, default=2)
+    parser.add_argument("--pages", type=int, default=20)
+    parser.add_argument("--scanned-fraction", type=float, default=0.2)
+    parser.add_argument("--words-per-page", type=int, default=400)
+    parser.add_argument("--questions", type=int, default=5, help="chat questions per document")
+    parser.add_argument("--ocr-latency", type=float, default=0.3)
+    parser.add_argument("--gemini-latency", type=float, default=0.05)
+    parser.add_argument("--tts-latency", type=float, default=0.1)
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="share of stub requests that fail with 503")
+    parser.add_argument("--no-insights", dest="insights", action="store_false")
+    parser.add_argument("--no-audio", dest="audio", action="store_false")
+    parser.add_argument("--output", help="also write the JSON report to this file")
+    args = parser.parse_args()
+
+    output_path = os.path.abspath(args.output) if args.output else None
+    servers = start_stubs(args)
+    timer = StageTimer()
+    sys.path.insert(0, REPO_ROOT)
+    started_at = time.perf_counter()
+    with tempfile.TemporaryDirectory() as work_dir:
+        # The app keeps its database and data folders relative to the working directory
+        os.chdir(work_dir)
+        # Keep stdout for the JSON report
+        with contextlib.redirect_stdout(sys.stderr):
+            totals = run_benchmark(args, timer)
+        os.chdir(REPO_ROOT)
+    wall_seconds = time.perf_counter() - started_at
+
+    stages = timer.report()
+    ingest_seconds = stages["ingest_pdf"]["total_seconds"]
+    report = {
+        **git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "config": vars(args),
+        "corpus": totals,
+        "wall_seconds": round(wall_seconds, 3),
+        "throughput": {
+            "ingest_pages_per_second": round(totals["pages"] / ingest_seconds, 2) if ingest_seconds else None,
+            "legacy_pages_per_second": round(totals["pages"] / (
+                stages["extract_text_from_pdf"]["total_seconds"] + stages["create_embeddings"]["total_seconds"]), 2),
+        },
+        "stages": stages,
+        "services": service_stats(servers),
+        "imports": import_report(repeat=1),
+    }
+    for server, _ in servers.values():
+        server.shutdown()
+
+    text = json.dumps(report, indent=2)
+    print(text)
+    if output_path:
+        with open(output_path, "w") as f:
+            f.write(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+"""
+Recall-vs-size report for the per-document index types in vector_store.
+
+Embeds the chunks of the PDFs in a folder (user_uploads by default) with the
+configured embedding provider, optionally tops the corpus up with perturbed
+copies of those vectors to reach --min-vectors, then builds every index type
+over the same vectors and measures its size, build time, load time, search
+latency and recall@k against exact search.
+
+    EMBEDDING_BACKEND=hashing python -m benchmarks.bench_vectors --min-vectors 20000
+
+Only the digital text layer of each PDF is read, so no OCR calls are made.
+Prints a JSON report.
+"""
+import argparse
+import contextlib
+import glob
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pdfplumber
+
+import database_setup
+import database_utils
+import upgrade_database
+import vector_store
+
+
+# --- Corpus ---
+def corpus_texts(folder):
+    from ai_core import split_text_into_spans, PAGE_SEPARATOR
+    texts = []
+    for path in sorted(glob.glob(os.path.join(folder, "*.pdf"))):
+        try:
+            with pdfplumber.open(path) as pdf:
+                text = PAGE_SEPARATOR.join(page.extract_text() or "" for page in pdf.pages)
+        except Exception as e:
+            print(f"Skipping {path}: {e}", file=sys.stderr)
+            continue
+        texts += [text[start:end] for start, end, _ in split_text_into_spans(text)]
+    return texts
+
+def corpus_vectors(folder, min_vectors, rng):
+    """
+    Returns (vectors, stats). Vectors are the embedded chunks of the folder's
+    PDFs, plus noisy copies of them when there are fewer than `min_vectors`.
+    """
+    from ai_core import embed_texts
+    texts = corpus_texts(folder)
+    vectors = np.array(embed_texts(texts), dtype='float32') if texts else np.zeros((0, 0), dtype='float32')
+    real = len(vectors)
+    if real == 0:
+        raise SystemExit(f"No text found in {folder}/*.pdf")
+    if real < min_vectors:
+        sources = vectors[rng.integers(0, real, min_vectors - real)]
+        noise = rng.standard_normal(sources.shape).astype('float32') * 0.3 / np.sqrt(vectors.shape[1])
+        vectors = np.vstack([vectors, _normalize(sources + noise)])
+    return vectors, {"chunks": real, "synthetic": len(vectors) - real, "dimension": int(vectors.shape[1])}
+
+def _normalize(vectors):
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return (vectors / norms).astype('float32')
+
+
+# --- Measurements ---
+def measure(index_type, vectors, queries, truth, k):
+    from ai_core import faiss_index_to_bytes
+    started_at = time.perf_counter()
+    index, _ = vector_store.build_vector_index(vectors, index_type)
+    build_seconds = time.perf_counter() - started_at
+    vector_hash = vector_store.save_index_bytes(faiss_index_to_bytes(index))
+
+    # Loading includes paging the codes in with a first search, as the chat page would
+    started_at = time.perf_counter()
+    loaded = vector_store.load_index(vector_hash, index_type)
+    loaded.search(queries[:1], k)
+    load_seconds = time.perf_counter() - started_at
+
+    latencies = []
+    found = []
+    for query in queries:
+        started_at = time.perf_counter()
+        _, ids = loaded.search(query.reshape(1, -1), k)
+        latencies.append(time.perf_counter() - started_at)
+        found.append(ids[0])
+    recall = np.mean([len(set(f) & set(t)) / k for f, t in zip(found, truth)])
+    size = vector_store.index_size(vector_hash)
+    return {
+        "index_type": index_type,
+        "bytes": size,
+        "bytes_per_vector": round(size / len(vectors), 1),
+        f"recall_at_{k}": round(float(recall), 4),
+        "build_seconds": round(build_seconds, 3),
+        "load_seconds": round(load_seconds, 4),
+        "search_ms_p50": round(statistics.median(latencies) * 1000, 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--folder", default="user_uploads")
+    parser.add_argument("--min-vectors", type=int, default=0,
+                        help="top the corpus up with noisy copies to at least this many vectors")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--types", default=",".join(vector_store.INDEX_TYPES))
+    args = parser.parse_args()
+    rng = np.random.default_rng(42)
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        # Embeddings are cached in a scratch database and indexes written to a
+        # scratch store, so the app's own data is never touched
+        database_utils.DATABASE_NAME = os.path.join(work_dir, "bench.db")
+        vector_store.VECTOR_STORE_DIR = os.path.join(work_dir, "vector_store")
+        with contextlib.redirect_stdout(sys.stderr):
+            database_setup.setup_database(database_utils.DATABASE_NAME)
+            upgrade_database.upgrade(database_utils.DATABASE_NAME)
+
+        vectors, corpus = corpus_vectors(args.folder, args.min_vectors, rng)
+        # Queries are perturbed corpus vectors; exact flat search gives the true neighbours
+        picks = vectors[rng.integers(0, len(vectors), args.queries)]
+        queries = _normalize(picks + rng.standard_normal(picks.shape).astype('float32') * 0.5 / np.sqrt(vectors.shape[1]))
+        exact, _ = vector_store.build_vector_index(vectors, "flat")
+        _, truth = exact.search(queries, args.k)
+
+        results = []
+        for index_type in args.types.split(","):
+            if index_type.startswith("pq") and len(vectors) < 256:
+                results.append({"index_type": index_type, "skipped": "PQ needs at least 256 vectors to train"})
+                continue
+            results.append(measure(index_type, vectors, queries, truth, args.k))
+            print(f"{index_type}: done", file=sys.stderr)
+
+    flat_bytes = next((r["bytes"] for r in results if r.get("index_type") == "flat" and "bytes" in r), None)
+    for result in results:
+        if flat_bytes and "bytes" in result:
+            result["size_vs_flat"] = round(result["bytes"] / flat_bytes, 3)
+    print(json.dumps({
+        "corpus": {**corpus, "vectors": len(vectors), "folder": args.folder},
+        "auto_choice": vector_store.choose_vector_index_type(len(vectors)),
+        "queries": args.queries,
+        "results": results,
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,205 @@
+"""
+Local stand-ins for the external services the app calls, so the pipeline can be
+exercised offline and timed with a predictable, configurable latency.
+
+Run one from the repo root, for example:
+    python -m benchmarks.stub_services ocr --port 8765 --latency 0.5
+and point the app at it:
+    OCR_SPACE_URL=http://127.0.0.1:8765/parse/image streamlit run app.py
+
+The other services are used the same way:
+    gemini - GEMINI_API_ENDPOINT=http://127.0.0.1:<port> (embedding and generation, REST transport)
+    tts    - TTS_BACKEND=http TTS_URL=http://127.0.0.1:<port>/tts
+"""
+import argparse
+import json
+import random
+import re
+import threading
+import time
+import zlib
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    # Filled in by make_server()
+    latency = 0.0
+    failure_rate = 0.0
+    stats = None
+
+    def log_message(self, format, *args):
+        # Keep benchmark output clean
+        pass
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _read_body(self):
+        length = int(self.headers.get("Content-Length", 0))
+        return self.rfile.read(length) if length else b""
+
+    def _start_request(self):
+        """
+        Records the request, waits for the configured latency, and returns False
+        if this request should fail with a 503 to exercise client retries.
+        """
+        with self.stats["lock"]:
+            self.stats["requests"] += 1
+            self.stats["in_flight"] += 1
+            self.stats["max_in_flight"] = max(self.stats["max_in_flight"], self.stats["in_flight"])
+        try:
+            time.sleep(self.latency)
+        finally:
+            with self.stats["lock"]:
+                self.stats["in_flight"] -= 1
+        if random.random() < self.failure_rate:
+            self._send_json(503, {"error": "stub failure"})
+            return False
+        return True
+
+
+class OcrStubHandler(StubHandler):
+    """Answers like OCR.space's /parse/image endpoint."""
+
+    def do_POST(self):
+        body = self._read_body()
+        if not self._start_request():
+            return
+        self._send_json(200, {
+            "IsErroredOnProcessing": False,
+            "ParsedResults": [{"ParsedText": f"Stub OCR text for an image of {len(body)} bytes."}],
+        })
+
+
+def _stub_vector(text, dimension=768):
+    # Deterministic, so the same text always gets the same vector
+    values = [0.0] * dimension
+    for word in text.lower().split():
+        word_hash = zlib.crc32(word.encode("utf-8"))
+        values[word_hash % dimension] += 1.0 if word_hash & 0x80000000 else -1.0
+    norm = sum(v * v for v in values) ** 0.5 or 1.0
+    return [v / norm for v in values]
+
+def _stub_answer(prompt):
+    # Valid insights JSON when asked for JSON, otherwise a few words of the prompt
+    if "JSON" in prompt:
+        words = Counter(re.findall(r"[a-z]{5,}", prompt.lower()))
+        return json.dumps({
+            "one_sentence_summary": "A stub summary of the document.",
+            "key_concepts": [word for word, _ in words.most_common(6)],
+            "main_arguments": "Stub main arguments.",
+        })
+    return "Stub answer: " + " ".join(prompt.split()[-40:])
+
+def _prompt_text(request):
+    return " ".join(part.get("text", "") for content in request.get("contents", [])
+                    for part in content.get("parts", []))
+
+
+class GeminiStubHandler(StubHandler):
+    """
+    Answers like the Gemini REST API (as called by google.generativeai with
+    transport="rest"): embedContent, batchEmbedContents, generateContent and
+    streamGenerateContent.
+    """
+
+    def do_POST(self):
+        request = json.loads(self._read_body() or b"{}")
+        if not self._start_request():
+            return
+        path = self.path.split("?")[0]
+        if path.endswith(":batchEmbedContents"):
+            with self.stats["lock"]:
+                self.stats["texts_embedded"] = self.stats.get("texts_embedded", 0) + len(request["requests"])
+            self._send_json(200, {"embeddings": [
+                {"values": _stub_vector(" ".join(p.get("text", "") for p in r["content"]["parts"]))}
+                for r in request["requests"]]})
+        elif path.endswith(":embedContent"):
+            self._send_json(200, {"embedding": {"values": _stub_vector(_prompt_text({"contents": [request["content"]]}))}})
+        elif path.endswith(":generateContent"):
+            self._send_json(200, {"candidates": [self._candidate(_stub_answer(_prompt_text(request)))]})
+        elif path.endswith(":streamGenerateContent"):
+            # The REST transport streams a JSON array, one response object per piece
+            words = _stub_answer(_prompt_text(request)).split(" ")
+            pieces = [" ".join(words[i:i + 8]) + " " for i in range(0, len(words), 8)]
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.end_headers()
+            self.wfile.write(b"[")
+            for i, piece in enumerate(pieces):
+                separator = b"," if i else b""
+                self.wfile.write(separator + json.dumps({"candidates": [self._candidate(piece)]}).encode("utf-8"))
+                self.wfile.flush()
+            self.wfile.write(b"]")
+        else:
+            self._send_json(404, {"error": f"unknown path {path}"})
+
+    def _candidate(self, text):
+        return {"content": {"parts": [{"text": text}], "role": "model"}, "finishReason": "STOP", "index": 0}
+
+
+class TtsStubHandler(StubHandler):
+    """
+    A text-to-speech endpoint: POST {"text", "lang"} returns audio/mpeg made of
+    silent MP3 frames, about as long as the speech would be.
+    """
+    FRAME = b"\xff\xfb\x90\xc4" + bytes(413)
+
+    def do_POST(self):
+        request = json.loads(self._read_body() or b"{}")
+        if not self._start_request():
+            return
+        body = self.FRAME * max(1, len(request.get("text", "")) * 5 // 2)
+        self.send_response(200)
+        self.send_header("Content-Type", "audio/mpeg")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+SERVICES = {
+    "ocr": OcrStubHandler,
+    "gemini": GeminiStubHandler,
+    "tts": TtsStubHandler,
+}
+
+def make_server(service, port=0, latency=0.0, failure_rate=0.0):
+    """
+    Builds a stub server for the named service on 127.0.0.1.
+    Port 0 picks a free port; read it back from server.server_address.
+    The handler's `stats` dict counts requests and the peak number in flight.
+    """
+    handler = type(f"{service.title()}Handler", (SERVICES[service],), {
+        "latency": latency,
+        "failure_rate": failure_rate,
+        "stats": {"lock": threading.Lock(), "requests": 0, "in_flight": 0, "max_in_flight": 0},
+    })
+    return ThreadingHTTPServer(("127.0.0.1", port), handler)
+
+def start_in_background(service, latency=0.0, failure_rate=0.0):
+    """
+    Starts a stub server on a free port in a daemon thread.
+    Returns (server, base_url); call server.shutdown() when finished.
+    """
+    server = make_server(service, 0, latency, failure_rate)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    host, port = server.server_address
+    return server, f"http://{host}:{port}"
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run a local stub of an external service.")
+    parser.add_argument("service", choices=sorted(SERVICES))
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds to wait before answering.")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="Fraction of requests answered with HTTP 503.")
+    args = parser.parse_args()
+
+    server = make_server(args.service, args.port, args.latency, args.failure_rate)
+    print(f"Stub '{args.service}' listening on http://127.0.0.1:{args.port}")
+    server.serve_forever()
@@ -0,0 +1,121 @@
+"""
+Generates synthetic PDFs for benchmarks: digital pages carry a real text layer,
+scanned pages are a JPEG of the same kind of text with no text layer, so they go
+through the OCR path. Written by hand (no PDF library needed) and deterministic
+for a given seed.
+
+    python -m benchmarks.synthetic_pdfs out.pdf --pages 50 --scanned-fraction 0.2
+"""
+import argparse
+import io
+import random
+
+from PIL import Image, ImageDraw
+
+VOCABULARY = (
+    "analysis data model method result study theory evidence sample variable effect "
+    "research hypothesis framework literature design measure outcome process system "
+    "learning network structure pattern function value context approach review figure "
+    "table chapter section experiment control group signal response performance error"
+).split()
+LINE_CHARS = 90
+LINES_PER_PAGE = 50
+
+def _sentence(rng):
+    words = [rng.choice(VOCABULARY) for _ in range(rng.randint(6, 18))]
+    return " ".join(words).capitalize() + "."
+
+def page_lines(rng, words_per_page):
+    """Returns the lines of one page: sentences wrapped at LINE_CHARS, in paragraphs."""
+    lines, line, words = [], "", 0
+    while words < words_per_page and len(lines) < LINES_PER_PAGE:
+        sentence = _sentence(rng)
+        words += len(sentence.split())
+        for word in sentence.split():
+            if len(line) + len(word) + 1 > LINE_CHARS:
+                lines.append(line)
+                line = word
+            else:
+                line = f"{line} {word}" if line else word
+        if rng.random() < 0.2:
+            lines += [line, ""]
+            line = ""
+    if line:
+        lines.append(line)
+    return lines[:LINES_PER_PAGE]
+
+def _escape(text):
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+def _scan_image(lines, resolution):
+    """Draws the lines on a letter-size page, the way a scanner would deliver it."""
+    scale = resolution / 72
+    image = Image.new("L", (int(612 * scale), int(792 * scale)), 255)
+    draw = ImageDraw.Draw(image)
+    for i, line in enumerate(lines):
+        draw.text((50 * scale, (42 + 14 * i) * scale), line, fill=0)
+    buffer = io.BytesIO()
+    image.save(buffer, format="JPEG", quality=60)
+    return image.size, buffer.getvalue()
+
+def make_synthetic_pdf(path, pages=10, scanned_fraction=0.0, words_per_page=400, seed=0, scan_resolution=100):
+    """
+    Writes a PDF with `pages` pages, of which about `scanned_fraction` are scans.
+    Returns {"pages", "scanned_pages", "words"}.
+    """
+    rng = random.Random(seed)
+    objects = []
+
+    def add(body):
+        objects.append(body)
+        return len(objects)
+
+    catalog = add(None)
+    pages_id = add(None)
+    font = add(b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")
+    kids, scanned, words = [], 0, 0
+    for _ in range(pages):
+        lines = page_lines(rng, words_per_page)
+        words += sum(len(line.split()) for line in lines)
+        if rng.random() < scanned_fraction:
+            scanned += 1
+            (width, height), jpeg = _scan_image(lines, scan_resolution)
+            image = add(f"<< /Type /XObject /Subtype /Image /Width {width} /Height {height} "
+                        f"/ColorSpace /DeviceGray /BitsPerComponent 8 /Filter /DCTDecode "
+                        f"/Length {len(jpeg)} >>\nstream\n".encode() + jpeg + b"\nendstream")
+            content = b"q 612 0 0 792 0 0 cm /Im1 Do Q"
+            resources = f"/XObject << /Im1 {image} 0 R >>"
+        else:
+            content = "\n".join(f"BT /F1 10 Tf 50 {750 - 14 * i} Td ({_escape(line)}) Tj ET"
+                                for i, line in enumerate(lines)).encode()
+            resources = f"/Font << /F1 {font} 0 R >>"
+        stream = add(b"<< /Length %d >>\nstream\n" % len(content) + content + b"\nendstream")
+        kids.append(add(f"<< /Type /Page /Parent {pages_id} 0 R /MediaBox [0 0 612 792] "
+                        f"/Resources << {resources} >> /Contents {stream} 0 R >>".encode()))
+    objects[catalog - 1] = f"<< /Type /Catalog /Pages {pages_id} 0 R >>".encode()
+    objects[pages_id - 1] = (f"<< /Type /Pages /Kids [{' '.join(f'{k} 0 R' for k in kids)}] "
+                             f"/Count {len(kids)} >>").encode()
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(len(out))
+        out += f"{number} 0 obj\n".encode() + body + b"\nendobj\n"
+    xref_at = len(out)
+    out += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode()
+    for offset in offsets:
+        out += f"{offset:010d} 00000 n \n".encode()
+    out += f"trailer\n<< /Size {len(objects) + 1} /Root {catalog} 0 R >>\nstartxref\n{xref_at}\n%%EOF\n".encode()
+    with open(path, "wb") as f:
+        f.write(out)
+    return {"pages": pages, "scanned_pages": scanned, "words": words}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Write a synthetic PDF for benchmarks.")
+    parser.add_argument("path")
+    parser.add_argument("--pages", type=int, default=10)
+    parser.add_argument("--scanned-fraction", type=float, default=0.0)
+    parser.add_argument("--words-per-page", type=int, default=400)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    print(make_synthetic_pdf(args.path, args.pages, args.scanned_fraction, args.words_per_page, args.seed))
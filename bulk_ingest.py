@@ -0,0 +1,182 @@
+import argparse
+import mimetypes
+import multiprocessing
+import os
+import sqlite3
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from database_utils import get_user, get_bulk_ingest_checkpoints, save_bulk_ingest_checkpoint, get_documents_by_user
+
+# The file types the upload page accepts
+SUPPORTED_EXTENSIONS = (".pdf", ".png", ".jpg", ".jpeg")
+
+def find_files(root):
+    """
+    Returns the supported files under `root`, in a stable order.
+    """
+    found = []
+    for folder, subfolders, filenames in os.walk(root):
+        subfolders.sort()
+        for filename in sorted(filenames):
+            if filename.lower().endswith(SUPPORTED_EXTENSIONS):
+                found.append(os.path.join(folder, filename))
+    return found
+
+# --- Worker processes ---
+def _init_worker(embed_requests_per_minute):
+    # Settings are read when ai_core is imported, so these must be set first.
+    # Every process reads its own file, so one page renderer each is enough,
+    # and the embedding rate limit is shared out between the processes.
+    os.environ.setdefault("OCR_RENDER_PROCESSES", "1")
+    os.environ["EMBED_REQUESTS_PER_MINUTE"] = str(embed_requests_per_minute)
+
+def ingest_file(user_id, source_path, original_filename):
+    """
+    Runs one file through the upload pipeline (store by content hash, extract,
+    chunk, embed, save). Returns a result dict; never raises.
+    """
+    from database_utils import find_user_document
+    from file_handler import ensure_saved, save_local_file
+    from ingest import IngestProgress, ingest_saved_file
+    from tracing import flush, request
+
+    started_at = time.perf_counter()
+    progress = IngestProgress()
+    page_errors = []
+    result = {"source_path": source_path, "document_id": None, "pages": 0, "page_errors": 0, "error": None,
+              "recovered": False}
+    try:
+        with request("bulk_ingest_file"):
+            file_type = mimetypes.guess_type(source_path)[0] or ""
+            storage_path, content_hash = save_local_file(source_path)
+            # A run killed after saving the document but before its checkpoint must not add it twice
+            doc_id = find_user_document(user_id, content_hash, original_filename)
+            result["recovered"] = doc_id is not None
+            if doc_id is None:
+                doc_id = ingest_saved_file(user_id, original_filename, storage_path, file_type, content_hash,
+                                           progress=progress, on_error=page_errors.append, add_to_library=False)
+            ensure_saved(storage_path, lambda: save_local_file(source_path))
+        result.update(document_id=doc_id, pages=progress.snapshot()["pages_total"], page_errors=len(page_errors))
+    except Exception as e:
+        result["error"] = str(e) or type(e).__name__
+    finally:
+        flush()
+    result["seconds"] = time.perf_counter() - started_at
+    return result
+
+# --- Bulk ingest ---
+def bulk_ingest(root, user_id, processes=None, retry_failed=True):
+    """
+    Ingests every supported file under `root` for a user, `processes` files at
+    a time. Each finished file is checkpointed, so running it again skips
+    files already done (unless they changed) and resumes where a killed run stopped.
+    Returns a summary dict.
+    """
+    from ai_core import EMBED_REQUESTS_PER_MINUTE
+
+    processes = processes or os.cpu_count() or 1
+    root = os.path.abspath(root)
+    checkpoints = get_bulk_ingest_checkpoints(user_id)
+    pending, skipped = [], 0
+    for path in find_files(root):
+        stat = os.stat(path)
+        checkpoint = checkpoints.get(path)
+        unchanged = checkpoint is not None and checkpoint['size'] == stat.st_size and checkpoint['modified_at'] == stat.st_mtime
+        if unchanged and (checkpoint['status'] == 'done' or not retry_failed):
+            skipped += 1
+            continue
+        # A file that changed since it was ingested replaces its old document
+        replaces = checkpoint['document_id'] if checkpoint is not None else None
+        pending.append((path, stat, replaces))
+
+    print(f"{len(pending)} file(s) to ingest, {skipped} already done, using {processes} process(es).")
+    summary = {"files_found": len(pending) + skipped, "skipped": skipped, "done": 0, "replaced": 0, "failed": [],
+               "pages": 0, "page_errors": 0, "interrupted": False}
+    started_at = time.perf_counter()
+    pool = ProcessPoolExecutor(max_workers=processes, mp_context=multiprocessing.get_context("spawn"),
+                               initializer=_init_worker, initargs=(max(1, EMBED_REQUESTS_PER_MINUTE // processes),))
+    try:
+        futures = {pool.submit(ingest_file, user_id, path, os.path.relpath(path, root)): (path, stat, replaces)
+                   for path, stat, replaces in pending}
+        for finished, future in enumerate(as_completed(futures), 1):
+            path, stat, replaces = futures[future]
+            try:
+                result = future.result()
+            except Exception as e:
+                # The worker process itself died (e.g. out of memory)
+                result = {"document_id": None, "pages": 0, "page_errors": 0, "error": f"Worker crashed: {e}",
+                          "recovered": False, "seconds": 0.0}
+            relative_path = os.path.relpath(path, root)
+            if result["error"]:
+                # The old version's document (if any) is kept, and still replaced once this version succeeds
+                save_bulk_ingest_checkpoint(user_id, path, stat.st_size, stat.st_mtime, 'failed', document_id=replaces,
+                                            error=result["error"])
+                summary["failed"].append({"file": relative_path, "error": result["error"]})
+                print(f"[{finished}/{len(pending)}] FAILED {relative_path}: {result['error']}")
+            else:
+                # Removed before the checkpoint is saved, so a run killed in between still knows to remove it
+                if replaces is not None and replaces != result["document_id"]:
+                    # Imported here so a run with nothing to replace doesn't load faiss in this process
+                    from document_store import remove_document
+                    if remove_document(replaces):
+                        summary["replaced"] += 1
+                save_bulk_ingest_checkpoint(user_id, path, stat.st_size, stat.st_mtime, 'done',
+                                            document_id=result["document_id"], pages=result["pages"])
+                summary["done"] += 1
+                summary["pages"] += result["pages"]
+                summary["page_errors"] += result["page_errors"]
+                if result["recovered"]:
+                    print(f"[{finished}/{len(pending)}] {relative_path}: already ingested by an interrupted run")
+                else:
+                    print(f"[{finished}/{len(pending)}] {relative_path}: {result['pages']} page(s) "
+                          f"in {result['seconds']:.1f}s")
+    except KeyboardInterrupt:
+        summary["interrupted"] = True
+        print("Interrupted. Finished files are saved; run the same command again to resume.")
+    finally:
+        pool.shutdown(wait=not summary["interrupted"], cancel_futures=True)
+
+    seconds = time.perf_counter() - started_at
+    processed = summary["done"] + len(summary["failed"])
+    summary.update(seconds=seconds, files_per_second=processed / seconds if seconds else 0.0,
+                   pages_per_second=summary["pages"] / seconds if seconds else 0.0)
+
+    # The library index is one file per user, so it is updated here, once, rather than by every process
+    if summary["done"]:
+        from library_index import sync_library
+        try:
+            sync_library(user_id, get_documents_by_user(user_id))
+        except Exception as e:
+            print(f"Could not update the library index: {e}")
+    return summary
+
+def print_summary(summary):
+    print("---")
+    print(f"Files: {summary['done']} ingested ({summary['replaced']} replacing an older version), "
+          f"{len(summary['failed'])} failed, {summary['skipped']} skipped (already done), {summary['files_found']} found")
+    print(f"Pages: {summary['pages']} ({summary['page_errors']} page(s) failed OCR)")
+    print(f"Time: {summary['seconds']:.1f}s, {summary['files_per_second']:.2f} files/sec, "
+          f"{summary['pages_per_second']:.2f} pages/sec")
+    for failure in summary["failed"]:
+        print(f"  FAILED {failure['file']}: {failure['error']}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Ingest every PDF and image in a folder tree into one user's library.")
+    parser.add_argument("folder")
+    parser.add_argument("--user", required=True, help="username that will own the documents")
+    parser.add_argument("--processes", type=int, default=None, help="files processed at once (default: one per CPU)")
+    parser.add_argument("--skip-failed", dest="retry_failed", action="store_false",
+                        help="don't retry files that failed in an earlier run")
+    args = parser.parse_args()
+
+    user = get_user(args.user)
+    if user is None:
+        sys.exit(f"No user named '{args.user}'. They need to sign up first.")
+    try:
+        summary = bulk_ingest(args.folder, user['id'], args.processes, args.retry_failed)
+    except sqlite3.OperationalError as e:
+        sys.exit(f"Database Error: {e}. Run upgrade_database.py first.")
+    print_summary(summary)
+    sys.exit(1 if summary["failed"] or summary["interrupted"] else 0)
@@ -0,0 +1,82 @@
+import re
+import threading
+import numpy as np
+from settings import get_setting
+from working_set import MemoryBudgetLRU
+
+# --- Settings ---
+QUERY_CACHE_MAX_MB = get_setting("QUERY_CACHE_MAX_MB", 32)
+QUERY_CACHE_TTL_SECONDS = get_setting("QUERY_CACHE_TTL_SECONDS", 7 * 24 * 3600)
+ANSWER_CACHE_MAX_MB = get_setting("ANSWER_CACHE_MAX_MB", 64)
+ANSWER_CACHE_TTL_SECONDS = get_setting("ANSWER_CACHE_TTL_SECONDS", 24 * 3600)
+# How close (L2 distance between query embeddings) a new question must be to reuse an answer
+ANSWER_CACHE_MAX_DISTANCE = get_setting("ANSWER_CACHE_MAX_DISTANCE", 0.15)
+# How many differently-worded questions are remembered for the same retrieved chunks
+ANSWERS_PER_CONTEXT = 8
+
+# Level 1: (embedding model, normalized question) -> query embedding
+query_embedding_cache = MemoryBudgetLRU(QUERY_CACHE_MAX_MB * 1024 * 1024, QUERY_CACHE_TTL_SECONDS)
+# Level 2: (document key, retrieved chunk ids) -> [(query embedding, answer, context), ...]
+answer_cache = MemoryBudgetLRU(ANSWER_CACHE_MAX_MB * 1024 * 1024, ANSWER_CACHE_TTL_SECONDS)
+
+_answer_stats = {"hits": 0, "misses": 0}
+_answer_stats_lock = threading.Lock()
+
+def normalize_question(question):
+    """
+    Lowercases, collapses whitespace and drops trailing punctuation, so
+    "What is X?" and "what is  x" share a cache entry.
+    """
+    return re.sub(r"\s+", " ", question.lower()).strip().rstrip("?!. ")
+
+def get_query_embedding(question, embed, model=""):
+    """
+    Returns the query embedding for a question as a float32 array.
+    `embed` is called with the normalized question only on a cache miss.
+    `model` names the embedder, so switching providers never reuses old vectors.
+    """
+    normalized = normalize_question(question)
+    key = (model, normalized)
+    embedding = query_embedding_cache.get(key)
+    if embedding is None:
+        embedding = np.asarray(embed(normalized), dtype='float32')
+        query_embedding_cache.put(key, embedding, embedding.nbytes + len(normalized))
+    return embedding
+
+def find_cached_answer(document_key, chunk_ids, query_embedding):
+    """
+    Returns a cached (answer, context) when an earlier question on the same document
+    retrieved exactly the same chunks and its embedding is within
+    ANSWER_CACHE_MAX_DISTANCE of this one. Otherwise returns None.
+    """
+    entries = answer_cache.get((document_key, tuple(chunk_ids))) or []
+    for cached_embedding, answer, context in entries:
+        if np.linalg.norm(cached_embedding - query_embedding) <= ANSWER_CACHE_MAX_DISTANCE:
+            with _answer_stats_lock:
+                _answer_stats["hits"] += 1
+            return answer, context
+    with _answer_stats_lock:
+        _answer_stats["misses"] += 1
+    return None
+
+def store_answer(document_key, chunk_ids, query_embedding, answer, context):
+    key = (document_key, tuple(chunk_ids))
+    # A peek, so adding an answer isn't counted as a cache miss
+    entries = list(answer_cache.peek(key) or [])
+    entries.append((query_embedding, answer, context))
+    entries = entries[-ANSWERS_PER_CONTEXT:]
+    size_bytes = sum(e.nbytes + len(a) + len(c) for e, a, c in entries)
+    answer_cache.put(key, entries, size_bytes)
+
+def invalidate_document_answers(document_id):
+    return answer_cache.invalidate(lambda key: key[0][0] == document_id)
+
+def cache_stats():
+    """
+    Hit rates for both levels, for the debug panel.
+    """
+    with _answer_stats_lock:
+        hits, misses = _answer_stats["hits"], _answer_stats["misses"]
+    answers = answer_cache.stats()
+    answers.update(hits=hits, misses=misses, hit_rate=hits / (hits + misses) if hits + misses else 0.0)
+    return {"query_embeddings": query_embedding_cache.stats(), "answers": answers}
@@ -3,17 +3,34 @@ import os
 
 DATABASE_NAME = 'thesis_database.db'
 
-def setup_database():
+def create_indexes(cursor):
+    """
+    Creates the indexes the app's hot queries rely on. Safe to run again.
+    """
+    print("Creating indexes...")
+    # Chat history: WHERE document_id = ? ORDER BY timestamp
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_messages_document_timestamp ON messages (document_id, timestamp)")
+    # Library page: WHERE user_id = ? ORDER BY uploaded_at DESC
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_documents_user_uploaded ON documents (user_id, uploaded_at)")
+
+def setup_database(database_name=DATABASE_NAME):
     """
     Creates the database and all necessary tables if they don't exist.
+    An existing database only gets any missing indexes.
     """
-    if os.path.exists(DATABASE_NAME):
-        print(f"Database '{DATABASE_NAME}' already exists. Setup not needed.")
+    if os.path.exists(database_name):
+        print(f"Database '{database_name}' already exists. Making sure its indexes are in place.")
+        conn = sqlite3.connect(database_name)
+        create_indexes(conn.cursor())
+        conn.commit()
+        conn.close()
         return
 
-    print(f"Creating database '{DATABASE_NAME}'...")
-    conn = sqlite3.connect(DATABASE_NAME)
+    print(f"Creating database '{database_name}'...")
+    conn = sqlite3.connect(database_name)
     cursor = conn.cursor()
+    # WAL is stored in the file itself, so every later connection gets it
+    cursor.execute("PRAGMA journal_mode = WAL")
 
     # --- Create the 'users' table ---
     print("Creating 'users' table...")
@@ -33,7 +50,8 @@ def setup_database():
             id INTEGER PRIMARY KEY AUTOINCREMENT,
             user_id INTEGER NOT NULL,
             original_filename TEXT NOT NULL,
-            storage_path TEXT NOT NULL UNIQUE,
+            -- Uploads are stored by content hash, so documents may share a file
+            storage_path TEXT NOT NULL,
             uploaded_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
             FOREIGN KEY (user_id) REFERENCES users (id)
         )
@@ -52,6 +70,8 @@ def setup_database():
         )
     ''')
 
+    create_indexes(cursor)
+
     conn.commit()
     conn.close()
     print("Database setup complete. All tables created successfully.")
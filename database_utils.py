@@ -1,82 +1,635 @@
+import queue
 import sqlite3
+import threading
+from contextlib import contextmanager
+from tracing import traced
 
 DATABASE_NAME = 'thesis_database.db'
 
+# Everything the pages need about a document. Vectors live in the vector store,
+# so listing and loading documents never drags index data out of the database.
+DOCUMENT_COLUMNS = ("id, user_id, original_filename, storage_path, uploaded_at, content_hash, vector_hash, index_type, "
+                    "embedding_model")
+
+# --- Connection Pool ---
+# Most connections ever open at once; extra callers wait for one to be returned
+POOL_SIZE = 8
+# Applied to every new connection. WAL lets readers carry on while someone writes,
+# and busy_timeout makes concurrent writers wait instead of failing with "database is locked".
+CONNECTION_PRAGMAS = [
+    "PRAGMA journal_mode = WAL",
+    "PRAGMA synchronous = NORMAL",
+    "PRAGMA busy_timeout = 5000",
+    "PRAGMA cache_size = -16000",
+    "PRAGMA temp_store = MEMORY",
+    "PRAGMA mmap_size = 67108864",
+]
+
+class ConnectionPool:
+    """
+    A thread-safe pool of SQLite connections for one database file.
+    Connections are reused across calls and Streamlit reruns, so each one keeps
+    its tuned pragmas and its cache of prepared statements.
+    """
+
+    def __init__(self, database, max_connections=POOL_SIZE):
+        self.database = database
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(max_connections)
+
+    def _connect(self):
+        conn = sqlite3.connect(self.database, timeout=5, check_same_thread=False, cached_statements=256)
+        conn.row_factory = sqlite3.Row
+        for pragma in CONNECTION_PRAGMAS:
+            conn.execute(pragma)
+        return conn
+
+    @contextmanager
+    def connection(self):
+        self._slots.acquire()
+        try:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                conn = self._connect()
+            try:
+                yield conn
+            finally:
+                # Never hand the next caller a half-finished transaction
+                if conn.in_transaction:
+                    conn.rollback()
+                self._idle.put(conn)
+        finally:
+            self._slots.release()
+
+    def close_all(self):
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                return
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def db_connection():
+    """
+    Borrows a pooled connection: `with db_connection() as conn: ...`.
+    Wrap writes in `with conn:` so they commit together (or roll back on error).
+    """
+    global _pool
+    with _pool_lock:
+        # Rebuilt if DATABASE_NAME is pointed somewhere else (e.g. by the benchmarks)
+        if _pool is None or _pool.database != DATABASE_NAME:
+            if _pool is not None:
+                _pool.close_all()
+            _pool = ConnectionPool(DATABASE_NAME)
+        pool = _pool
+    return pool.connection()
+
+# --- Users ---
+@traced("db.add_user")
 def add_user(username, password_hash):
-    conn = sqlite3.connect(DATABASE_NAME)
-    cursor = conn.cursor()
-    try:
-        cursor.execute("INSERT INTO users (username, password_hash) VALUES (?, ?)", (username, password_hash))
-        conn.commit()
-        return True
-    except sqlite3.IntegrityError:
-        return False
-    finally:
-        conn.close()
+    with db_connection() as conn:
+        try:
+            with conn:
+                conn.execute("INSERT INTO users (username, password_hash) VALUES (?, ?)", (username, password_hash))
+            return True
+        except sqlite3.IntegrityError:
+            return False
 
+@traced("db.get_user")
 def get_user(username):
-    conn = sqlite3.connect(DATABASE_NAME)
-    conn.row_factory = sqlite3.Row 
-    cursor = conn.cursor()
-    cursor.execute("SELECT * FROM users WHERE username = ?", (username,))
-    user_data = cursor.fetchone()
-    conn.close()
-    return user_data
-
-def add_document(user_id, original_filename, storage_path, faiss_index):
-    conn = sqlite3.connect(DATABASE_NAME)
-    cursor = conn.cursor()
-    doc_id = None
+    with db_connection() as conn:
+        return conn.execute("SELECT * FROM users WHERE username = ?", (username,)).fetchone()
+
+# --- Documents ---
+@traced("db.add_document")
+def add_document(user_id, original_filename, storage_path, faiss_index, content_hash=None, index_type=None,
+                 text_blobs=None, job_id=None, embedding_model=None):
+    """
+    Adds a document and returns its id, or None on failure. `embedding_model` is
+    the name of the embedder that made its vectors. `text_blobs` is the
+    compressed (full_text, chunks) pair to store with it. With `job_id`, the
+    ingest job is marked as having produced this document in the same
+    transaction, so a rerun of a job that died afterwards can't add it twice.
+    """
+    doc_id = vector_hash = None
     try:
-        cursor.execute(
-            "INSERT INTO documents (user_id, original_filename, storage_path, faiss_index) VALUES (?, ?, ?, ?)",
-            (user_id, original_filename, storage_path, faiss_index)
-        )
-        doc_id = cursor.lastrowid
-        conn.commit()
+        # The index goes to the vector store; the row only keeps its hash and type.
+        # Imported here so the login page doesn't load numpy with this module.
+        from vector_store import save_index_bytes
+        vector_hash = save_index_bytes(faiss_index)
+        with db_connection() as conn, conn:
+            cursor = conn.execute(
+                "INSERT INTO documents (user_id, original_filename, storage_path, vector_hash, content_hash, index_type, embedding_model) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (user_id, original_filename, storage_path, vector_hash, content_hash, index_type or "flat", embedding_model)
+            )
+            doc_id = cursor.lastrowid
+            if text_blobs is not None:
+                conn.execute(
+                    "INSERT OR REPLACE INTO document_texts (document_id, content_hash, full_text, chunks) VALUES (?, ?, ?, ?)",
+                    (doc_id, content_hash, *text_blobs)
+                )
+            if job_id is not None:
+                conn.execute("UPDATE ingest_jobs SET document_id = ? WHERE id = ?", (doc_id, job_id))
     except Exception as e:
         print(f"Database Error: {e}")
-    finally:
-        conn.close()
+        doc_id = None
+        if vector_hash is not None:
+            _delete_unused_index(vector_hash)
     return doc_id
 
+def _delete_unused_index(vector_hash):
+    """
+    Removes a stored index that no document refers to, e.g. one written for a
+    document whose row could not be saved. Shared indexes are left alone.
+    """
+    try:
+        with db_connection() as conn:
+            in_use = conn.execute("SELECT 1 FROM documents WHERE vector_hash = ? LIMIT 1", (vector_hash,)).fetchone()
+        if in_use is None:
+            from vector_store import delete_index
+            delete_index(vector_hash)
+    except Exception as e:
+        print(f"Database Error while cleaning up vectors: {e}")
+
+@traced("db.get_documents_by_user")
 def get_documents_by_user(user_id):
-    conn = sqlite3.connect(DATABASE_NAME)
-    conn.row_factory = sqlite3.Row
-    cursor = conn.cursor()
-    cursor.execute("SELECT * FROM documents WHERE user_id = ? ORDER BY uploaded_at DESC", (user_id,))
-    documents = cursor.fetchall()
-    conn.close()
-    return documents
+    with db_connection() as conn:
+        return conn.execute(
+            f"SELECT {DOCUMENT_COLUMNS} FROM documents WHERE user_id = ? ORDER BY uploaded_at DESC, id DESC", (user_id,)
+        ).fetchall()
 
+@traced("db.get_single_document")
 def get_single_document(doc_id):
-    conn = sqlite3.connect(DATABASE_NAME)
-    conn.row_factory = sqlite3.Row
-    cursor = conn.cursor()
-    cursor.execute("SELECT * FROM documents WHERE id = ?", (doc_id,))
-    document = cursor.fetchone()
-    conn.close()
-    return document
+    with db_connection() as conn:
+        return conn.execute(f"SELECT {DOCUMENT_COLUMNS} FROM documents WHERE id = ?", (doc_id,)).fetchone()
+
+@traced("db.find_ingested_document")
+def find_ingested_document(content_hash, embedding_model):
+    """
+    Returns a document whose file has this content hash and which already has
+    its text and its vectors from this embedder stored, or None. A new upload
+    of the same file can share its results instead of running the pipeline again.
+    """
+    with db_connection() as conn:
+        return conn.execute(
+            f"SELECT {DOCUMENT_COLUMNS} FROM documents d WHERE content_hash = ? AND embedding_model = ? "
+            "AND vector_hash IS NOT NULL "
+            "AND EXISTS (SELECT 1 FROM document_texts t WHERE t.document_id = d.id AND t.content_hash = d.content_hash) "
+            "ORDER BY id LIMIT 1",
+            (content_hash, embedding_model)
+        ).fetchone()
+
+@traced("db.add_shared_document")
+def add_shared_document(user_id, original_filename, storage_path, source_doc_id, job_id=None):
+    """
+    Adds a document that reuses the content hash, vectors and stored text of an
+    existing one. Returns the new document id, or None on failure.
+    `job_id` is recorded the same way as in add_document.
+    """
+    doc_id = None
+    try:
+        with db_connection() as conn, conn:
+            cursor = conn.execute(
+                "INSERT INTO documents (user_id, original_filename, storage_path, content_hash, vector_hash, index_type, embedding_model) "
+                "SELECT ?, ?, ?, content_hash, vector_hash, index_type, embedding_model FROM documents WHERE id = ?",
+                (user_id, original_filename, storage_path, source_doc_id)
+            )
+            if cursor.rowcount:
+                doc_id = cursor.lastrowid
+                if job_id is not None:
+                    conn.execute("UPDATE ingest_jobs SET document_id = ? WHERE id = ?", (doc_id, job_id))
+    except Exception as e:
+        print(f"Database Error: {e}")
+    return doc_id
+
+@traced("db.delete_document")
+def delete_document(doc_id):
+    """
+    Deletes a document and its chat history. Files and stored data are shared by
+    every document with the same content, so they are only released when this
+    was the last document using them. An unused stored file is deleted here,
+    before the transaction commits, so no upload can start referring to it in between.
+    Returns a dict of what is now unused: "storage_path" (already deleted),
+    "vector_hash" and "content_hash" (each None while something still refers
+    to it), plus the document's "user_id". Returns None if there is no such document.
+    """
+    with db_connection() as conn, conn:
+        doc = conn.execute("SELECT user_id, storage_path, content_hash, vector_hash FROM documents WHERE id = ?",
+                           (doc_id,)).fetchone()
+        if doc is None:
+            return None
+        conn.execute("DELETE FROM messages WHERE document_id = ?", (doc_id,))
+        conn.execute("DELETE FROM documents WHERE id = ?", (doc_id,))
+
+        # Hand the stored text to another document that shares it, if there is one
+        heir = conn.execute(
+            "SELECT id FROM documents WHERE content_hash = ? AND vector_hash IS ? ORDER BY id LIMIT 1",
+            (doc['content_hash'], doc['vector_hash'])
+        ).fetchone()
+        if heir is not None and conn.execute(
+                "SELECT 1 FROM document_texts WHERE document_id = ? AND content_hash = ?",
+                (heir['id'], doc['content_hash'])).fetchone() is None:
+            conn.execute("UPDATE document_texts SET document_id = ? WHERE document_id = ? AND content_hash = ?",
+                         (heir['id'], doc_id, doc['content_hash']))
+        conn.execute("DELETE FROM document_texts WHERE document_id = ?", (doc_id,))
+
+        def unused(query, value):
+            return value if value is not None and conn.execute(query, (value,)).fetchone() is None else None
+
+        # Queued uploads count as references too: their file must still be there when a worker gets to it
+        storage_path = unused(
+            "SELECT 1 FROM documents WHERE storage_path = ?1 UNION ALL "
+            "SELECT 1 FROM ingest_jobs WHERE storage_path = ?1 AND status IN ('queued', 'running') LIMIT 1",
+            doc['storage_path'])
+        if storage_path:
+            # Imported here so this module doesn't create the uploads folder on import
+            from file_handler import delete_uploaded_file
+            delete_uploaded_file(storage_path)
+        vector_hash = unused("SELECT 1 FROM documents WHERE vector_hash = ? LIMIT 1", doc['vector_hash'])
+        content_hash = unused("SELECT 1 FROM documents WHERE content_hash = ? LIMIT 1", doc['content_hash'])
+    return {"user_id": doc['user_id'], "storage_path": storage_path, "vector_hash": vector_hash,
+            "content_hash": content_hash}
+
+@traced("db.get_document_faiss_blob")
+def get_document_faiss_blob(doc_id):
+    """
+    Reads the old in-row index of a document that hasn't been moved to the vector store.
+    """
+    with db_connection() as conn:
+        row = conn.execute("SELECT faiss_index FROM documents WHERE id = ?", (doc_id,)).fetchone()
+    return row[0] if row else None
+
+@traced("db.set_document_vector_hash")
+def set_document_vector_hash(doc_id, vector_hash):
+    try:
+        with db_connection() as conn, conn:
+            # Drop the in-row copy now that the index is in the vector store
+            conn.execute("UPDATE documents SET vector_hash = ?, faiss_index = NULL WHERE id = ?", (vector_hash, doc_id))
+    except Exception as e:
+        print(f"Database Error while setting vector hash: {e}")
+
+@traced("db.set_document_content_hash")
+def set_document_content_hash(doc_id, content_hash):
+    try:
+        with db_connection() as conn, conn:
+            conn.execute("UPDATE documents SET content_hash = ? WHERE id = ?", (content_hash, doc_id))
+    except Exception as e:
+        print(f"Database Error while setting content hash: {e}")
+
+# --- Document Text ---
+@traced("db.add_document_text")
+def add_document_text(document_id, content_hash, full_text_blob, chunks_blob):
+    try:
+        with db_connection() as conn, conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO document_texts (document_id, content_hash, full_text, chunks) VALUES (?, ?, ?, ?)",
+                (document_id, content_hash, full_text_blob, chunks_blob)
+            )
+    except Exception as e:
+        print(f"Database Error while saving document text: {e}")
+
+@traced("db.get_document_text")
+def get_document_text(document_id, content_hash):
+    """
+    Returns the stored text and chunks for a document. Documents with the same
+    content and the same vectors share one stored copy, so a copy saved for any
+    of them is returned (the document's own first).
+    """
+    with db_connection() as conn:
+        return conn.execute(
+            "SELECT t.full_text, t.chunks FROM document_texts t "
+            "JOIN documents source ON source.id = t.document_id "
+            "JOIN documents d ON d.id = ? AND source.vector_hash IS d.vector_hash "
+            "WHERE t.content_hash = ? ORDER BY source.id = d.id DESC LIMIT 1",
+            (document_id, content_hash)
+        ).fetchone()
+
+# --- Embedding Cache ---
+@traced("db.get_cached_embeddings")
+def get_cached_embeddings(model, task_type, text_hashes):
+    """
+    Returns {text_hash: embedding_bytes} for the hashes that are in the cache.
+    """
+    found = {}
+    try:
+        with db_connection() as conn:
+            # SQLite limits how many ? placeholders one query may have
+            for start in range(0, len(text_hashes), 500):
+                batch = text_hashes[start:start + 500]
+                placeholders = ",".join("?" * len(batch))
+                rows = conn.execute(
+                    f"SELECT text_hash, embedding FROM embedding_cache WHERE model = ? AND task_type = ? AND text_hash IN ({placeholders})",
+                    (model, task_type, *batch)
+                )
+                found.update((row[0], row[1]) for row in rows)
+    except Exception as e:
+        # A missing or broken cache only costs us extra API calls
+        print(f"Database Error while reading embedding cache: {e}")
+    return found
+
+@traced("db.add_cached_embeddings")
+def add_cached_embeddings(model, task_type, hash_embedding_pairs):
+    try:
+        with db_connection() as conn, conn:
+            conn.executemany(
+                "INSERT OR IGNORE INTO embedding_cache (model, task_type, text_hash, embedding) VALUES (?, ?, ?, ?)",
+                [(model, task_type, text_hash, embedding) for text_hash, embedding in hash_embedding_pairs]
+            )
+    except Exception as e:
+        print(f"Database Error while writing embedding cache: {e}")
+
+@traced("db.get_cached_section_summaries")
+def get_cached_section_summaries(model, prompt_version, section_hashes):
+    """
+    Returns {section_hash: summary} for the sections that are in the cache.
+    """
+    found = {}
+    try:
+        with db_connection() as conn:
+            for start in range(0, len(section_hashes), 500):
+                batch = section_hashes[start:start + 500]
+                placeholders = ",".join("?" * len(batch))
+                rows = conn.execute(
+                    f"SELECT section_hash, summary FROM section_summaries WHERE model = ? AND prompt_version = ? AND section_hash IN ({placeholders})",
+                    (model, prompt_version, *batch)
+                )
+                found.update((row[0], row[1]) for row in rows)
+    except Exception as e:
+        print(f"Database Error while reading section summaries: {e}")
+    return found
+
+@traced("db.add_cached_section_summary")
+def add_cached_section_summary(model, prompt_version, section_hash, summary):
+    try:
+        with db_connection() as conn, conn:
+            conn.execute(
+                "INSERT OR IGNORE INTO section_summaries (model, prompt_version, section_hash, summary) VALUES (?, ?, ?, ?)",
+                (model, prompt_version, section_hash, summary)
+            )
+    except Exception as e:
+        print(f"Database Error while writing section summary: {e}")
+
+# --- Artifacts ---
+@traced("db.get_artifact")
+def get_artifact(content_hash, artifact_type, prompt_version, model):
+    with db_connection() as conn:
+        return conn.execute(
+            "SELECT * FROM artifacts WHERE content_hash = ? AND artifact_type = ? AND prompt_version = ? AND model = ?",
+            (content_hash, artifact_type, prompt_version, model)
+        ).fetchone()
+
+@traced("db.save_artifact")
+def save_artifact(content_hash, artifact_type, prompt_version, model, payload, file_path=None):
+    try:
+        with db_connection() as conn, conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO artifacts (content_hash, artifact_type, prompt_version, model, payload, file_path) VALUES (?, ?, ?, ?, ?, ?)",
+                (content_hash, artifact_type, prompt_version, model, payload, file_path)
+            )
+    except Exception as e:
+        print(f"Database Error while saving artifact: {e}")
+
+@traced("db.delete_artifacts")
+def delete_artifacts(content_hash=None, artifact_type=None, keep=None):
+    """
+    Deletes artifacts matching `content_hash` and/or `artifact_type`. `keep` is an
+    optional (prompt_version, model) pair whose rows are left alone.
+    Returns the file paths of the deleted rows so their files can be removed.
+    """
+    conditions, params = [], []
+    if content_hash is not None:
+        conditions.append("content_hash = ?")
+        params.append(content_hash)
+    if artifact_type is not None:
+        conditions.append("artifact_type = ?")
+        params.append(artifact_type)
+    if keep is not None:
+        conditions.append("NOT (prompt_version = ? AND model = ?)")
+        params.extend(keep)
+    where = " AND ".join(conditions) or "1"
+    with db_connection() as conn, conn:
+        file_paths = [row[0] for row in conn.execute(
+            f"SELECT file_path FROM artifacts WHERE {where} AND file_path IS NOT NULL", params)]
+        conn.execute(f"DELETE FROM artifacts WHERE {where}", params)
+    return file_paths
+
+# --- Messages ---
+@traced("db.add_messages")
+def add_messages(document_id, messages):
+    """
+    Saves several (role, content) messages in one transaction, e.g. a question and its answer.
+    """
+    try:
+        with db_connection() as conn, conn:
+            conn.executemany(
+                "INSERT INTO messages (document_id, role, content) VALUES (?, ?, ?)",
+                [(document_id, role, content) for role, content in messages]
+            )
+    except Exception as e:
+        print(f"Database Error while adding messages: {e}")
 
 def add_message(document_id, role, content):
-    conn = sqlite3.connect(DATABASE_NAME)
-    cursor = conn.cursor()
+    add_messages(document_id, [(role, content)])
+
+@traced("db.get_messages_by_doc_id")
+def get_messages_by_doc_id(document_id):
+    with db_connection() as conn:
+        # id breaks ties between messages saved in the same second
+        return conn.execute(
+            "SELECT * FROM messages WHERE document_id = ? ORDER BY timestamp ASC, id ASC", (document_id,)
+        ).fetchall()
+
+@traced("db.get_recent_messages")
+def get_recent_messages(document_id, limit=50, before=None):
+    """
+    Returns up to `limit` messages, oldest first, from the newest end of the history.
+    `before` is a (timestamp, id) keyset cursor: only messages older than it are returned,
+    which is how "load older" pages backwards without OFFSET scans.
+    """
+    with db_connection() as conn:
+        if before is None:
+            rows = conn.execute(
+                "SELECT * FROM messages WHERE document_id = ? ORDER BY timestamp DESC, id DESC LIMIT ?",
+                (document_id, limit)
+            ).fetchall()
+        else:
+            rows = conn.execute(
+                "SELECT * FROM messages WHERE document_id = ? AND (timestamp, id) < (?, ?) ORDER BY timestamp DESC, id DESC LIMIT ?",
+                (document_id, before[0], before[1], limit)
+            ).fetchall()
+    return rows[::-1]
+
+@traced("db.get_messages_after")
+def get_messages_after(document_id, after):
+    """
+    Returns every message newer than the (timestamp, id) cursor `after`, oldest first.
+    """
+    with db_connection() as conn:
+        return conn.execute(
+            "SELECT * FROM messages WHERE document_id = ? AND (timestamp, id) > (?, ?) ORDER BY timestamp ASC, id ASC",
+            (document_id, after[0], after[1])
+        ).fetchall()
+
+# --- Ingest Jobs ---
+# Progress columns a worker may update while a job runs
+JOB_PROGRESS_COLUMNS = ("stage", "pages_total", "pages_read", "pages_rendered", "pages_ocrd", "chunks_embedded")
+
+@traced("db.add_ingest_job")
+def add_ingest_job(user_id, original_filename, storage_path, file_type, content_hash):
+    with db_connection() as conn, conn:
+        return conn.execute(
+            "INSERT INTO ingest_jobs (user_id, original_filename, storage_path, file_type, content_hash, stage) VALUES (?, ?, ?, ?, ?, 'queued')",
+            (user_id, original_filename, storage_path, file_type, content_hash)
+        ).lastrowid
+
+_CLAIMABLE_JOB = (
+    "SELECT * FROM ingest_jobs j WHERE status = 'queued' AND attempts < ? AND NOT EXISTS ("
+    "SELECT 1 FROM ingest_jobs running WHERE running.status = 'running' AND running.content_hash = j.content_hash"
+    ") ORDER BY id LIMIT 1"
+)
+
+def claim_next_ingest_job(worker_id, max_attempts):
+    """
+    Atomically marks the oldest queued job as running for this worker and returns it,
+    or returns None if nothing is waiting. A job for a file whose content another
+    job is already processing waits until that one is finished, then reuses its result.
+    """
+    with db_connection() as conn:
+        # A plain read first, so an idle worker polling the queue never takes the write lock
+        if conn.execute(_CLAIMABLE_JOB, (max_attempts,)).fetchone() is None:
+            return None
+        # BEGIN IMMEDIATE takes the write lock first, so two workers can't claim the same job
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            job = conn.execute(_CLAIMABLE_JOB, (max_attempts,)).fetchone()
+            if job:
+                conn.execute(
+                    "UPDATE ingest_jobs SET status = 'running', stage = 'starting', worker_id = ?, attempts = attempts + 1, heartbeat_at = CURRENT_TIMESTAMP WHERE id = ?",
+                    (worker_id, job['id'])
+                )
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+    return job
+
+def update_ingest_job_progress(job_id, progress):
+    """
+    Saves a progress snapshot (see JOB_PROGRESS_COLUMNS) and refreshes the job's heartbeat.
+    """
+    fields = {name: progress[name] for name in JOB_PROGRESS_COLUMNS if name in progress}
+    assignments = "".join(f"{name} = ?, " for name in fields)
     try:
-        cursor.execute(
-            "INSERT INTO messages (document_id, role, content) VALUES (?, ?, ?)",
-            (document_id, role, content)
+        with db_connection() as conn, conn:
+            conn.execute(
+                f"UPDATE ingest_jobs SET {assignments}heartbeat_at = CURRENT_TIMESTAMP WHERE id = ?",
+                (*fields.values(), job_id)
+            )
+    except Exception as e:
+        print(f"Database Error while updating job progress: {e}")
+
+@traced("db.finish_ingest_job")
+def finish_ingest_job(job_id, document_id=None, error=None):
+    status = "failed" if error else "done"
+    with db_connection() as conn, conn:
+        conn.execute(
+            "UPDATE ingest_jobs SET status = ?, stage = ?, document_id = ?, error = ?, heartbeat_at = CURRENT_TIMESTAMP WHERE id = ?",
+            (status, status, document_id, error, job_id)
+        )
+
+@traced("db.retry_or_fail_ingest_job")
+def retry_or_fail_ingest_job(job_id, error, max_attempts):
+    """
+    Puts a failed job back in the queue, unless it has used up its attempts.
+    """
+    with db_connection() as conn, conn:
+        conn.execute(
+            "UPDATE ingest_jobs SET status = CASE WHEN attempts < ? THEN 'queued' ELSE 'failed' END, "
+            "stage = CASE WHEN attempts < ? THEN 'queued' ELSE 'failed' END, error = ? WHERE id = ?",
+            (max_attempts, max_attempts, error, job_id)
+        )
+
+def requeue_stale_ingest_jobs(stale_seconds, max_attempts):
+    """
+    Sends running jobs whose worker has stopped sending heartbeats (it crashed,
+    or the app was restarted) back to the queue, or marks them failed if they
+    have used up their attempts. Returns how many jobs were changed.
+    """
+    with db_connection() as conn, conn:
+        return conn.execute(
+            "UPDATE ingest_jobs SET status = CASE WHEN attempts < ?1 THEN 'queued' ELSE 'failed' END, "
+            "stage = CASE WHEN attempts < ?1 THEN 'queued' ELSE 'failed' END, "
+            "error = CASE WHEN attempts < ?1 THEN error ELSE 'Processing stopped unexpectedly too many times.' END, "
+            "worker_id = NULL WHERE status = 'running' AND heartbeat_at < datetime('now', ?2)",
+            (max_attempts, f"-{int(stale_seconds)} seconds")
+        ).rowcount
+
+def get_ingest_jobs_by_user(user_id, limit=20):
+    with db_connection() as conn:
+        return conn.execute(
+            "SELECT * FROM ingest_jobs WHERE user_id = ? ORDER BY id DESC LIMIT ?", (user_id, limit)
+        ).fetchall()
+
+# --- Bulk Ingest Checkpoints ---
+@traced("db.get_bulk_ingest_checkpoints")
+def get_bulk_ingest_checkpoints(user_id):
+    """
+    Returns {source_path: row} for every file bulk_ingest.py has recorded for a user.
+    """
+    with db_connection() as conn:
+        return {row['source_path']: row for row in conn.execute(
+            "SELECT * FROM bulk_ingest_files WHERE user_id = ?", (user_id,))}
+
+@traced("db.save_bulk_ingest_checkpoint")
+def save_bulk_ingest_checkpoint(user_id, source_path, size, modified_at, status, document_id=None, pages=0, error=None):
+    with db_connection() as conn, conn:
+        conn.execute(
+            "INSERT OR REPLACE INTO bulk_ingest_files (user_id, source_path, size, modified_at, status, document_id, pages, error) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (user_id, source_path, size, modified_at, status, document_id, pages, error)
         )
-        conn.commit()
+
+@traced("db.find_user_document")
+def find_user_document(user_id, content_hash, original_filename):
+    """
+    Returns the id of a user's document with this content and name, or None.
+    """
+    with db_connection() as conn:
+        row = conn.execute(
+            "SELECT id FROM documents WHERE user_id = ? AND content_hash = ? AND original_filename = ? LIMIT 1",
+            (user_id, content_hash, original_filename)
+        ).fetchone()
+    return row[0] if row else None
+
+# --- Tracing ---
+def add_trace_spans(rows, max_rows):
+    """
+    Stores finished spans: (request_id, stage, is_request, started_at, duration_ms, attributes).
+    Now and then the table is trimmed to the newest `max_rows` rows.
+    """
+    try:
+        with db_connection() as conn, conn:
+            conn.executemany(
+                "INSERT INTO trace_spans (request_id, stage, is_request, started_at, duration_ms, attributes) VALUES (?, ?, ?, ?, ?, ?)",
+                rows
+            )
+            last_id = conn.execute("SELECT MAX(id) FROM trace_spans").fetchone()[0] or 0
+            # Trimming every batch would be a scan per flush; every ~1000 rows is plenty
+            if last_id % 1000 < len(rows):
+                conn.execute("DELETE FROM trace_spans WHERE id <= ?", (last_id - max_rows,))
     except Exception as e:
-        print(f"Database Error while adding message: {e}")
-    finally:
-        conn.close()
+        # Metrics must never break the request they describe
+        print(f"Database Error while writing trace spans: {e}")
 
-def get_messages_by_doc_id(document_id):
-    conn = sqlite3.connect(DATABASE_NAME)
-    conn.row_factory = sqlite3.Row
-    cursor = conn.cursor()
-    cursor.execute("SELECT * FROM messages WHERE document_id = ? ORDER BY timestamp ASC", (document_id,))
-    messages = cursor.fetchall()
-    conn.close()
-    return messages
\ No newline at end of file
+def get_trace_spans(since, limit=50000):
+    """
+    Returns the spans started after the `since` unix time, newest first.
+    """
+    with db_connection() as conn:
+        return conn.execute(
+            "SELECT * FROM trace_spans WHERE started_at >= ? ORDER BY started_at DESC LIMIT ?", (since, limit)
+        ).fetchall()
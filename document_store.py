@@ -0,0 +1,162 @@
+import hashlib
+import json
+import zlib
+import numpy as np
+from database_utils import add_document_text, get_document_text, set_document_content_hash, delete_document
+
+# Files are hashed in blocks so large scans never have to sit in memory at once
+HASH_BLOCK_SIZE = 1024 * 1024
+
+def compute_file_hash(file_path):
+    """
+    Returns the SHA-256 hex digest of a file's content.
+    """
+    sha256 = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(HASH_BLOCK_SIZE), b""):
+            sha256.update(block)
+    return sha256.hexdigest()
+
+def save_document_text(document_id, content_hash, full_text, chunks):
+    """
+    Compresses the extracted text and chunk list and stores them for a document.
+    """
+    full_text_blob = zlib.compress(full_text.encode("utf-8"))
+    chunks_blob = zlib.compress(json.dumps(chunks).encode("utf-8"))
+    add_document_text(document_id, content_hash, full_text_blob, chunks_blob)
+
+class SpanChunks:
+    """
+    The chunks of a document as (start, end, page) offsets into its full text.
+    Behaves like a read-only list of chunk strings: a chunk's text is only sliced
+    out of the full text when it is asked for, so nothing is stored twice.
+    """
+
+    def __init__(self, full_text, spans):
+        self.full_text = full_text
+        self.spans = np.asarray(spans, dtype=np.int64).reshape(-1, 3)
+
+    def __len__(self):
+        return len(self.spans)
+
+    def __getitem__(self, i):
+        start, end, _ = self.spans[i]
+        return self.full_text[start:end]
+
+    def __iter__(self):
+        for start, end, _ in self.spans:
+            yield self.full_text[start:end]
+
+    def span(self, i):
+        """Returns (start, end) of chunk i in the full text."""
+        start, end, _ = self.spans[i]
+        return int(start), int(end)
+
+    def page(self, i):
+        """Returns the number of the page chunk i starts on."""
+        return int(self.spans[i][2])
+
+class StreamingTextWriter:
+    """
+    Compresses pages and chunk spans as they are produced, so the ingest pipeline
+    never has to hold the whole uncompressed document in memory.
+    Chunks are stored as {"spans": [[start, end, page], ...]} offsets into the
+    text rather than as copies of it; load_document_text turns them into SpanChunks.
+    """
+
+    def __init__(self, page_separator="\n\n"):
+        self.page_separator = page_separator
+        self._text = zlib.compressobj()
+        self._chunks = zlib.compressobj()
+        self._text_parts = []
+        self._chunk_parts = [self._chunks.compress(b'{"spans":[')]
+        self.page_count = 0
+        self.chunk_count = 0
+        self.text_length = 0
+
+    def add_page(self, page_text):
+        if not page_text.strip():
+            return
+        if self.page_count:
+            page_text = self.page_separator + page_text
+        self._text_parts.append(self._text.compress(page_text.encode("utf-8")))
+        self.page_count += 1
+        self.text_length += len(page_text)
+
+    def add_span(self, start, end, page_number):
+        prefix = "," if self.chunk_count else ""
+        self._chunk_parts.append(self._chunks.compress(f"{prefix}[{start},{end},{page_number}]".encode("utf-8")))
+        self.chunk_count += 1
+
+    def finish(self):
+        """
+        Returns (full_text_blob, chunks_blob).
+        """
+        full_text_blob = b"".join(self._text_parts) + self._text.flush()
+        chunks_blob = b"".join(self._chunk_parts) + self._chunks.compress(b"]}") + self._chunks.flush()
+        return full_text_blob, chunks_blob
+
+def document_content_hash(doc_info):
+    """
+    Returns a document's content hash, computing and saving it for older rows.
+    """
+    content_hash = doc_info.get('content_hash')
+    if not content_hash:
+        content_hash = compute_file_hash(doc_info['storage_path'])
+        set_document_content_hash(doc_info['id'], content_hash)
+    return content_hash
+
+def load_document_text(doc_info):
+    """
+    Returns (full_text, chunks) for a document row. `chunks` is a SpanChunks for
+    documents chunked by span, or a plain list of strings for older ones.
+    Reads the stored copy written at upload time. Documents uploaded before the
+    store existed are extracted once here and then saved, so later visits are fast.
+    """
+    # Imported here so pages that only read stored text don't need the AI stack
+    from ai_core import extract_text_from_pdf, split_text_into_chunks
+
+    content_hash = document_content_hash(doc_info)
+    row = get_document_text(doc_info['id'], content_hash)
+    if row:
+        full_text = zlib.decompress(row['full_text']).decode("utf-8")
+        chunks = json.loads(zlib.decompress(row['chunks']).decode("utf-8"))
+        if isinstance(chunks, dict):
+            chunks = SpanChunks(full_text, chunks["spans"])
+        return full_text, chunks
+
+    # Not stored yet (older upload): extract once and keep the result.
+    # The old chunker is used on purpose so the chunks match the stored index.
+    full_text = extract_text_from_pdf(doc_info['storage_path'])
+    if not full_text:
+        return None, []
+    chunks = split_text_into_chunks(full_text)
+    save_document_text(doc_info['id'], content_hash, full_text, chunks)
+    return full_text, chunks
+
+def remove_document(doc_id):
+    """
+    Deletes a document: its row, chat history, library entry and cached working
+    set. The stored file, vectors, text and generated artifacts are shared by
+    every document with the same content, so they are only removed along with
+    the last one. Returns False if there was no such document.
+    """
+    # Imported here so pages that only read stored text don't need faiss
+    from artifact_store import invalidate_artifacts
+    from library_index import remove_document_from_library
+    from vector_store import delete_index
+    from working_set import invalidate_document
+
+    released = delete_document(doc_id)
+    if released is None:
+        return False
+    invalidate_document(doc_id)
+    try:
+        remove_document_from_library(released["user_id"], doc_id)
+    except Exception as e:
+        print(f"Could not remove document {doc_id} from the library index: {e}")
+    if released["vector_hash"]:
+        delete_index(released["vector_hash"])
+    if released["content_hash"]:
+        invalidate_artifacts(released["content_hash"])
+    return True
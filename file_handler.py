@@ -1,27 +1,69 @@
+import hashlib
 import os
 import uuid
 
 # Create a directory to store uploaded files if it doesn't exist
 UPLOADS_DIR = "user_uploads"
 os.makedirs(UPLOADS_DIR, exist_ok=True)
+# Uploads are copied to disk this many bytes at a time
+UPLOAD_BLOCK_SIZE = 1024 * 1024
 
 def save_uploaded_file(uploaded_file):
     """
-    Saves an uploaded file to the server with a unique filename.
-    Returns the path where the file is stored.
+    Saves an uploaded file under the SHA-256 hash of its content and returns
+    (path, content_hash). The file is hashed while it is copied in fixed-size
+    blocks, so it is never held in memory twice. Identical uploads share one
+    file on disk. A file may be deleted again until a job or document refers to
+    it, so call ensure_saved once one does.
     """
-    # Generate a unique filename to prevent overwriting files with the same name
-    unique_id = uuid.uuid4().hex
+    uploaded_file.seek(0)
+    return _save_stream(uploaded_file, uploaded_file.name)
+
+def save_local_file(source_path):
+    """
+    Copies a file from the server's own disk into the upload store, the same
+    way as save_uploaded_file. Returns (path, content_hash).
+    """
+    with open(source_path, "rb") as source:
+        return _save_stream(source, source_path)
+
+def _save_stream(stream, filename):
     # Get the file extension (e.g., .pdf)
-    file_extension = os.path.splitext(uploaded_file.name)[1]
-    # Create the new unique filename
-    unique_filename = f"{unique_id}{file_extension}"
-    
-    # Create the full path to save the file
-    save_path = os.path.join(UPLOADS_DIR, unique_filename)
-    
-    # Write the file's content to the new path
-    with open(save_path, "wb") as f:
-        f.write(uploaded_file.getbuffer())
-        
-    return save_path
\ No newline at end of file
+    file_extension = os.path.splitext(filename)[1].lower()
+    # Written under a temporary name first, so a half-written file never has a real name
+    temp_path = os.path.join(UPLOADS_DIR, f".{uuid.uuid4().hex}.part")
+    sha256 = hashlib.sha256()
+    try:
+        with open(temp_path, "wb") as f:
+            for block in iter(lambda: stream.read(UPLOAD_BLOCK_SIZE), b""):
+                sha256.update(block)
+                f.write(block)
+        content_hash = sha256.hexdigest()
+        save_path = os.path.join(UPLOADS_DIR, f"{content_hash}{file_extension}")
+        # Always put the new copy in place: an existing one may be deleted at any moment
+        # by the removal of the last document using it. The content is the same either way.
+        os.replace(temp_path, save_path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+    return save_path, content_hash
+
+def ensure_saved(storage_path, save):
+    """
+    Saves the file again with `save()` if it was deleted between being saved and
+    being recorded on a job or document. database_utils.delete_document only
+    deletes files nothing refers to, so once recorded the file stays.
+    """
+    if not os.path.exists(storage_path):
+        save()
+
+def delete_uploaded_file(storage_path):
+    """
+    Removes a stored upload. Only database_utils.delete_document calls this,
+    once no document or job refers to the file.
+    """
+    try:
+        os.remove(storage_path)
+    except FileNotFoundError:
+        pass
@@ -0,0 +1,222 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from ai_core import (iter_pdf_pages, iter_chunk_spans, embed_texts, faiss_index_to_bytes,
+                     extract_text_from_image, PAGE_SEPARATOR, EMBED_BATCH_SIZE, EMBED_CONCURRENCY)
+from database_utils import add_document, add_shared_document, find_ingested_document
+from document_store import StreamingTextWriter
+from library_index import add_document_to_library
+from providers import get_embedder
+from tracing import in_request
+from vector_store import choose_vector_index_type, build_vector_index, read_index_bytes
+import faiss
+import numpy as np
+
+# How many chunks are handed to embed_texts at once. It splits them into
+# concurrent API batches, so a window keeps every embedding worker busy.
+EMBED_WINDOW_SIZE = EMBED_BATCH_SIZE * EMBED_CONCURRENCY
+
+class IngestProgress:
+    """
+    Thread-safe counters for one ingest (pages_total, pages_read, pages_rendered,
+    pages_ocrd, chunks_embedded) plus the current stage.
+    `on_change` receives a snapshot dict on every stage change and at most once
+    per `interval` seconds otherwise, so frequent updates stay cheap.
+    """
+
+    def __init__(self, on_change=None, interval=1.0):
+        self.on_change = on_change
+        self.interval = interval
+        self.counts = {"stage": "starting", "pages_total": 0, "pages_read": 0,
+                       "pages_rendered": 0, "pages_ocrd": 0, "chunks_embedded": 0}
+        self._lock = threading.Lock()
+        self._reported_at = 0.0
+
+    def set(self, name, value):
+        with self._lock:
+            self.counts[name] = value
+        self._report(force=(name == "stage"))
+
+    def add(self, name, amount=1):
+        with self._lock:
+            self.counts[name] += amount
+        self._report()
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self.counts)
+
+    def _report(self, force=False):
+        if self.on_change is None:
+            return
+        now = time.monotonic()
+        with self._lock:
+            if not force and now - self._reported_at < self.interval:
+                return
+            self._reported_at = now
+            snapshot = dict(self.counts)
+        self.on_change(snapshot)
+
+def _batched(items, batch_size):
+    iterator = iter(items)
+    while batch := list(islice(iterator, batch_size)):
+        yield batch
+
+def _ingest_pages(page_texts, writer, progress=None, window_size=EMBED_WINDOW_SIZE):
+    """
+    Chunks (page_number, text) pairs as they arrive, records each chunk's span in
+    `writer`, and embeds the chunks a window at a time on a background thread, so
+    the next pages are parsed while the previous window is embedding.
+    Returns (FAISS index bytes, index type), or (None, None) if there was nothing
+    to embed. Vectors are collected in a flat index; once the document's size is
+    known, larger ones are re-encoded as the type choose_vector_index_type picks.
+    """
+    index = None
+
+    def add_to_index(embeddings):
+        nonlocal index
+        vectors = np.array(embeddings).astype('float32')
+        if index is None:
+            index = faiss.IndexFlatL2(vectors.shape[1])
+        index.add(vectors)
+        if progress is not None:
+            progress.add("chunks_embedded", len(vectors))
+
+    def record_chunks(spans):
+        for start, end, page_number, chunk in spans:
+            writer.add_span(start, end, page_number)
+            yield chunk
+
+    with ThreadPoolExecutor(max_workers=1) as embed_pool:
+        in_flight = None
+        for window in _batched(record_chunks(iter_chunk_spans(page_texts)), window_size):
+            future = embed_pool.submit(in_request(embed_texts), window)
+            # Only one window waits at a time, which keeps memory bounded
+            if in_flight is not None:
+                add_to_index(in_flight.result())
+            in_flight = future
+        if in_flight is not None:
+            add_to_index(in_flight.result())
+
+    if index is None:
+        return None, None
+    index_type = choose_vector_index_type(index.ntotal)
+    if index_type != "flat":
+        index, index_type = build_vector_index(index.reconstruct_n(0, index.ntotal), index_type)
+    return faiss_index_to_bytes(index), index_type
+
+def _finish(writer, encoded_index, started_at):
+    faiss_index_data, index_type = encoded_index
+    if faiss_index_data is None:
+        return None
+    full_text_blob, chunks_blob = writer.finish()
+    return {
+        "full_text_blob": full_text_blob,
+        "chunks_blob": chunks_blob,
+        "faiss_index": faiss_index_data,
+        "index_type": index_type,
+        "embedding_model": get_embedder().name,
+        "page_count": writer.page_count,
+        "chunk_count": writer.chunk_count,
+        "seconds": time.perf_counter() - started_at,
+    }
+
+def ingest_pdf(pdf_path, on_error=print, progress=None):
+    """
+    Streams a PDF through extraction -> chunking -> embedding.
+    Pages are yielded as they are extracted (OCR'ing only scanned pages), chunked
+    incrementally, and embedded in batches while later pages are still being read.
+    Returns a dict with the compressed text and chunks, the FAISS index bytes and
+    some counts, or None if no text could be extracted.
+    `on_error` is called with a message for each page that failed OCR.
+    `progress` is an optional IngestProgress.
+    """
+    started_at = time.perf_counter()
+    writer = StreamingTextWriter(PAGE_SEPARATOR)
+    if progress is not None:
+        progress.set("stage", "processing")
+
+    def page_texts():
+        for i, page_text, error in iter_pdf_pages(pdf_path, progress=progress):
+            if error:
+                on_error(f"OCR Error on page {i+1}: {error}")
+            writer.add_page(page_text)
+            yield i, page_text
+
+    return _finish(writer, _ingest_pages(page_texts(), writer, progress), started_at)
+
+def ingest_image(image_bytes, filename, progress=None):
+    """
+    OCRs an uploaded image and runs its text through the same chunk/embed steps.
+    """
+    started_at = time.perf_counter()
+    if progress is not None:
+        progress.set("stage", "processing")
+        progress.set("pages_total", 1)
+    text = extract_text_from_image(image_bytes, filename)
+    if not text:
+        return None
+    if progress is not None:
+        progress.add("pages_ocrd")
+    writer = StreamingTextWriter(PAGE_SEPARATOR)
+    writer.add_page(text)
+    return _finish(writer, _ingest_pages([(0, text)], writer, progress), started_at)
+
+def ingest_saved_file(user_id, original_filename, storage_path, file_type, content_hash,
+                      progress=None, on_error=print, add_to_library=True, job_id=None):
+    """
+    The whole upload pipeline for a file that is already saved on disk:
+    extract, chunk and embed it, then record the document, its text and its
+    library entry. Returns the new document id. Raises RuntimeError on failure.
+    A file that was already processed (same content hash) is not read again:
+    the new document shares the earlier one's text and vectors.
+    With add_to_library=False the library index is left to library_index.sync_library,
+    for callers ingesting in several processes at once (each would hold its own copy).
+    `job_id` is recorded on the ingest job together with the new document (see add_document).
+    """
+    existing = find_ingested_document(content_hash, get_embedder().name) if content_hash else None
+    if existing is not None:
+        return _add_duplicate(user_id, original_filename, storage_path, existing, progress, add_to_library, job_id)
+
+    if "pdf" in file_type:
+        result = ingest_pdf(storage_path, on_error=on_error, progress=progress)
+    elif "image" in file_type:
+        with open(storage_path, "rb") as f:
+            result = ingest_image(f.read(), original_filename, progress=progress)
+    else:
+        raise RuntimeError(f"Unsupported file type: {file_type}")
+    if not result:
+        raise RuntimeError("Could not extract any text from the file.")
+
+    if progress is not None:
+        progress.set("stage", "saving")
+    # The extracted text is kept with it so the other pages never re-read the file
+    doc_id = add_document(user_id, original_filename, storage_path, result['faiss_index'], content_hash,
+                          result['index_type'], (result['full_text_blob'], result['chunks_blob']), job_id,
+                          result['embedding_model'])
+    if not doc_id:
+        raise RuntimeError("Failed to save the document to your library.")
+    # Make it searchable together with the rest of the user's library
+    if not add_to_library:
+        return doc_id
+    try:
+        add_document_to_library(user_id, doc_id, result['faiss_index'], result['embedding_model'])
+    except Exception as e:
+        print(f"Could not add document {doc_id} to the library index: {e}")
+    return doc_id
+
+def _add_duplicate(user_id, original_filename, storage_path, existing, progress=None, add_to_library=True,
+                   job_id=None):
+    if progress is not None:
+        progress.set("stage", "saving")
+    doc_id = add_shared_document(user_id, original_filename, storage_path, existing['id'], job_id)
+    if not doc_id:
+        raise RuntimeError("Failed to save the document to your library.")
+    if not add_to_library:
+        return doc_id
+    try:
+        add_document_to_library(user_id, doc_id, read_index_bytes(existing['vector_hash']), existing['embedding_model'])
+    except Exception as e:
+        print(f"Could not add document {doc_id} to the library index: {e}")
+    return doc_id
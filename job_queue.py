@@ -0,0 +1,117 @@
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from database_utils import (add_ingest_job, claim_next_ingest_job, update_ingest_job_progress,
+                            finish_ingest_job, retry_or_fail_ingest_job, requeue_stale_ingest_jobs,
+                            get_single_document)
+from settings import get_setting
+from tracing import request
+
+# --- Settings ---
+# Background threads processing uploads in this app process
+INGEST_WORKERS = get_setting("INGEST_WORKERS", 2)
+# A running job without a heartbeat for this long is assumed dead and requeued
+JOB_STALE_SECONDS = get_setting("JOB_STALE_SECONDS", 120)
+JOB_MAX_ATTEMPTS = get_setting("JOB_MAX_ATTEMPTS", 3)
+# How long an idle worker waits before looking for new jobs again
+IDLE_POLL_SECONDS = 1.0
+# How often a worker looks for jobs left behind by a dead one (it also does so when it starts)
+REQUEUE_INTERVAL_SECONDS = JOB_STALE_SECONDS / 4
+
+_workers = []
+_workers_lock = threading.Lock()
+_wake_up = threading.Event()
+
+def submit_ingest_job(user_id, original_filename, storage_path, file_type, content_hash):
+    """
+    Queues an already-saved upload for background processing and returns the job id.
+    """
+    job_id = add_ingest_job(user_id, original_filename, storage_path, file_type, content_hash)
+    ensure_workers_started()
+    _wake_up.set()
+    return job_id
+
+def _is_retryable(error):
+    """
+    True for failures that may go away on their own: timeouts, rate limits,
+    server errors and a locked database. A file that can't be read fails the
+    same way on every attempt.
+    """
+    if isinstance(error, sqlite3.OperationalError):
+        return "locked" in str(error) or "busy" in str(error)
+    # Imported here so submitting a job doesn't load the AI stack
+    from ai_core import _is_transient_error
+    return _is_transient_error(error)
+
+def run_ingest_job(job):
+    """
+    Processes one claimed job, reporting progress into its row as it goes.
+    """
+    # An earlier attempt saved the document and then died before finishing the job.
+    # The library index picks the document up on its next sync.
+    if job['document_id'] is not None and get_single_document(job['document_id']) is not None:
+        finish_ingest_job(job['id'], document_id=job['document_id'])
+        return
+
+    # Imported here so submitting a job doesn't load the AI stack
+    from ingest import IngestProgress, ingest_saved_file
+
+    progress = IngestProgress(on_change=lambda snapshot: update_ingest_job_progress(job['id'], snapshot))
+
+    # Keep the heartbeat fresh even while one slow page is being OCR'd
+    finished = threading.Event()
+    def heartbeat():
+        while not finished.wait(JOB_STALE_SECONDS / 4):
+            update_ingest_job_progress(job['id'], {})
+    threading.Thread(target=heartbeat, daemon=True).start()
+
+    try:
+        with request("ingest_job", job_id=job['id'], file_type=job['file_type']) as trace:
+            doc_id = ingest_saved_file(job['user_id'], job['original_filename'], job['storage_path'],
+                                       job['file_type'], job['content_hash'], progress=progress, job_id=job['id'])
+            trace.set(**{key: value for key, value in progress.snapshot().items() if isinstance(value, int)})
+    except Exception as e:
+        print(f"Ingest job {job['id']} failed: {e}")
+        if _is_retryable(e):
+            retry_or_fail_ingest_job(job['id'], str(e), JOB_MAX_ATTEMPTS)
+        else:
+            finish_ingest_job(job['id'], error=str(e))
+        return
+    finally:
+        finished.set()
+    update_ingest_job_progress(job['id'], progress.snapshot())
+    finish_ingest_job(job['id'], document_id=doc_id)
+
+def _worker_loop(worker_id):
+    next_requeue_at = 0.0
+    while True:
+        try:
+            # Pick up work left behind by a crashed worker before taking new jobs.
+            # That is a write, so an idle worker only does it now and then.
+            if time.monotonic() >= next_requeue_at:
+                requeue_stale_ingest_jobs(JOB_STALE_SECONDS, JOB_MAX_ATTEMPTS)
+                next_requeue_at = time.monotonic() + REQUEUE_INTERVAL_SECONDS
+            job = claim_next_ingest_job(worker_id, JOB_MAX_ATTEMPTS)
+        except Exception as e:
+            print(f"Ingest worker {worker_id} could not read the job queue: {e}")
+            job = None
+        if job is None:
+            _wake_up.wait(IDLE_POLL_SECONDS)
+            _wake_up.clear()
+            continue
+        run_ingest_job(job)
+
+def ensure_workers_started(worker_count=None):
+    """
+    Starts the background worker threads once per process. Safe to call on every rerun.
+    """
+    with _workers_lock:
+        if _workers:
+            return
+        for n in range(worker_count or INGEST_WORKERS):
+            worker_id = f"{os.getpid()}-{uuid.uuid4().hex[:8]}-{n}"
+            thread = threading.Thread(target=_worker_loop, args=(worker_id,), name=f"ingest-worker-{n}", daemon=True)
+            thread.start()
+            _workers.append(thread)
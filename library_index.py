@@ -0,0 +1,335 @@
+import io
+import json
+import math
+import os
+import threading
+import faiss
+import numpy as np
+from settings import get_setting
+
+# Where each user's library index lives on disk
+LIBRARY_INDEX_DIR = "library_indexes"
+# Vector ids pack (document_id, chunk_id) into one int64: document_id << CHUNK_ID_BITS | chunk_id
+CHUNK_ID_BITS = 20
+# Index type by size: exact flat search while small, then HNSW, then IVF for very large libraries
+FLAT_MAX_VECTORS = get_setting("LIBRARY_FLAT_MAX_VECTORS", 20000)
+HNSW_MAX_VECTORS = get_setting("LIBRARY_HNSW_MAX_VECTORS", 500000)
+# Rebuild without deleted documents once this share of vectors is dead
+COMPACT_DEAD_FRACTION = get_setting("LIBRARY_COMPACT_DEAD_FRACTION", 0.2)
+HNSW_EF_SEARCH = 64
+IVF_NPROBE = 16
+
+os.makedirs(LIBRARY_INDEX_DIR, exist_ok=True)
+
+def make_vector_id(document_id, chunk_id):
+    return (int(document_id) << CHUNK_ID_BITS) | int(chunk_id)
+
+def split_vector_id(vector_id):
+    return int(vector_id) >> CHUNK_ID_BITS, int(vector_id) & ((1 << CHUNK_ID_BITS) - 1)
+
+def choose_index_type(vector_count):
+    if vector_count <= FLAT_MAX_VECTORS:
+        return "flat"
+    if vector_count <= HNSW_MAX_VECTORS:
+        return "hnsw"
+    return "ivf"
+
+def _document_selector(chunk_counts):
+    """
+    Builds a FAISS selector matching every chunk of the given documents
+    ({document_id: number of chunks}). It is one hashed set of vector ids, so
+    checking a vector costs the same however many documents are allowed.
+    """
+    ids = np.concatenate([make_vector_id(document_id, 0) + np.arange(count, dtype='int64')
+                          for document_id, count in chunk_counts.items()])
+    return faiss.IDSelectorBatch(ids)
+
+
+class LibraryIndex:
+    """
+    One vector index over every chunk of every document in a library (a user's
+    uploads, or any shared collection), keyed by (document_id, chunk_id).
+    Documents are added incrementally. Deleting one only records a tombstone;
+    tombstoned vectors are filtered out of searches and dropped for good at the
+    next compaction. The index type follows the library's size (see choose_index_type).
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.index_path = os.path.join(LIBRARY_INDEX_DIR, f"{name}.faiss")
+        self.meta_path = os.path.join(LIBRARY_INDEX_DIR, f"{name}.json")
+        self.lock = threading.RLock()
+        self.clear()
+        if os.path.exists(self.meta_path) and os.path.exists(self.index_path):
+            with open(self.meta_path) as f:
+                self.meta = json.load(f)
+            self.index = faiss.read_index(self.index_path)
+        self.loaded_mtime = self._file_mtime()
+
+    def clear(self):
+        """
+        Empties the library in memory; the files on disk are replaced at the next save.
+        """
+        with self.lock:
+            self.index = None
+            # document_id -> number of chunks; tombstones are deleted document ids.
+            # embedding_model names the embedder all the vectors came from (missing in older files).
+            self.meta = {"index_type": None, "dimension": None, "embedding_model": None, "documents": {},
+                         "tombstones": []}
+
+    # --- Bookkeeping ---
+    @property
+    def documents(self):
+        return {int(doc_id): count for doc_id, count in self.meta["documents"].items()}
+
+    @property
+    def tombstones(self):
+        return set(self.meta["tombstones"])
+
+    def live_document_ids(self):
+        return set(self.documents) - self.tombstones
+
+    def vector_count(self):
+        return self.index.ntotal if self.index is not None else 0
+
+    def dead_vector_count(self):
+        documents = self.documents
+        return sum(documents.get(doc_id, 0) for doc_id in self.tombstones)
+
+    def _save(self):
+        # Write to temporary files first so a crash never leaves half an index behind
+        faiss.write_index(self.index, self.index_path + ".tmp")
+        with open(self.meta_path + ".tmp", "w") as f:
+            json.dump(self.meta, f)
+        os.replace(self.index_path + ".tmp", self.index_path)
+        os.replace(self.meta_path + ".tmp", self.meta_path)
+        self.loaded_mtime = self._file_mtime()
+
+    def _file_mtime(self):
+        # The meta file is replaced last, so its time stamp marks a complete save
+        try:
+            return os.stat(self.meta_path).st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    def is_stale(self):
+        """
+        True if another process (e.g. bulk_ingest.py) saved this library since it was loaded here.
+        """
+        return self._file_mtime() != self.loaded_mtime
+
+    # --- Building ---
+    def _new_index(self, index_type, dimension, training_vectors=None):
+        if index_type == "hnsw":
+            inner = faiss.IndexHNSWFlat(dimension, 32)
+        elif index_type == "ivf":
+            nlist = int(4 * math.sqrt(len(training_vectors)))
+            inner = faiss.IndexIVFFlat(faiss.IndexFlatL2(dimension), dimension, nlist)
+            inner.train(training_vectors)
+        else:
+            inner = faiss.IndexFlatL2(dimension)
+        return faiss.IndexIDMap2(inner)
+
+    def _add_vectors(self, vectors, ids):
+        self.index.add_with_ids(vectors, ids)
+        inner = faiss.downcast_index(self.index.index)
+        if isinstance(inner, faiss.IndexIVF):
+            # Needed so vectors can be reconstructed at the next rebuild
+            inner.make_direct_map()
+
+    def _rebuild(self, index_type=None):
+        """
+        Rebuilds the index from the live vectors only, optionally changing its type.
+        """
+        live = sorted(self.live_document_ids())
+        documents = self.documents
+        ids = np.array([make_vector_id(doc_id, chunk_id)
+                        for doc_id in live for chunk_id in range(documents[doc_id])], dtype='int64')
+        vectors = self.index.reconstruct_batch(ids) if len(ids) else np.zeros((0, self.meta["dimension"]), dtype='float32')
+        index_type = index_type or choose_index_type(len(ids))
+        self.index = self._new_index(index_type, self.meta["dimension"], vectors)
+        if len(ids):
+            self._add_vectors(vectors, ids)
+        self.meta["index_type"] = index_type
+        self.meta["documents"] = {str(doc_id): documents[doc_id] for doc_id in live}
+        self.meta["tombstones"] = []
+
+    def add_document(self, document_id, vectors, save=True, embedding_model=None):
+        """
+        Adds (or re-adds) all chunk vectors of one document. Row i is chunk i.
+        Pass save=False when adding many documents and call save() once after.
+        Raises ValueError if `embedding_model` isn't the one the library was built with.
+        """
+        vectors = np.ascontiguousarray(vectors, dtype='float32')
+        with self.lock:
+            library_model = self.meta.get("embedding_model")
+            if embedding_model is not None and library_model is not None and embedding_model != library_model:
+                raise ValueError(f"Library {self.name} holds vectors from {library_model}, not {embedding_model}.")
+            if self.index is None:
+                self.meta["embedding_model"] = embedding_model
+                self.meta["dimension"] = vectors.shape[1]
+                self.meta["index_type"] = "flat"
+                self.index = self._new_index("flat", vectors.shape[1])
+            if document_id in self.documents and document_id not in self.tombstones:
+                return
+            if document_id in self.tombstones:
+                # Its old vectors are still in the index under the same ids, so clear them first
+                self._rebuild()
+            ids = np.array([make_vector_id(document_id, i) for i in range(len(vectors))], dtype='int64')
+            self._add_vectors(vectors, ids)
+            self.meta["documents"][str(document_id)] = len(vectors)
+
+            # Move to a faster index type once the library has grown into it
+            if choose_index_type(self.vector_count()) != self.meta["index_type"]:
+                self._rebuild()
+            if save:
+                self._save()
+
+    def save(self):
+        with self.lock:
+            if self.index is not None:
+                self._save()
+
+    def remove_document(self, document_id):
+        """
+        Tombstones a document, and compacts once enough of the index is dead.
+        """
+        with self.lock:
+            if document_id not in self.documents or document_id in self.tombstones:
+                return
+            self.meta["tombstones"].append(document_id)
+            if self.dead_vector_count() > COMPACT_DEAD_FRACTION * self.vector_count():
+                self._rebuild()
+            self._save()
+
+    def compact(self):
+        with self.lock:
+            if self.index is not None:
+                self._rebuild()
+                self._save()
+
+    # --- Searching ---
+    def search(self, query_embedding, k=5, document_ids=None):
+        """
+        Searches the whole library, or only `document_ids`, in one call.
+        Returns a list of (document_id, chunk_id, distance), nearest first.
+        """
+        with self.lock:
+            if self.index is None or self.vector_count() == 0:
+                return []
+            allowed = self.live_document_ids()
+            if document_ids is not None:
+                allowed &= set(document_ids)
+            if not allowed:
+                return []
+
+            inner = faiss.downcast_index(self.index.index)
+            if isinstance(inner, faiss.IndexHNSW):
+                params = faiss.SearchParametersHNSW()
+                params.efSearch = max(HNSW_EF_SEARCH, k)
+            elif isinstance(inner, faiss.IndexIVF):
+                params = faiss.SearchParametersIVF()
+                params.nprobe = IVF_NPROBE
+            else:
+                params = faiss.SearchParameters()
+            # Skip the selector when every live document is allowed and nothing is tombstoned.
+            # FAISS doesn't own the selector, so it is kept in a local until the search is done.
+            selector = None
+            if allowed != set(self.documents):
+                documents = self.documents
+                selector = _document_selector({doc_id: documents[doc_id] for doc_id in allowed})
+                params.sel = selector
+
+            query = np.asarray(query_embedding, dtype='float32').reshape(1, -1)
+            distances, ids = self.index.search(query, k, params=params)
+
+        results = []
+        for distance, vector_id in zip(distances[0], ids[0]):
+            if vector_id >= 0:
+                document_id, chunk_id = split_vector_id(vector_id)
+                results.append((document_id, chunk_id, float(distance)))
+        return results
+
+
+# Loaded libraries, shared by every session in this process
+_libraries = {}
+_libraries_lock = threading.Lock()
+
+def get_library(user_id):
+    """
+    Returns the user's library index, loaded again if another process saved it
+    since. One built by a different embedder than the current one can't be
+    searched, so it is emptied and sync_library refills it.
+    """
+    from providers import get_embedder
+    name = f"user_{user_id}"
+    with _libraries_lock:
+        if name not in _libraries or _libraries[name].is_stale():
+            _libraries[name] = LibraryIndex(name)
+        library = _libraries[name]
+    if library.meta.get("embedding_model") not in (None, get_embedder().name):
+        library.clear()
+    return library
+
+def vectors_from_index_bytes(faiss_index_data):
+    """
+    Pulls the chunk vectors back out of a document's own serialized index.
+    """
+    index = faiss.read_index(faiss.PyCallbackIOReader(io.BytesIO(faiss_index_data).read))
+    return index.reconstruct_n(0, index.ntotal)
+
+def add_document_to_library(user_id, document_id, faiss_index_data, embedding_model=None):
+    get_library(user_id).add_document(document_id, vectors_from_index_bytes(faiss_index_data),
+                                      embedding_model=embedding_model)
+
+def remove_document_from_library(user_id, document_id):
+    get_library(user_id).remove_document(document_id)
+
+def sync_library(user_id, document_rows):
+    """
+    Adds any of the user's documents that are not in their library index yet,
+    e.g. ones uploaded before the library index existed. Documents whose vectors
+    came from another embedder than the current one are left out.
+    """
+    from providers import get_embedder
+    from vector_store import ensure_vector_hash, load_index
+    library = get_library(user_id)
+    embedding_model = get_embedder().name
+    known = set(library.documents)
+    added = False
+    for row in document_rows:
+        row = dict(row)
+        if row['id'] not in known and row.get('embedding_model') in (None, embedding_model):
+            vector_hash = ensure_vector_hash(row)
+            if vector_hash:
+                index = load_index(vector_hash)
+                library.add_document(row['id'], index.reconstruct_n(0, index.ntotal), save=False,
+                                     embedding_model=row.get('embedding_model'))
+                added = True
+    # Written once, not once per document
+    if added:
+        library.save()
+
+def search_user_library(user_id, question, document_rows, k=5, document_ids=None):
+    """
+    Finds the passages most relevant to `question` across the user's documents
+    (or only `document_ids`) with one vector search.
+    Returns a list of dicts with document_id, chunk_id, distance and text.
+    """
+    from ai_core import embed_query
+    from database_utils import get_single_document
+    from working_set import get_document_working_set
+
+    sync_library(user_id, document_rows)
+    library = get_library(user_id)
+    query_embedding = embed_query(question, library.meta["dimension"], library.meta.get("embedding_model"))
+    hits = library.search(query_embedding, k=k, document_ids=document_ids)
+
+    results = []
+    for document_id, chunk_id, distance in hits:
+        document = get_single_document(document_id)
+        working_set = get_document_working_set(dict(document)) if document else None
+        if working_set and chunk_id < len(working_set['chunks']):
+            results.append({"document_id": document_id, "chunk_id": chunk_id,
+                            "distance": distance, "text": working_set['chunks'][chunk_id]})
+    return results
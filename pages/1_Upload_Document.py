@@ -1,9 +1,7 @@
 import streamlit as st
-from database_utils import add_document
-from file_handler import save_uploaded_file
-from ai_core import extract_text_from_pdf, extract_text_from_image, split_text_into_chunks, create_embeddings
-import time
-import os
+from database_utils import get_ingest_jobs_by_user
+from file_handler import save_uploaded_file, ensure_saved
+from job_queue import submit_ingest_job, ensure_workers_started
 
 st.set_page_config(page_title="Upload Document", page_icon="📄")
 
@@ -11,43 +9,57 @@ if st.session_state.get('username') is None:
     st.error("You need to log in to access this page.")
     st.stop()
 
+user_id = st.session_state.get('user_id')
+# Workers also pick up anything left unfinished by a previous run of the app
+ensure_workers_started()
+
 st.title("Upload a New Document or Image 📄")
 st.write("Upload your PDF or Image files here. The system will use Cloud OCR for scanned documents.")
+st.caption("Files are processed in the background, so you can keep using the app while they are prepared.")
 
-# Allow multiple file types
-uploaded_file = st.file_uploader("Choose a file", type=['pdf', 'png', 'jpg', 'jpeg'])
+# A new key empties the uploader after the files have been handed to the workers
+if 'uploader_key' not in st.session_state: st.session_state['uploader_key'] = 0
 
-if uploaded_file is not None:
-    file_type = uploaded_file.type
-    
-    with st.spinner('Saving and processing your file... This may take a moment for large or scanned documents.'):
-        try:
-            # Save the physical file first
-            saved_path = save_uploaded_file(uploaded_file)
-            
-            text = None
-            # Use the correct function based on file type
-            if "pdf" in file_type:
-                text = extract_text_from_pdf(saved_path)
-            elif "image" in file_type:
-                # For images, we send the bytes directly to the function
-                uploaded_file.seek(0)
-                image_bytes = uploaded_file.read()
-                text = extract_text_from_image(image_bytes, uploaded_file.name)
-
-            if text:
-                chunks = split_text_into_chunks(text)
-                faiss_index_data = create_embeddings(chunks)
-                
-                if faiss_index_data:
-                    user_id = st.session_state.get('user_id')
-                    add_document(user_id, uploaded_file.name, saved_path, faiss_index_data)
-                    st.success(f"Successfully processed '{uploaded_file.name}'!")
-                    st.info("The document is now ready. Go to the 'My Documents' page to interact with it.")
-                else:
-                    st.error("Failed to create AI memory for the document.")
-            else:
-                st.error("Could not extract any text from the file.")
+# Allow multiple file types, and several files at once
+uploaded_files = st.file_uploader("Choose files", type=['pdf', 'png', 'jpg', 'jpeg'],
+                                  accept_multiple_files=True, key=f"uploader_{st.session_state['uploader_key']}")
 
+if uploaded_files and st.button("Process files", type="primary"):
+    for uploaded_file in uploaded_files:
+        try:
+            # Save the physical file first, then let a worker do the slow part.
+            # A file someone already uploaded is stored once and not processed again.
+            saved_path, content_hash = save_uploaded_file(uploaded_file)
+            submit_ingest_job(user_id, uploaded_file.name, saved_path, uploaded_file.type, content_hash)
+            ensure_saved(saved_path, lambda: save_uploaded_file(uploaded_file))
         except Exception as e:
-            st.error(f"An error occurred: {e}")
\ No newline at end of file
+            st.error(f"An error occurred with '{uploaded_file.name}': {e}")
+    st.session_state['uploader_key'] += 1
+    st.rerun()
+
+# --- Processing Status ---
+@st.fragment(run_every=2)
+def show_jobs():
+    jobs = get_ingest_jobs_by_user(user_id)
+    if not jobs:
+        return
+    st.write("---")
+    st.subheader("Your uploads")
+    for job in jobs:
+        name = job['original_filename']
+        if job['status'] == 'done':
+            st.success(f"'{name}' is ready. Go to the 'My Documents' page to interact with it.")
+        elif job['status'] == 'failed':
+            st.error(f"'{name}' could not be processed: {job['error']}")
+        elif job['status'] == 'queued':
+            st.info(f"'{name}' is waiting to be processed...")
+        else:
+            pages_total = job['pages_total'] or 0
+            fraction = job['pages_read'] / pages_total if pages_total else 0.0
+            st.progress(min(fraction, 1.0), text=(
+                f"'{name}': {job['pages_read']}/{pages_total} pages read, "
+                f"{job['pages_rendered']} rendered, {job['pages_ocrd']} OCR'd, "
+                f"{job['chunks_embedded']} chunks embedded"
+            ))
+
+show_jobs()
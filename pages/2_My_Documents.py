@@ -19,11 +19,25 @@ user_documents = get_documents_by_user(user_id)
 if not user_documents:
     st.warning("You haven't uploaded any documents yet. Go to the 'Upload Document' page!")
 else:
+    # --- Search across every document at once ---
+    library_query = st.text_input("Search across your library 🔎", placeholder="Find passages in all your documents...")
+    if library_query:
+        from library_index import search_user_library
+        filenames = {doc['id']: doc['original_filename'] for doc in user_documents}
+        with st.spinner("Searching your library..."):
+            hits = search_user_library(user_id, library_query, user_documents)
+        if not hits:
+            st.info("No matching passages found.")
+        for hit in hits:
+            st.markdown(f"**{filenames.get(hit['document_id'], 'Unknown document')}**")
+            st.caption(hit['text'][:500])
+        st.write("---")
+
     for doc in user_documents:
         with st.expander(f"**{doc['original_filename']}** - Uploaded on {doc['uploaded_at'][:10]}"):
             
-            # Use three columns for our action buttons
-            col1, col2, col3 = st.columns(3)
+            # One column per action button
+            col1, col2, col3, col4 = st.columns(4)
 
             with col1:
                 if st.button("Chat 💬", key=f"chat_{doc['id']}", use_container_width=True):
@@ -40,4 +54,13 @@ else:
                 if st.button("Audio Overview 🎧", key=f"audio_{doc['id']}", use_container_width=True):
                     st.session_state['selected_doc_id'] = doc['id']
                     # We will create this page in the very next step
-                    st.switch_page("pages/5_Audio_Overview.py")
\ No newline at end of file
+                    st.switch_page("pages/5_Audio_Overview.py")
+
+            with col4:
+                if st.button("Delete 🗑️", key=f"delete_{doc['id']}", use_container_width=True):
+                    # Imported here so listing documents doesn't load the vector store
+                    from document_store import remove_document
+                    remove_document(doc['id'])
+                    if st.session_state.get('selected_doc_id') == doc['id']:
+                        st.session_state['selected_doc_id'] = None
+                    st.rerun()
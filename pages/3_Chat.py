@@ -1,19 +1,53 @@
 import streamlit as st
-from database_utils import get_messages_by_doc_id, add_message, get_single_document
-from ai_core import get_chat_response, extract_text_from_pdf, split_text_into_chunks
+from database_utils import get_recent_messages, get_messages_after, add_messages, get_single_document
+from working_set import get_document_working_set, document_cache, document_key
+from chat_cache import cache_stats
+from tracing import request
 
 st.set_page_config(page_title="Chat with Document", page_icon="💬")
 
-@st.cache_data(show_spinner="Preparing document...")
-def prepare_chat_data(_doc_id):
-    document_data = get_single_document(_doc_id)
+# How many messages are loaded at first, and per click on "Load older messages"
+MESSAGES_PER_PAGE = 50
+
+def prepare_chat_data(doc_id):
+    """
+    Returns (doc_info, working_set). The loaded index and chunks live in the
+    process-wide working set, keyed by document id and content version.
+    """
+    document_data = get_single_document(doc_id)
     if document_data:
         doc_info = dict(document_data)
-        full_text = extract_text_from_pdf(doc_info['storage_path'])
-        text_chunks = split_text_into_chunks(full_text)
-        return doc_info, text_chunks
+        with st.spinner("Preparing document..."):
+            return doc_info, get_document_working_set(doc_info)
     return None, None
 
+def load_chat_history(doc_id):
+    """
+    Returns this session's cached history for a document, a dict with the loaded
+    "messages" (oldest first) and whether "has_older" ones exist in the database.
+    The first visit loads the newest page; every rerun after that only asks the
+    database for messages newer than the last one already loaded.
+    """
+    histories = st.session_state.setdefault('chat_histories', {})
+    history = histories.get(doc_id)
+    if history is None:
+        messages = [dict(row) for row in get_recent_messages(doc_id, MESSAGES_PER_PAGE)]
+        history = {"messages": messages, "has_older": len(messages) == MESSAGES_PER_PAGE}
+        histories[doc_id] = history
+    elif history["messages"]:
+        last = history["messages"][-1]
+        history["messages"].extend(dict(row) for row in get_messages_after(doc_id, (last['timestamp'], last['id'])))
+    else:
+        history["messages"] = [dict(row) for row in get_recent_messages(doc_id, MESSAGES_PER_PAGE)]
+    return history
+
+def load_older_messages(doc_id):
+    history = st.session_state['chat_histories'][doc_id]
+    first = history["messages"][0]
+    older = [dict(row) for row in get_recent_messages(doc_id, MESSAGES_PER_PAGE, before=(first['timestamp'], first['id']))]
+    history["messages"][:0] = older
+    history["has_older"] = len(older) == MESSAGES_PER_PAGE
+
 if st.session_state.get('username') is None:
     st.error("You need to log in to access this page.")
     st.stop()
@@ -23,9 +57,9 @@ if st.session_state.get('selected_doc_id') is None:
     st.stop()
 
 doc_id = st.session_state.get('selected_doc_id')
-doc_info, text_chunks = prepare_chat_data(doc_id)
+doc_info, working_set = prepare_chat_data(doc_id)
 
-if not doc_info or not text_chunks:
+if not doc_info or not working_set:
     st.error("Could not load the document data. The PDF might be a scan or empty.")
     st.stop()
 
@@ -34,25 +68,48 @@ st.title(f"Chat with: *{doc_info['original_filename']}* 💬")
 # --- NEW DEBUG MODE ---
 debug_mode = st.sidebar.checkbox("Show Debug Information")
 
-# Display previous messages
-messages = get_messages_by_doc_id(doc_id)
-for msg in messages:
+# Display previous messages, newest page first; older pages load on demand
+history = load_chat_history(doc_id)
+if history["has_older"]:
+    st.button("Load older messages", on_click=load_older_messages, args=(doc_id,))
+for msg in history["messages"]:
     with st.chat_message(msg['role']):
         st.markdown(msg['content'])
 
 if prompt := st.chat_input("Ask a question..."):
-    add_message(doc_id, "user", prompt)
+    # Imported on the first question, so the history shows without loading the AI stack
+    from ai_core import stream_chat_response
     with st.chat_message("user"):
         st.markdown(prompt)
 
-    with st.chat_message("assistant"):
-        with st.spinner("Thinking..."):
-            faiss_index_data = doc_info['faiss_index']
-            response, context = get_chat_response(faiss_index_data, prompt, text_chunks)
-            st.markdown(response)
-    
-    add_message(doc_id, "assistant", response)
+    # Every stage of this turn is grouped under one request on the latency dashboard
+    with request("chat_turn", document_id=doc_id) as turn:
+        response = None
+        try:
+            with st.chat_message("assistant"):
+                # The answer appears word by word as the model writes it
+                pieces, stats = stream_chat_response(working_set['index'], prompt, working_set['chunks'],
+                                                     cache_key=document_key(doc_info),
+                                                     embedding_model=working_set['embedding_model'])
+                response = st.write_stream(pieces)
+        finally:
+            # The question and its answer are saved together in one transaction, even if
+            # answering failed; an answer cut off by an error or by the user moving on is marked as such
+            add_messages(doc_id, [("user", prompt),
+                                  ("assistant", response if response is not None else "*(The answer was interrupted.)*")])
+        turn.set(cached=stats["cached"], prompt_tokens=stats["prompt_tokens"])
+
+    # Remember how long the user waited, for the debug panel
+    latencies = st.session_state.setdefault('chat_latencies', [])
+    latencies.append({key: value for key, value in stats.items() if key != "context"})
+    del latencies[:-50]
 
     if debug_mode:
         with st.expander("DEBUG: Context Provided to AI", expanded=True):
-            st.text(context)
\ No newline at end of file
+            st.text(stats["context"])
+
+if debug_mode:
+    st.sidebar.write("Document working set", document_cache.stats())
+    st.sidebar.write("Chat caches", cache_stats())
+    if st.session_state.get('chat_latencies'):
+        st.sidebar.write("Recent chat requests (seconds, estimated tokens)", st.session_state['chat_latencies'][-5:])
\ No newline at end of file
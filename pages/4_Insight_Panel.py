@@ -1,19 +1,25 @@
 import streamlit as st
 from database_utils import get_single_document
-from ai_core import extract_text_from_pdf, generate_insights
+from artifact_store import get_document_insights, invalidate_artifacts, INSIGHTS
+from document_store import document_content_hash
 
 st.set_page_config(page_title="Insight Panel", page_icon="🧠")
 
-# --- Function to get and cache insights ---
-@st.cache_data(show_spinner="Generating insights...")
-def get_insights_for_document(_doc_id):
-    document_data = get_single_document(_doc_id)
+# --- Function to get insights ---
+# Insights are stored in the artifacts table, so they are only generated once per
+# document content (and prompt version) and every server process can reuse them.
+def get_insights_for_document(doc_id):
+    document_data = get_single_document(doc_id)
     if document_data:
-        full_text = extract_text_from_pdf(document_data['storage_path'])
-        if full_text:
-            return generate_insights(full_text)
+        with st.spinner("Generating insights..."):
+            return get_document_insights(dict(document_data))
     return None
 
+def regenerate_insights(doc_id):
+    document_data = get_single_document(doc_id)
+    if document_data:
+        invalidate_artifacts(document_content_hash(dict(document_data)), INSIGHTS)
+
 # --- Authentication and Document Selection Check ---
 if st.session_state.get('username') is None:
     st.error("You need to log in to access this page.")
@@ -54,6 +60,8 @@ if insights:
         # Display Main Arguments
         st.subheader("Main Arguments / Purpose")
         st.write(insights.get('main_arguments', 'Not available.'))
+        st.write("---")
+        st.button("Regenerate Insights", on_click=regenerate_insights, args=(doc_id,))
 
 else:
     st.error("There was a problem generating insights for this document.")
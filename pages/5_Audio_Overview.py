@@ -1,20 +1,26 @@
 import streamlit as st
 from database_utils import get_single_document
-from ai_core import extract_text_from_pdf, generate_audio_summary
-import os
+from artifact_store import get_document_audio, get_stored_audio
 
 st.set_page_config(page_title="Audio Overview", page_icon="🎧")
 
-# This function generates the audio. We removed the cache to fix the bug.
-def get_audio_for_document(_doc_id):
-    document_data = get_single_document(_doc_id)
+# Audio is stored in the artifacts table, keyed by the document's content,
+# so it is generated once and then served straight from disk.
+def get_audio_for_document(doc_id, generate=True, on_segment=None):
+    document_data = get_single_document(doc_id)
     if document_data:
-        full_text = extract_text_from_pdf(document_data['storage_path'])
-        if full_text:
-            audio_path, summary_text = generate_audio_summary(full_text, _doc_id)
-            return audio_path, summary_text
+        if generate:
+            return get_document_audio(dict(document_data), on_segment)
+        return get_stored_audio(dict(document_data))
     return None, None
 
+def show_audio(audio_file_path, summary_text):
+    st.subheader("Listen to Summary")
+    st.audio(audio_file_path, format='audio/mp3')
+    st.write("---")
+    st.subheader("Summary Text")
+    st.markdown(summary_text)
+
 # --- Authentication and Document Selection Check ---
 if st.session_state.get('username') is None:
     st.error("You need to log in to access this page.")
@@ -32,16 +38,27 @@ st.title("Audio Overview 🎧")
 st.write("Listen to an AI-generated summary of your document.")
 st.write("---")
 
-# A button to trigger the generation process
-if st.button("Generate Audio Summary Now", type="primary"):
+# A summary made earlier (by anyone, for the same file) plays right away
+stored_audio_path, stored_summary_text = get_audio_for_document(doc_id, generate=False)
+if stored_audio_path:
+    show_audio(stored_audio_path, stored_summary_text)
+
+# Otherwise a button triggers the generation process
+elif st.button("Generate Audio Summary Now", type="primary"):
+    preview = st.empty()
+
+    def play_first_segment(index, audio_bytes):
+        # The opening sentences can be heard while the rest is still being rendered
+        if index == 0:
+            with preview.container():
+                st.caption("Preview: the beginning of the summary")
+                st.audio(audio_bytes, format='audio/mp3')
+
     with st.spinner("Generating audio summary... This may take a minute or two."):
-        audio_file_path, summary_text = get_audio_for_document(doc_id)
-        
+        audio_file_path, summary_text = get_audio_for_document(doc_id, on_segment=play_first_segment)
+        preview.empty()
+
         if audio_file_path and summary_text:
-            st.subheader("Listen to Summary")
-            st.audio(audio_file_path, format='audio/mp3')
-            st.write("---")
-            st.subheader("Summary Text")
-            st.markdown(summary_text)
+            show_audio(audio_file_path, summary_text)
         else:
             st.error("There was a problem generating the audio overview for this document. The PDF might be a scan or too complex.")
\ No newline at end of file
@@ -0,0 +1,75 @@
+import json
+import time
+import pandas as pd
+import streamlit as st
+from database_utils import get_trace_spans
+from settings import get_setting
+import tracing
+
+st.set_page_config(page_title="Latency Dashboard", page_icon="⏱️")
+
+# Comma-separated usernames allowed to see this page; nobody until it is set
+ADMIN_USERNAMES = [name.strip() for name in get_setting("ADMIN_USERNAMES", "").split(",") if name.strip()]
+TIME_WINDOWS = {"Last 15 minutes": 15 * 60, "Last hour": 3600, "Last 24 hours": 86400, "Last 7 days": 7 * 86400}
+SLOWEST_REQUESTS = 10
+
+# --- Loading spans ---
+def load_spans(window_seconds):
+    """
+    Returns a DataFrame of the spans started in the window, from every process
+    (the trace_spans table) plus the ones this process hasn't flushed yet.
+    """
+    tracing.flush()
+    rows = [dict(row) for row in get_trace_spans(time.time() - window_seconds)]
+    for row in rows:
+        row["attributes"] = json.loads(row["attributes"] or "{}")
+    spans = pd.DataFrame(rows, columns=["request_id", "stage", "is_request", "started_at", "duration_ms", "attributes"])
+    spans["started"] = pd.to_datetime(spans["started_at"], unit="s")
+    return spans
+
+def stage_summary(spans):
+    grouped = spans.groupby("stage")["duration_ms"]
+    summary = pd.DataFrame({
+        "calls": grouped.count(),
+        "p50_ms": grouped.quantile(0.5),
+        "p95_ms": grouped.quantile(0.95),
+        "max_ms": grouped.max(),
+        "total_s": grouped.sum() / 1000,
+    })
+    return summary.sort_values("total_s", ascending=False).round(2)
+
+# --- Authentication Check ---
+if st.session_state.get('username') is None:
+    st.error("You need to log in to access this page.")
+    st.stop()
+
+if st.session_state['username'] not in ADMIN_USERNAMES:
+    st.error("This page is only available to administrators (see the ADMIN_USERNAMES setting).")
+    st.stop()
+
+# --- Main Page Content ---
+st.title("Latency Dashboard ⏱️")
+if not tracing.TRACING_ENABLED:
+    st.warning("Tracing is turned off (TRACING_ENABLED), so no new timings are being recorded.")
+
+window = st.selectbox("Time window", list(TIME_WINDOWS))
+spans = load_spans(TIME_WINDOWS[window])
+if spans.empty:
+    st.info("No timings recorded in this window yet.")
+    st.stop()
+
+st.subheader("Time per stage")
+st.dataframe(stage_summary(spans), use_container_width=True)
+
+st.subheader("Slowest requests")
+requests = spans[spans["is_request"] == 1].nlargest(SLOWEST_REQUESTS, "duration_ms")
+for _, req in requests.iterrows():
+    label = f"{req['stage']} — {req['duration_ms']:.0f} ms — {req['started']:%Y-%m-%d %H:%M:%S}"
+    with st.expander(label):
+        if req["attributes"]:
+            st.write(req["attributes"])
+        children = spans[(spans["request_id"] == req["request_id"]) & (spans["is_request"] == 0)]
+        if children.empty:
+            st.write("No stage timings were recorded for this request.")
+        else:
+            st.dataframe(stage_summary(children), use_container_width=True)
@@ -0,0 +1,205 @@
+import json
+import re
+import threading
+import zlib
+from collections import Counter
+import numpy as np
+from settings import get_setting
+
+# --- Provider Settings ---
+# Which embedder is used for chunks and questions:
+#   "gemini"               - the Gemini embedding API
+#   "hashing"              - a local hashing vectorizer; instant and offline ("stub" is an alias)
+#   "sentence_transformer" - a local sentence-transformers model on the CPU, via ONNX Runtime
+#                            when available (needs `pip install sentence-transformers[onnx]`)
+EMBEDDING_BACKEND = get_setting("EMBEDDING_BACKEND", "gemini")
+# Which model writes answers, insights and summaries: "gemini" or "stub" (local, extractive)
+GENERATION_BACKEND = get_setting("GENERATION_BACKEND", "gemini")
+GEMINI_EMBEDDING_MODEL = "models/embedding-001"
+GEMINI_EMBEDDING_DIMENSION = 768
+GEMINI_GENERATION_MODEL = 'gemini-1.5-flash-latest'
+# Set to send Gemini calls to another endpoint, e.g. a local stub (benchmarks/stub_services.py)
+GEMINI_API_ENDPOINT = get_setting("GEMINI_API_ENDPOINT", "")
+HASHING_EMBEDDING_DIMENSION = get_setting("HASHING_EMBEDDING_DIMENSION", 768)
+LOCAL_EMBEDDING_MODEL = get_setting("LOCAL_EMBEDDING_MODEL", "sentence-transformers/all-MiniLM-L6-v2")
+# "onnx" or "torch"
+LOCAL_EMBEDDING_RUNTIME = get_setting("LOCAL_EMBEDDING_RUNTIME", "onnx")
+
+_SENTENCE = re.compile(r'[^.!?]+[.!?]*')
+
+# --- Gemini Client ---
+_gemini_lock = threading.Lock()
+_gemini_configured = False
+
+def gemini_client():
+    """
+    Returns the google.generativeai module, imported and configured on first use.
+    The client library takes most of a second to import, so nothing loads it
+    until a Gemini embedder or generator makes its first call.
+    """
+    global _gemini_configured
+    import google.generativeai as genai
+    if not _gemini_configured:
+        with _gemini_lock:
+            if not _gemini_configured:
+                try:
+                    if GEMINI_API_ENDPOINT:
+                        genai.configure(api_key=get_setting("GOOGLE_API_KEY", "stub"), transport="rest",
+                                        client_options={"api_endpoint": GEMINI_API_ENDPOINT})
+                    else:
+                        genai.configure(api_key=get_setting("GOOGLE_API_KEY"))
+                except Exception as e:
+                    print(f"Could not configure the Gemini client: {e}")
+                _gemini_configured = True
+    return genai
+
+# --- Embedders ---
+# An embedder has a `name` (embedding cache entries are keyed by it), the
+# `dimension` of its vectors, `remote` (whether calls go over the network and
+# count against the API rate limit) and embed(texts, task_type) -> list of vectors.
+
+class GeminiEmbedder:
+    remote = True
+    dimension = GEMINI_EMBEDDING_DIMENSION
+
+    def __init__(self, model=GEMINI_EMBEDDING_MODEL):
+        self.name = model
+
+    def embed(self, texts, task_type):
+        return gemini_client().embed_content(model=self.name, content=texts, task_type=task_type)['embedding']
+
+class HashingEmbedder:
+    """
+    A hashing vectorizer over words. Deterministic, so texts sharing words land
+    close together; good enough for offline testing and keyword-like search.
+    """
+    remote = False
+
+    def __init__(self, dimension=HASHING_EMBEDDING_DIMENSION):
+        self.dimension = dimension
+        self.name = f"stub-hashing-{dimension}"
+
+    def embed(self, texts, task_type):
+        vectors = np.zeros((len(texts), self.dimension), dtype='float32')
+        for row, text in enumerate(texts):
+            for word in text.lower().split():
+                word_hash = zlib.crc32(word.encode("utf-8"))
+                vectors[row, word_hash % self.dimension] += 1.0 if word_hash & 0x80000000 else -1.0
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return (vectors / norms).tolist()
+
+class SentenceTransformerEmbedder:
+    """
+    A sentence-transformers model running on the local CPU. The model is loaded
+    once, on first use, and shared by all threads.
+    """
+    remote = False
+
+    def __init__(self, model=LOCAL_EMBEDDING_MODEL, runtime=LOCAL_EMBEDDING_RUNTIME):
+        # Optional dependency: only needed when this backend is selected
+        from sentence_transformers import SentenceTransformer
+        self.model = SentenceTransformer(model, device="cpu", backend=runtime)
+        self.dimension = self.model.get_sentence_embedding_dimension()
+        self.name = f"{model}@{runtime}"
+        self._lock = threading.Lock()
+
+    def embed(self, texts, task_type):
+        # One encode at a time: the model already uses every core
+        with self._lock:
+            vectors = self.model.encode(texts, batch_size=32, convert_to_numpy=True, normalize_embeddings=True)
+        return vectors.astype('float32').tolist()
+
+# --- Generators ---
+# A generator has a `name`, `remote`, generate(prompt) -> text and
+# stream(prompt) -> iterator of text pieces.
+
+class GeminiGenerator:
+    remote = True
+
+    def __init__(self, model=GEMINI_GENERATION_MODEL):
+        self.name = model
+
+    def generate(self, prompt):
+        return gemini_client().GenerativeModel(self.name).generate_content(prompt).text
+
+    def stream(self, prompt):
+        response = gemini_client().GenerativeModel(self.name).generate_content(prompt, stream=True)
+        for chunk in response:
+            try:
+                text = chunk.text
+            except ValueError:
+                # A chunk without text (e.g. only safety metadata)
+                continue
+            if text:
+                yield text
+
+class StubGenerator:
+    """
+    A local, offline stand-in for the generation model. It answers extractively:
+    the first sentences of the text the prompt was given (the CONTEXT of a chat
+    prompt, or the text between --- markers), and for prompts asking for JSON the
+    insights keys filled from those sentences and the most frequent words.
+    """
+    remote = False
+    name = "stub-extractive"
+
+    def _source_text(self, prompt):
+        if "CONTEXT:" in prompt:
+            return prompt.split("CONTEXT:", 1)[1].split("USER QUESTION:", 1)[0]
+        parts = prompt.split("---")
+        return parts[1] if len(parts) >= 3 else prompt
+
+    def generate(self, prompt):
+        text = " ".join(self._source_text(prompt).split())
+        sentences = [s.strip() for s in _SENTENCE.findall(text) if s.strip()]
+        if "JSON" in prompt:
+            words = Counter(w for w in re.findall(r"[a-z]{5,}", text.lower()))
+            return json.dumps({
+                "one_sentence_summary": sentences[0] if sentences else "",
+                "key_concepts": [word for word, _ in words.most_common(6)],
+                "main_arguments": " ".join(sentences[:3]),
+            })
+        return " ".join(sentences[:5])
+
+    def stream(self, prompt):
+        for word in self.generate(prompt).split(" "):
+            yield word + " "
+
+# --- Selection ---
+_providers = {}
+_providers_lock = threading.Lock()
+
+def _make_embedder(backend):
+    if backend == "gemini":
+        return GeminiEmbedder()
+    if backend in ("hashing", "stub"):
+        return HashingEmbedder()
+    if backend == "sentence_transformer":
+        return SentenceTransformerEmbedder()
+    raise ValueError(f"Unknown EMBEDDING_BACKEND: {backend}")
+
+def _make_generator(backend):
+    if backend == "gemini":
+        return GeminiGenerator()
+    if backend == "stub":
+        return StubGenerator()
+    raise ValueError(f"Unknown GENERATION_BACKEND: {backend}")
+
+def get_embedder():
+    """
+    Returns the embedder selected by EMBEDDING_BACKEND, created once per process.
+    """
+    with _providers_lock:
+        if "embedder" not in _providers:
+            _providers["embedder"] = _make_embedder(EMBEDDING_BACKEND)
+        return _providers["embedder"]
+
+def get_generator():
+    """
+    Returns the generator selected by GENERATION_BACKEND, created once per process.
+    """
+    with _providers_lock:
+        if "generator" not in _providers:
+            _providers["generator"] = _make_generator(GENERATION_BACKEND)
+        return _providers["generator"]
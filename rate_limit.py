@@ -0,0 +1,32 @@
+import threading
+import time
+
+class RateLimiter:
+    """
+    A thread-safe token bucket: allows `rate_per_minute` calls per minute on
+    average, with bursts of up to `burst` calls. A rate of 0 means no limit.
+    """
+
+    def __init__(self, rate_per_minute, burst=None):
+        self.rate_per_second = rate_per_minute / 60.0
+        self.capacity = burst or max(1, int(rate_per_minute / 60) or 1)
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """
+        Blocks until a call is allowed.
+        """
+        if self.rate_per_second <= 0:
+            return
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate_per_second)
+                self.updated_at = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate_per_second
+            time.sleep(wait)
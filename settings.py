@@ -0,0 +1,23 @@
+import os
+
+def get_setting(name, default=None):
+    """
+    Looks up a configuration value.
+    Environment variables win, then .streamlit/secrets.toml, then the given default.
+    The value is converted to the type of the default (int, float or bool) when one is given.
+    """
+    if name in os.environ:
+        value = os.environ[name]
+    else:
+        try:
+            import streamlit as st
+            value = st.secrets[name]
+        except Exception:
+            # No secrets file, or the key isn't in it
+            return default
+
+    if isinstance(default, bool) and isinstance(value, str):
+        return value.strip().lower() in ("1", "true", "yes", "on")
+    if isinstance(default, (int, float)) and not isinstance(default, bool):
+        return type(default)(value)
+    return value
@@ -0,0 +1,61 @@
+"""
+Shared fixtures. The tests run offline: embeddings come from the hashing
+embedder, answers from the stub generator, and each test that touches storage
+gets its own database and data folders under a temporary directory.
+"""
+import os
+import sys
+
+# Settings are read when the app modules are imported, so these come first
+os.environ.setdefault("EMBEDDING_BACKEND", "hashing")
+os.environ.setdefault("GENERATION_BACKEND", "stub")
+os.environ.setdefault("TRACING_ENABLED", "false")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+
+import database_utils
+import library_index
+import working_set
+from database_setup import setup_database
+from upgrade_database import upgrade
+
+# Data folders the app writes to, relative to the working directory
+DATA_FOLDERS = ("user_uploads", "vector_store", "library_indexes", "audio_summaries")
+
+
+@pytest.fixture
+def scratch_db(tmp_path, monkeypatch):
+    """
+    Runs the test in an empty folder with a fully upgraded database of its own.
+    Returns the database path.
+    """
+    monkeypatch.chdir(tmp_path)
+    for folder in DATA_FOLDERS:
+        os.makedirs(folder, exist_ok=True)
+    # The app's own file name, so processes started by the test (bulk_ingest.py) find it too
+    database_name = str(tmp_path / database_utils.DATABASE_NAME)
+    setup_database(database_name)
+    upgrade(database_name)
+    monkeypatch.setattr(database_utils, "DATABASE_NAME", database_name)
+    # Nothing loaded for an earlier test's database may leak into this one
+    monkeypatch.setattr(library_index, "_libraries", {})
+    working_set.document_cache.invalidate(lambda key: True)
+    return database_name
+
+
+@pytest.fixture
+def user_id(scratch_db):
+    database_utils.add_user("tester", "not-a-real-hash")
+    return database_utils.get_user("tester")["id"]
+
+
+@pytest.fixture
+def make_pdf(scratch_db):
+    """Writes a small text-only PDF and returns its path; `seed` changes the words."""
+    from benchmarks.synthetic_pdfs import make_synthetic_pdf
+
+    def make(name="paper.pdf", pages=2, seed=0):
+        make_synthetic_pdf(name, pages=pages, words_per_page=120, seed=seed)
+        return os.path.abspath(name)
+    return make
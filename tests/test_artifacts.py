@@ -0,0 +1,15 @@
+import os
+import subprocess
+import sys
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_artifact_lookup_does_not_load_ai_core():
+    code = ("import sys, artifact_store\n"
+            "print(artifact_store._artifact_key(artifact_store.AUDIO_SUMMARY))\n"
+            "assert 'ai_core' not in sys.modules\n")
+    result = subprocess.run([sys.executable, "-c", code], cwd=REPO_ROOT, capture_output=True, text=True,
+                            env={**os.environ, "GENERATION_BACKEND": "stub", "TTS_BACKEND": "stub"})
+    assert result.returncode == 0, result.stderr
+    assert "+stub-en" in result.stdout
@@ -0,0 +1,40 @@
+import os
+
+import numpy as np
+
+import database_utils as db
+import library_index
+from benchmarks.synthetic_pdfs import make_synthetic_pdf
+from bulk_ingest import bulk_ingest
+
+
+def test_changed_file_replaces_its_old_document(user_id):
+    os.makedirs("papers")
+    make_synthetic_pdf("papers/a.pdf", pages=2, words_per_page=120, seed=1)
+    make_synthetic_pdf("papers/b.pdf", pages=2, words_per_page=120, seed=2)
+    summary = bulk_ingest("papers", user_id, processes=1)
+    assert (summary["done"], summary["failed"]) == (2, [])
+    old_ids = {row["original_filename"]: row["id"] for row in db.get_documents_by_user(user_id)}
+
+    make_synthetic_pdf("papers/a.pdf", pages=3, words_per_page=120, seed=3)
+    summary = bulk_ingest("papers", user_id, processes=1)
+    assert (summary["done"], summary["skipped"], summary["replaced"]) == (1, 1, 1)
+
+    new_ids = {row["original_filename"]: row["id"] for row in db.get_documents_by_user(user_id)}
+    assert new_ids["b.pdf"] == old_ids["b.pdf"]
+    assert new_ids["a.pdf"] != old_ids["a.pdf"]
+    assert db.get_single_document(old_ids["a.pdf"]) is None
+    assert library_index.get_library(user_id).live_document_ids() == set(new_ids.values())
+
+
+def test_library_saved_by_another_process_is_reloaded(user_id):
+    library = library_index.get_library(user_id)
+    assert library.documents == {}
+
+    # Another process has its own copy, adds a document and saves
+    elsewhere = library_index.LibraryIndex(library.name)
+    elsewhere.add_document(7, np.ones((3, 8), dtype="float32"))
+
+    reloaded = library_index.get_library(user_id)
+    assert reloaded.documents == {7: 3}
+    assert library_index.get_library(user_id) is reloaded
@@ -0,0 +1,56 @@
+import numpy as np
+import pytest
+
+import chat_cache
+
+
+@pytest.fixture(autouse=True)
+def empty_caches():
+    for cache in (chat_cache.answer_cache, chat_cache.query_embedding_cache):
+        cache.invalidate(lambda key: True)
+        cache.hits = cache.misses = cache.evictions = 0
+    chat_cache._answer_stats.update(hits=0, misses=0)
+
+
+def test_close_question_on_same_chunks_hits_the_cache():
+    document = (1, "hash-1")
+    question = np.array([1.0, 0.0], dtype="float32")
+    assert chat_cache.find_cached_answer(document, [3, 4], question) is None
+    chat_cache.store_answer(document, [3, 4], question, "An answer.", "The context.")
+
+    close = np.array([0.99, 0.05], dtype="float32")
+    far = np.array([0.0, 1.0], dtype="float32")
+    assert chat_cache.find_cached_answer(document, [3, 4], close) == ("An answer.", "The context.")
+    assert chat_cache.find_cached_answer(document, [3, 4], far) is None
+    assert chat_cache.find_cached_answer(document, [3, 5], question) is None
+    assert chat_cache.find_cached_answer((2, "hash-2"), [3, 4], question) is None
+
+    stats = chat_cache.cache_stats()["answers"]
+    assert (stats["hits"], stats["misses"]) == (1, 4)
+    # Only the three lookups of chunks never answered missed the entry;
+    # storing the answer looked it up without counting a miss
+    assert chat_cache.answer_cache.misses == 3
+
+
+def test_deleted_document_answers_are_invalidated():
+    question = np.array([1.0, 0.0], dtype="float32")
+    chat_cache.store_answer((1, "hash-1"), [0], question, "First.", "")
+    chat_cache.store_answer((2, "hash-2"), [0], question, "Second.", "")
+
+    assert chat_cache.invalidate_document_answers(1) == 1
+    assert chat_cache.find_cached_answer((1, "hash-1"), [0], question) is None
+    assert chat_cache.find_cached_answer((2, "hash-2"), [0], question) == ("Second.", "")
+
+
+def test_query_embedding_is_computed_once_per_normalized_question():
+    calls = []
+    def embed(text):
+        calls.append(text)
+        return [0.5, 0.5]
+
+    first = chat_cache.get_query_embedding("What is X?", embed, model="m")
+    again = chat_cache.get_query_embedding("  what is   x ", embed, model="m")
+    other_model = chat_cache.get_query_embedding("What is X?", embed, model="n")
+    assert calls == ["what is x", "what is x"]
+    assert np.array_equal(first, again) and first.dtype == np.float32
+    assert np.array_equal(first, other_model)
@@ -0,0 +1,45 @@
+import database_utils as db
+
+
+def _messages_with_tied_timestamps(user_id, count):
+    with db.db_connection() as conn, conn:
+        doc_id = conn.execute("INSERT INTO documents (user_id, original_filename, storage_path) VALUES (?, ?, ?)",
+                              (user_id, "paper.pdf", "user_uploads/paper.pdf")).lastrowid
+    db.add_messages(doc_id, [("user" if n % 2 == 0 else "assistant", f"message {n}") for n in range(count)])
+    # Most messages share a second, as a question and its answer do; pages must split such ties
+    with db.db_connection() as conn, conn:
+        conn.execute("UPDATE messages SET timestamp = '2024-01-01 10:00:00' WHERE document_id = ?", (doc_id,))
+        conn.execute("UPDATE messages SET timestamp = '2024-01-01 09:00:00' WHERE document_id = ? AND content = ?",
+                     (doc_id, "message 0"))
+    return doc_id
+
+
+def test_paging_back_through_tied_timestamps_skips_and_repeats_nothing(user_id):
+    doc_id = _messages_with_tied_timestamps(user_id, 10)
+
+    pages = [db.get_recent_messages(doc_id, limit=3)]
+    while len(pages[0]) == 3:
+        first = pages[0][0]
+        pages.insert(0, db.get_recent_messages(doc_id, limit=3, before=(first["timestamp"], first["id"])))
+    contents = [row["content"] for page in pages for row in page]
+
+    assert [len(page) for page in pages] == [1, 3, 3, 3]
+    assert contents == [f"message {n}" for n in range(10)]
+
+
+def test_messages_after_a_cursor_inside_a_tie(user_id):
+    doc_id = _messages_with_tied_timestamps(user_id, 6)
+    history = db.get_recent_messages(doc_id, limit=4)
+    cursor = history[1]
+
+    newer = db.get_messages_after(doc_id, (cursor["timestamp"], cursor["id"]))
+    assert [row["content"] for row in newer] == ["message 4", "message 5"]
+    assert db.get_messages_after(doc_id, (history[-1]["timestamp"], history[-1]["id"])) == []
+
+
+def test_documents_uploaded_in_the_same_second_keep_a_stable_order(user_id):
+    with db.db_connection() as conn, conn:
+        ids = [conn.execute("INSERT INTO documents (user_id, original_filename, storage_path, uploaded_at) "
+                            "VALUES (?, ?, ?, '2024-01-01 10:00:00')", (user_id, f"{n}.pdf", f"user_uploads/{n}.pdf")).lastrowid
+               for n in range(5)]
+    assert [row["id"] for row in db.get_documents_by_user(user_id)] == ids[::-1]
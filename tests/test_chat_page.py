@@ -0,0 +1,43 @@
+import pytest
+import streamlit as st
+from streamlit.testing.v1 import AppTest
+
+import database_utils as db
+
+
+@pytest.fixture
+def chat(user_id, make_pdf):
+    from file_handler import save_local_file
+    from ingest import ingest_saved_file
+
+    storage_path, content_hash = save_local_file(make_pdf())
+    doc_id = ingest_saved_file(user_id, "paper.pdf", storage_path, "application/pdf", content_hash)
+    app = AppTest.from_file("../pages/3_Chat.py", default_timeout=30)
+    app.session_state["username"] = "tester"
+    app.session_state["user_id"] = user_id
+    app.session_state["selected_doc_id"] = doc_id
+    app.run()
+    return app, doc_id
+
+
+def _saved(doc_id):
+    return [(row["role"], row["content"]) for row in db.get_messages_by_doc_id(doc_id)]
+
+
+def test_question_and_answer_are_saved(chat):
+    app, doc_id = chat
+    app.chat_input[0].set_value("What is this paper about?").run()
+    saved = _saved(doc_id)
+    assert [role for role, _ in saved] == ["user", "assistant"]
+    assert saved[0][1] == "What is this paper about?"
+
+
+def test_question_is_kept_when_the_answer_fails(chat, monkeypatch):
+    app, doc_id = chat
+
+    def broken_stream(pieces):
+        raise ConnectionError("connection lost")
+    monkeypatch.setattr(st, "write_stream", broken_stream)
+    app.chat_input[0].set_value("What is this paper about?").run()
+    assert app.exception
+    assert _saved(doc_id) == [("user", "What is this paper about?"), ("assistant", "*(The answer was interrupted.)*")]
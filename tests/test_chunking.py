@@ -0,0 +1,94 @@
+import random
+import zlib
+
+import ai_core
+from document_store import SpanChunks, StreamingTextWriter, load_document_text
+from database_utils import get_single_document
+
+WORDS = "model data theory method result analysis system network structure value".split()
+
+
+def _paragraphs(count, seed=0):
+    rng = random.Random(seed)
+    paragraphs = []
+    for _ in range(count):
+        sentences = [" ".join(rng.choice(WORDS) for _ in range(rng.randint(6, 18))).capitalize() + "."
+                     for _ in range(rng.randint(3, 8))]
+        paragraphs.append(" ".join(sentences))
+    return "\n\n".join(paragraphs)
+
+
+def test_chunks_respect_the_budget_and_end_on_a_boundary():
+    text = _paragraphs(60)
+    max_chars = 100 * ai_core.CHARS_PER_TOKEN
+    tolerance_chars = 120
+    spans = ai_core.split_text_into_spans(text, max_tokens=100, overlap_tokens=0, tolerance_chars=tolerance_chars)
+
+    assert len(spans) > 10
+    for (start, end, page_number), next_span in zip(spans, spans[1:] + [None]):
+        chunk = text[start:end]
+        assert page_number == 0
+        assert 0 < len(chunk) <= max_chars
+        assert chunk == chunk.strip()
+        if next_span is not None:
+            # Cut at a sentence end no further than the tolerance before the budget
+            assert chunk.endswith(".")
+            assert text[end:start + max_chars - tolerance_chars].strip() == ""
+            # Nothing between two chunks is lost
+            assert text[end:next_span[0]].strip() == ""
+    assert text[spans[-1][1]:].strip() == ""
+
+
+def test_overlapping_chunks_start_on_a_word():
+    text = _paragraphs(30, seed=1)
+    spans = ai_core.split_text_into_spans(text, max_tokens=100, overlap_tokens=20, tolerance_chars=120)
+    for (_, end, _), (next_start, _, _) in zip(spans, spans[1:]):
+        assert next_start < end
+        assert text[next_start - 1].isspace() and not text[next_start].isspace()
+
+
+def test_chunk_offsets_point_into_the_joined_pages():
+    pages = [(0, _paragraphs(8, seed=2)), (1, "   "), (2, _paragraphs(8, seed=3))]
+    writer = StreamingTextWriter(ai_core.PAGE_SEPARATOR)
+    for _, page_text in pages:
+        writer.add_page(page_text)
+    full_text = pages[0][1] + ai_core.PAGE_SEPARATOR + pages[2][1]
+
+    chunks = list(ai_core.iter_chunk_spans(pages, max_tokens=80))
+    for start, end, page_number, chunk_text in chunks:
+        assert full_text[start:end] == chunk_text
+        assert page_number == (0 if start < len(pages[0][1]) else 2)
+    assert {page_number for _, _, page_number, _ in chunks} == {0, 2}
+    full_text_blob, _ = writer.finish()
+    assert zlib.decompress(full_text_blob).decode("utf-8") == full_text
+
+
+def test_span_chunks_resolve_lazily_from_the_full_text():
+    text = _paragraphs(10, seed=4)
+    spans = ai_core.split_text_into_spans(text, max_tokens=80)
+    chunks = SpanChunks(text, spans)
+
+    assert len(chunks) == len(spans)
+    assert list(chunks) == [text[start:end] for start, end, _ in spans]
+    assert chunks[-1] == text[spans[-1][0]:spans[-1][1]]
+    assert chunks.span(1) == spans[1][:2]
+    assert chunks.page(1) == 0
+
+
+def test_stored_chunks_match_the_stored_text(user_id, make_pdf):
+    from file_handler import save_local_file
+    from ingest import ingest_saved_file
+
+    storage_path, content_hash = save_local_file(make_pdf(pages=3))
+    doc_id = ingest_saved_file(user_id, "paper.pdf", storage_path, "application/pdf", content_hash,
+                               add_to_library=False)
+    full_text, chunks = load_document_text(dict(get_single_document(doc_id)))
+
+    assert isinstance(chunks, SpanChunks)
+    assert len(chunks) > 1
+    max_chars = ai_core.CHUNK_MAX_TOKENS * ai_core.CHARS_PER_TOKEN
+    for i, chunk in enumerate(chunks):
+        start, end = chunks.span(i)
+        assert chunk == full_text[start:end]
+        assert 0 < len(chunk) <= max_chars
+    assert [chunks.page(i) for i in range(len(chunks))] == sorted(chunks.page(i) for i in range(len(chunks)))
@@ -0,0 +1,59 @@
+import ai_core
+from document_store import SpanChunks
+
+
+def _sentences(count, word):
+    return " ".join(f"Sentence {n} is about {word} number {n}." for n in range(count))
+
+
+def test_overlapping_neighbours_are_merged_into_one_passage():
+    text = " ".join(_sentences(80, word) for word in ("alpha", "beta", "gamma"))
+    chunks = ai_core.split_text_into_chunks(text)
+    context, chunk_ids, stats = ai_core.assemble_context([(3, 0.2), (2, 0.1)], chunks, max_tokens=10_000)
+
+    assert chunk_ids == [2, 3]
+    assert stats["passages"] == 1
+    # The 200 characters the two chunks share appear only once
+    assert context == text[2 * 1300:3 * 1300 + 1500]
+
+
+def test_span_neighbours_are_one_slice_of_the_text():
+    text = _sentences(120, "delta")
+    chunks = SpanChunks(text, ai_core.split_text_into_spans(text, max_tokens=100))
+    context, chunk_ids, _ = ai_core.assemble_context([(1, 0.3), (2, 0.1), (3, 0.2)], chunks, max_tokens=10_000)
+
+    assert chunk_ids == [1, 2, 3]
+    assert context == text[chunks.span(1)[0]:chunks.span(3)[1]]
+
+
+def test_repeated_passages_are_dropped():
+    chunks = [_sentences(20, "alpha"), _sentences(20, "beta"), _sentences(20, "alpha")]
+    context, chunk_ids, stats = ai_core.assemble_context([(0, 0.1), (2, 0.2)], chunks, max_tokens=10_000)
+
+    assert chunk_ids == [0]
+    assert stats["duplicates_dropped"] == 1
+    assert context == chunks[0]
+
+
+def test_best_passages_fill_the_budget_and_come_back_in_document_order():
+    chunks = [_sentences(10, word) if i % 2 == 0 else "" for i, word in enumerate(
+        ("alpha", "", "gamma", "", "epsilon", "", "eta", "", "iota"))]
+    passage_tokens = ai_core.estimate_tokens(chunks[0])
+    # Room for two passages: the two closest hits win, whatever their position
+    hits = [(0, 0.5), (2, 0.4), (6, 0.2), (8, 0.1)]
+    context, chunk_ids, stats = ai_core.assemble_context(hits, chunks, max_tokens=passage_tokens * 2 + 1,
+                                                         duplicate_threshold=1.0)
+
+    assert chunk_ids == [6, 8]
+    assert context == chunks[6] + "\n\n" + chunks[8]
+    assert stats["over_budget_dropped"] == 2
+    assert stats["context_tokens"] <= passage_tokens * 2 + 1
+
+
+def test_a_passage_longer_than_the_budget_is_cut_to_fit():
+    chunks = [_sentences(200, "alpha")]
+    context, chunk_ids, _ = ai_core.assemble_context([(0, 0.1)], chunks, max_tokens=50)
+
+    assert chunk_ids == [0]
+    assert context == chunks[0][:50 * ai_core.CHARS_PER_TOKEN]
+    assert ai_core.estimate_tokens(context) <= 50
@@ -0,0 +1,64 @@
+import pytest
+
+import ai_core
+import database_utils as db
+import library_index
+import providers
+
+
+@pytest.fixture
+def other_embedder(monkeypatch):
+    """Switches to an embedder with the same dimension as the default one but another name."""
+    def switch():
+        embedder = providers.HashingEmbedder()
+        embedder.name = "other-hashing"
+        monkeypatch.setitem(providers._providers, "embedder", embedder)
+        return embedder
+    return switch
+
+
+@pytest.fixture
+def document(user_id, make_pdf):
+    from file_handler import save_local_file
+    from ingest import ingest_saved_file
+
+    storage_path, content_hash = save_local_file(make_pdf())
+    doc_id = ingest_saved_file(user_id, "paper.pdf", storage_path, "application/pdf", content_hash)
+    return db.get_single_document(doc_id)
+
+
+def test_document_records_its_embedder(document):
+    assert document["embedding_model"] == providers.get_embedder().name
+
+
+def test_query_refuses_index_from_another_embedder(document, other_embedder):
+    other_embedder()
+    with pytest.raises(ValueError, match="different embedding model"):
+        ai_core.embed_query("what is this about?", 768, document["embedding_model"])
+
+
+def test_upload_does_not_share_vectors_from_another_embedder(document, other_embedder):
+    from ingest import ingest_saved_file
+
+    other_embedder()
+    assert db.find_ingested_document(document["content_hash"], "other-hashing") is None
+    doc_id = ingest_saved_file(document["user_id"], "again.pdf", document["storage_path"], "application/pdf",
+                               document["content_hash"])
+    again = db.get_single_document(doc_id)
+    assert again["embedding_model"] == "other-hashing"
+    with db.db_connection() as conn:
+        # The pipeline ran again, so the new document stored its own text
+        assert conn.execute("SELECT 1 FROM document_texts WHERE document_id = ?", (doc_id,)).fetchone()
+
+
+def test_library_is_rebuilt_for_a_new_embedder(document, other_embedder):
+    user_id = document["user_id"]
+    library = library_index.get_library(user_id)
+    assert library.meta["embedding_model"] == document["embedding_model"]
+    assert library_index.search_user_library(user_id, "paper", db.get_documents_by_user(user_id))
+
+    other_embedder()
+    library = library_index.get_library(user_id)
+    assert library.documents == {}
+    # The old document's vectors can't be searched with the new embedder, so it stays out
+    assert library_index.search_user_library(user_id, "paper", db.get_documents_by_user(user_id)) == []
@@ -0,0 +1,68 @@
+import time
+
+import pytest
+
+import ai_core
+
+
+class ApiError(Exception):
+    """Looks like a google.api_core error: an HTTP status in `code`."""
+
+    def __init__(self, code, message):
+        super().__init__(message)
+        self.code = code
+
+
+class StubEmbedder:
+    """Fails the first `failures` calls with `error`, then embeds every text as [1.0]."""
+    name = "stub-failing"
+    remote = True
+
+    def __init__(self, error, failures=None):
+        self.error = error
+        self.failures = failures
+        self.calls = []
+
+    def embed(self, texts, task_type):
+        self.calls.append(len(texts))
+        if self.failures is None or len(self.calls) <= self.failures:
+            raise self.error
+        return [[1.0] for _ in texts]
+
+
+@pytest.fixture
+def embedder(monkeypatch):
+    def install(error, failures=None):
+        stub = StubEmbedder(error, failures)
+        monkeypatch.setattr(ai_core, "get_embedder", lambda: stub)
+        monkeypatch.setattr(ai_core, "EMBED_RETRY_BACKOFF", 0.0)
+        return stub
+    return install
+
+
+def test_permanent_error_fails_fast(embedder):
+    stub = embedder(ApiError(403, "API key not valid"))
+    started_at = time.perf_counter()
+    with pytest.raises(ApiError):
+        ai_core._embed_batch(["one", "two", "three", "four"], "retrieval_document")
+    assert stub.calls == [4]
+    assert time.perf_counter() - started_at < 1.0
+
+
+def test_transient_error_is_retried(embedder):
+    stub = embedder(ApiError(503, "Service unavailable"), failures=2)
+    assert ai_core._embed_batch(["one", "two"], "retrieval_document") == [[1.0], [1.0]]
+    assert stub.calls == [2, 2, 2]
+
+
+def test_transient_error_gives_up_without_splitting(embedder):
+    stub = embedder(ConnectionError("connection reset"))
+    with pytest.raises(ConnectionError):
+        ai_core._embed_batch(["one", "two"], "retrieval_document")
+    assert stub.calls == [2] * (ai_core.EMBED_MAX_RETRIES + 1)
+
+
+def test_oversized_request_is_split(embedder):
+    stub = embedder(ApiError(400, "Request payload size exceeds the limit"), failures=1)
+    assert ai_core._embed_batch(["one", "two", "three", "four"], "retrieval_document") == [[1.0]] * 4
+    assert stub.calls == [4, 2, 2]
@@ -0,0 +1,141 @@
+import database_utils as db
+
+
+def _make_stale(job_id):
+    with db.db_connection() as conn, conn:
+        conn.execute("UPDATE ingest_jobs SET heartbeat_at = datetime('now', '-1 hour') WHERE id = ?", (job_id,))
+
+
+def _job(job_id):
+    with db.db_connection() as conn:
+        return conn.execute("SELECT * FROM ingest_jobs WHERE id = ?", (job_id,)).fetchone()
+
+
+def test_stale_job_is_requeued(user_id):
+    job_id = db.add_ingest_job(user_id, "a.pdf", "user_uploads/a.pdf", "application/pdf", "hash-a")
+    assert db.claim_next_ingest_job("worker-1", 3)["id"] == job_id
+    _make_stale(job_id)
+    assert db.requeue_stale_ingest_jobs(60, 3) == 1
+    assert _job(job_id)["status"] == "queued"
+    assert db.claim_next_ingest_job("worker-2", 3)["id"] == job_id
+
+
+def test_stale_job_out_of_attempts_is_failed(user_id):
+    job_id = db.add_ingest_job(user_id, "a.pdf", "user_uploads/a.pdf", "application/pdf", "hash-a")
+    for attempt in range(2):
+        db.claim_next_ingest_job(f"worker-{attempt}", 2)
+        _make_stale(job_id)
+        db.requeue_stale_ingest_jobs(60, 2)
+    job = _job(job_id)
+    assert job["status"] == "failed"
+    assert job["attempts"] == 2
+    assert job["error"]
+    assert db.claim_next_ingest_job("worker-3", 2) is None
+
+
+def test_rerun_adopts_document_saved_by_dead_attempt(user_id, make_pdf):
+    from file_handler import save_local_file
+    from ingest import ingest_saved_file
+    from job_queue import run_ingest_job
+
+    storage_path, content_hash = save_local_file(make_pdf())
+    job_id = db.add_ingest_job(user_id, "paper.pdf", storage_path, "application/pdf", content_hash)
+    db.claim_next_ingest_job("worker-1", 3)
+    # The worker saves the document, then dies before marking the job finished
+    doc_id = ingest_saved_file(user_id, "paper.pdf", storage_path, "application/pdf", content_hash,
+                               add_to_library=False, job_id=job_id)
+    _make_stale(job_id)
+    db.requeue_stale_ingest_jobs(60, 3)
+
+    run_ingest_job(db.claim_next_ingest_job("worker-2", 3))
+    job = _job(job_id)
+    assert (job["status"], job["document_id"]) == ("done", doc_id)
+    assert [row["id"] for row in db.get_documents_by_user(user_id)] == [doc_id]
+
+
+def test_document_and_text_are_saved_together(user_id, make_pdf):
+    from file_handler import save_local_file
+    from ingest import ingest_saved_file
+
+    storage_path, content_hash = save_local_file(make_pdf())
+    doc_id = ingest_saved_file(user_id, "paper.pdf", storage_path, "application/pdf", content_hash,
+                               add_to_library=False)
+    assert db.get_document_text(doc_id, content_hash) is not None
+
+
+def test_job_waits_for_running_job_with_same_content(user_id):
+    first = db.add_ingest_job(user_id, "a.pdf", "user_uploads/same.pdf", "application/pdf", "same-hash")
+    second = db.add_ingest_job(user_id, "b.pdf", "user_uploads/same.pdf", "application/pdf", "same-hash")
+    other = db.add_ingest_job(user_id, "c.pdf", "user_uploads/other.pdf", "application/pdf", "other-hash")
+    assert db.claim_next_ingest_job("worker-1", 3)["id"] == first
+    assert db.claim_next_ingest_job("worker-2", 3)["id"] == other
+    assert db.claim_next_ingest_job("worker-2", 3) is None
+    db.finish_ingest_job(first, document_id=None)
+    assert db.claim_next_ingest_job("worker-2", 3)["id"] == second
+
+
+def test_duplicate_upload_reuses_result_of_earlier_job(user_id, make_pdf, monkeypatch):
+    import ingest
+    from file_handler import save_local_file
+    from job_queue import run_ingest_job
+
+    storage_path, content_hash = save_local_file(make_pdf())
+    jobs = [db.add_ingest_job(user_id, name, storage_path, "application/pdf", content_hash) for name in ("a.pdf", "b.pdf")]
+    pipeline_runs = []
+    real_ingest_pdf = ingest.ingest_pdf
+    monkeypatch.setattr(ingest, "ingest_pdf", lambda *args, **kwargs: pipeline_runs.append(1) or real_ingest_pdf(*args, **kwargs))
+
+    run_ingest_job(db.claim_next_ingest_job("worker-1", 3))
+    run_ingest_job(db.claim_next_ingest_job("worker-2", 3))
+    first, second = (_job(job_id)["document_id"] for job_id in jobs)
+    assert len(pipeline_runs) == 1
+    assert db.get_single_document(first)["vector_hash"] == db.get_single_document(second)["vector_hash"]
+
+
+def test_permanent_failure_is_not_retried(user_id, monkeypatch):
+    import ingest
+    from job_queue import run_ingest_job
+
+    runs = []
+    def unreadable(*args, **kwargs):
+        runs.append(1)
+        raise RuntimeError("Could not extract any text from the file.")
+    monkeypatch.setattr(ingest, "ingest_saved_file", unreadable)
+    job_id = db.add_ingest_job(user_id, "a.pdf", "user_uploads/a.pdf", "application/pdf", "hash-a")
+
+    while (job := db.claim_next_ingest_job("worker-1", 3)) is not None:
+        run_ingest_job(job)
+    assert len(runs) == 1
+    assert (_job(job_id)["status"], _job(job_id)["attempts"]) == ("failed", 1)
+
+
+def test_transient_failure_is_retried(user_id, monkeypatch):
+    import ingest
+    from job_queue import run_ingest_job
+
+    runs = []
+    def timing_out(*args, **kwargs):
+        runs.append(1)
+        raise TimeoutError("The OCR service did not answer.")
+    monkeypatch.setattr(ingest, "ingest_saved_file", timing_out)
+    job_id = db.add_ingest_job(user_id, "a.pdf", "user_uploads/a.pdf", "application/pdf", "hash-a")
+
+    while (job := db.claim_next_ingest_job("worker-1", 3)) is not None:
+        run_ingest_job(job)
+    assert len(runs) == 3
+    assert _job(job_id)["status"] == "failed"
+
+
+def test_idle_poll_does_not_take_the_write_lock(user_id):
+    import sqlite3
+    import time
+
+    writer = sqlite3.connect(db.DATABASE_NAME)
+    writer.execute("BEGIN IMMEDIATE")
+    try:
+        started = time.perf_counter()
+        assert db.claim_next_ingest_job("worker-1", 3) is None
+        assert time.perf_counter() - started < 1
+    finally:
+        writer.rollback()
+        writer.close()
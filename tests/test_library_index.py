@@ -0,0 +1,34 @@
+import numpy as np
+import pytest
+
+import library_index
+
+
+@pytest.fixture
+def library(scratch_db):
+    library = library_index.LibraryIndex("test")
+    rng = np.random.default_rng(0)
+    for document_id in range(1, 41):
+        library.add_document(document_id, rng.random((5, 16), dtype="float32"), save=False)
+    return library
+
+
+def _documents_found(library, query, **kwargs):
+    return {document_id for document_id, _, _ in library.search(query, **{"k": 50, **kwargs})}
+
+
+@pytest.mark.parametrize("index_type", ["flat", "hnsw"])
+def test_search_only_returns_allowed_documents(library, index_type):
+    library._rebuild(index_type)
+    query = np.full(16, 0.5, dtype="float32")
+    assert _documents_found(library, query, document_ids=[3, 17, 40]) == {3, 17, 40}
+    assert _documents_found(library, query, document_ids=[99]) == set()
+
+
+def test_search_skips_removed_documents(library):
+    query = np.full(16, 0.5, dtype="float32")
+    # Few enough that they stay in the index as tombstones
+    for document_id in range(1, 6):
+        library.remove_document(document_id)
+    assert library.tombstones == {1, 2, 3, 4, 5}
+    assert _documents_found(library, query, k=200) == set(range(6, 41))
@@ -0,0 +1,42 @@
+import itertools
+import sys
+import types
+
+import ai_core
+from benchmarks import stub_services
+from benchmarks.synthetic_pdfs import make_synthetic_pdf
+
+
+def test_scanned_pages_are_ocrd_in_order_with_retries(tmp_path, monkeypatch):
+    pdf_path = str(tmp_path / "scans.pdf")
+    pages = make_synthetic_pdf(pdf_path, pages=8, scanned_fraction=0.6, words_per_page=120, seed=3)
+    assert 0 < pages["scanned_pages"] < 8
+
+    # Every other request to the OCR stub fails with a 503
+    outcomes = itertools.cycle([0.0, 1.0])
+    monkeypatch.setattr(stub_services, "random", types.SimpleNamespace(random=lambda: next(outcomes)))
+    server, base_url = stub_services.start_in_background("ocr", latency=0.2, failure_rate=0.5)
+    monkeypatch.setattr(ai_core, "OCR_SPACE_URL", f"{base_url}/parse/image")
+    monkeypatch.setattr(ai_core, "OCR_MAX_RETRIES", 10)
+    monkeypatch.setattr(ai_core, "OCR_RETRY_BACKOFF", 0)
+    # Under Streamlit, __main__ is the page script being run; the render processes must not run it
+    page_script = tmp_path / "page.py"
+    page_script.write_text(f"open({str(tmp_path / 'page_ran')!r}, 'w').close()\nraise SystemExit(1)\n")
+    streamlit_main = types.ModuleType("__main__")
+    streamlit_main.__file__ = str(page_script)
+    monkeypatch.setitem(sys.modules, "__main__", streamlit_main)
+    try:
+        results = list(ai_core.iter_pdf_pages(pdf_path, concurrency=3, render_processes=2, backend="ocr_space"))
+    finally:
+        server.shutdown()
+    stats = server.RequestHandlerClass.stats
+
+    assert not (tmp_path / "page_ran").exists()
+    assert sys.modules["__main__"] is streamlit_main
+    assert [page_index for page_index, _, _ in results] == list(range(8))
+    assert [error for _, _, error in results] == [None] * 8
+    ocr_pages = [text for _, text, _ in results if text.startswith("Stub OCR text")]
+    assert len(ocr_pages) == pages["scanned_pages"]
+    # Each failed request was retried for its own page
+    assert stats["requests"] > pages["scanned_pages"]
+    assert 1 < stats["max_in_flight"] <= 3
@@ -0,0 +1,135 @@
+import hashlib
+import io
+import os
+
+import database_utils as db
+import document_store
+from file_handler import ensure_saved, save_uploaded_file
+
+
+class Upload(io.BytesIO):
+    """Stands in for a Streamlit UploadedFile."""
+
+    def __init__(self, data, name):
+        super().__init__(data)
+        self.name = name
+
+
+def _add_document(user_id, storage_path, content_hash):
+    with db.db_connection() as conn, conn:
+        return conn.execute(
+            "INSERT INTO documents (user_id, original_filename, storage_path, content_hash) VALUES (?, ?, ?, ?)",
+            (user_id, "paper.pdf", storage_path, content_hash)
+        ).lastrowid
+
+
+def test_same_content_is_stored_once(scratch_db):
+    first = save_uploaded_file(Upload(b"same bytes", "a.pdf"))
+    second = save_uploaded_file(Upload(b"same bytes", "b.pdf"))
+    assert first == second
+    assert sorted(os.listdir("user_uploads")) == [os.path.basename(first[0])]
+
+
+def test_upload_survives_delete_of_last_document_using_its_file(user_id):
+    upload = Upload(b"shared bytes", "a.pdf")
+    storage_path, content_hash = save_uploaded_file(upload)
+    doc_id = _add_document(user_id, storage_path, content_hash)
+
+    # The same file is uploaded again, and the only document using it is deleted
+    # before the new upload's job is recorded
+    assert save_uploaded_file(upload) == (storage_path, content_hash)
+    assert document_store.remove_document(doc_id)
+    assert not os.path.exists(storage_path)
+
+    db.add_ingest_job(user_id, "a.pdf", storage_path, "application/pdf", content_hash)
+    ensure_saved(storage_path, lambda: save_uploaded_file(upload))
+    assert os.path.exists(storage_path)
+
+
+def test_file_of_queued_job_is_kept(user_id):
+    storage_path, content_hash = save_uploaded_file(Upload(b"queued bytes", "a.pdf"))
+    doc_id = _add_document(user_id, storage_path, content_hash)
+    db.add_ingest_job(user_id, "a.pdf", storage_path, "application/pdf", content_hash)
+    assert db.delete_document(doc_id)["storage_path"] is None
+    assert os.path.exists(storage_path)
+
+
+def test_shared_document_outlives_the_one_it_copied(user_id, make_pdf):
+    from file_handler import save_local_file
+    from ingest import ingest_saved_file
+    from vector_store import vector_path
+
+    storage_path, content_hash = save_local_file(make_pdf())
+    first = ingest_saved_file(user_id, "first.pdf", storage_path, "application/pdf", content_hash, add_to_library=False)
+    second = ingest_saved_file(user_id, "second.pdf", storage_path, "application/pdf", content_hash, add_to_library=False)
+    vector_hash = db.get_single_document(first)["vector_hash"]
+    assert db.get_single_document(second)["vector_hash"] == vector_hash
+
+    # Deleting the first hands its stored text to the second and keeps the shared data
+    assert document_store.remove_document(first)
+    assert db.get_document_text(second, content_hash) is not None
+    assert os.path.exists(storage_path)
+    assert os.path.exists(vector_path(vector_hash))
+
+    # Deleting the last one releases everything
+    assert document_store.remove_document(second)
+    assert not os.path.exists(storage_path)
+    assert not os.path.exists(vector_path(vector_hash))
+    with db.db_connection() as conn:
+        assert conn.execute("SELECT COUNT(*) FROM document_texts").fetchone()[0] == 0
+
+
+def test_upgrade_lets_old_databases_share_storage_paths(tmp_path, monkeypatch):
+    import sqlite3
+    from upgrade_database import upgrade
+
+    monkeypatch.chdir(tmp_path)
+    database_name = str(tmp_path / "old.db")
+    conn = sqlite3.connect(database_name)
+    # The schema before uploads were stored by content hash
+    conn.executescript('''
+        CREATE TABLE users (id INTEGER PRIMARY KEY AUTOINCREMENT, username TEXT NOT NULL UNIQUE,
+                            password_hash TEXT NOT NULL, created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP);
+        CREATE TABLE documents (id INTEGER PRIMARY KEY AUTOINCREMENT, user_id INTEGER NOT NULL,
+                                original_filename TEXT NOT NULL, storage_path TEXT NOT NULL UNIQUE,
+                                uploaded_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                                FOREIGN KEY (user_id) REFERENCES users (id));
+        CREATE TABLE messages (id INTEGER PRIMARY KEY AUTOINCREMENT, document_id INTEGER NOT NULL,
+                               role TEXT NOT NULL, content TEXT NOT NULL, timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                               FOREIGN KEY (document_id) REFERENCES documents (id));
+        INSERT INTO users (username, password_hash) VALUES ('tester', 'x');
+        INSERT INTO documents (user_id, original_filename, storage_path) VALUES (1, 'a.pdf', 'user_uploads/a.pdf');
+        INSERT INTO documents (user_id, original_filename, storage_path) VALUES (1, 'b.pdf', 'user_uploads/b.pdf');
+        INSERT INTO documents (user_id, original_filename, storage_path) VALUES (1, 'c.pdf', 'user_uploads/c.pdf');
+        DELETE FROM documents WHERE id = 3;
+    ''')
+    conn.commit()
+    conn.close()
+
+    upgrade(database_name)
+    upgrade(database_name)
+
+    conn = sqlite3.connect(database_name)
+    assert conn.execute("SELECT id, original_filename FROM documents ORDER BY id").fetchall() == [(1, "a.pdf"), (2, "b.pdf")]
+    conn.execute("INSERT INTO documents (user_id, original_filename, storage_path) VALUES (1, 'copy.pdf', 'user_uploads/a.pdf')")
+    # The id of the deleted document is not handed out again
+    assert conn.execute("SELECT MAX(id) FROM documents").fetchone()[0] == 4
+    indexes = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = 'documents'")}
+    assert {"idx_documents_user_uploaded", "idx_documents_content_hash", "idx_documents_storage_path"} <= indexes
+    conn.close()
+
+
+def test_vectors_of_a_document_that_failed_to_save_are_removed(user_id):
+    from vector_store import vector_path
+
+    index_bytes = b"not really a faiss index"
+    vector_hash = hashlib.sha256(index_bytes).hexdigest()
+    # A text pair that can't be stored makes the insert fail after the vectors were written
+    assert db.add_document(user_id, "a.pdf", "user_uploads/a.pdf", index_bytes, "hash-a", text_blobs=(b"text",)) is None
+    assert not os.path.exists(vector_path(vector_hash))
+
+    # Vectors another document already uses are left in place
+    doc_id = db.add_document(user_id, "a.pdf", "user_uploads/a.pdf", index_bytes, "hash-a")
+    assert db.add_document(user_id, "b.pdf", "user_uploads/a.pdf", index_bytes, "hash-a", text_blobs=(b"text",)) is None
+    assert os.path.exists(vector_path(vector_hash))
+    assert [row["id"] for row in db.get_documents_by_user(user_id)] == [doc_id]
@@ -0,0 +1,38 @@
+import threading
+
+import database_utils
+import tracing
+
+
+def test_spans_are_written_off_the_request_thread(scratch_db, monkeypatch):
+    monkeypatch.setattr(tracing, "TRACING_ENABLED", True)
+    monkeypatch.setattr(tracing, "TRACE_FLUSH_BATCH", 2)
+    written = threading.Event()
+    writers = []
+
+    def add_trace_spans(rows, max_rows):
+        writers.append(threading.current_thread().name)
+        written.set()
+    monkeypatch.setattr(database_utils, "add_trace_spans", add_trace_spans)
+
+    with tracing.request("chat_turn"):
+        with tracing.span("faiss.search"):
+            pass
+    assert written.wait(5)
+    assert writers == ["trace-flusher"]
+
+
+def test_dashboard_is_closed_until_admins_are_set(scratch_db, monkeypatch):
+    from streamlit.testing.v1 import AppTest
+
+    monkeypatch.delenv("ADMIN_USERNAMES", raising=False)
+    app = AppTest.from_file("../pages/6_Latency_Dashboard.py")
+    app.session_state["username"] = "tester"
+    app.run()
+    assert "only available to administrators" in app.error[0].value
+
+    monkeypatch.setenv("ADMIN_USERNAMES", "tester")
+    app = AppTest.from_file("../pages/6_Latency_Dashboard.py")
+    app.session_state["username"] = "tester"
+    app.run()
+    assert not app.error
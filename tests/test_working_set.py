@@ -0,0 +1,34 @@
+from working_set import MemoryBudgetLRU
+
+
+def test_least_recently_used_entries_are_evicted_past_the_budget():
+    cache = MemoryBudgetLRU(max_bytes=300)
+    for key in "abc":
+        cache.put(key, key.upper(), 100)
+    assert cache.get("a") == "A"  # "a" is now the most recently used
+
+    cache.put("d", "D", 100)
+    assert cache.get("b") is None
+    assert [cache.get(key) for key in "acd"] == ["A", "C", "D"]
+
+    cache.put("e", "E", 250)
+    assert [cache.get(key) for key in "acde"] == [None, None, None, "E"]
+    stats = cache.stats()
+    assert (stats["entries"], stats["bytes"], stats["evictions"]) == (1, 250, 4)
+    assert stats["bytes"] <= stats["max_bytes"]
+
+
+def test_value_bigger_than_the_budget_is_not_kept():
+    cache = MemoryBudgetLRU(max_bytes=100)
+    cache.put("a", "A", 60)
+    cache.put("huge", "H", 101)
+    assert cache.get("huge") is None
+    assert cache.get("a") == "A"
+
+
+def test_replacing_an_entry_keeps_the_byte_count():
+    cache = MemoryBudgetLRU(max_bytes=100)
+    cache.put("a", "A", 60)
+    cache.put("a", "A2", 30)
+    assert cache.stats()["bytes"] == 30
+    assert cache.get("a") == "A2"
@@ -0,0 +1,179 @@
+import atexit
+import contextvars
+import functools
+import json
+import threading
+import time
+import uuid
+from collections import deque
+from contextlib import contextmanager
+from settings import get_setting
+
+# --- Settings ---
+# With tracing off, span() hands out one shared no-op object and records nothing
+TRACING_ENABLED = get_setting("TRACING_ENABLED", True)
+# Most recent spans kept in memory by this process
+TRACE_BUFFER_SIZE = get_setting("TRACE_BUFFER_SIZE", 5000)
+# Finished spans are written to the trace_spans table in batches, by a background thread
+TRACE_FLUSH_BATCH = get_setting("TRACE_FLUSH_BATCH", 200)
+TRACE_FLUSH_SECONDS = get_setting("TRACE_FLUSH_SECONDS", 10.0)
+# The table is trimmed to about this many rows
+TRACE_MAX_ROWS = get_setting("TRACE_MAX_ROWS", 200000)
+
+recent_spans = deque(maxlen=TRACE_BUFFER_SIZE)
+_pending = []
+_lock = threading.Lock()
+_flush_wanted = threading.Event()
+_flusher = None
+# The request (chat turn, upload, ...) the current code runs for
+_current_request = contextvars.ContextVar("trace_request", default=None)
+
+
+class Span:
+    """
+    One timed stage. Attributes (bytes, pages, chunks, cache hits...) can be
+    added while it runs with span.set(name=value).
+    """
+    __slots__ = ("stage", "request_id", "is_request", "started_at", "attributes")
+
+    def __init__(self, stage, request_id, is_request, attributes):
+        self.stage = stage
+        self.request_id = request_id
+        self.is_request = is_request
+        self.started_at = time.time()
+        self.attributes = attributes
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+
+class _NoopSpan:
+    __slots__ = ()
+
+    def set(self, **attributes):
+        pass
+
+_NOOP_SPAN = _NoopSpan()
+
+
+@contextmanager
+def span(stage, **attributes):
+    """
+    Times the code in the `with` block as `stage`:
+        with span("faiss.search", k=5) as s:
+            ...
+            s.set(hits=len(ids))
+    An exception is recorded as the span's "error" attribute and re-raised.
+    """
+    if not TRACING_ENABLED:
+        yield _NOOP_SPAN
+        return
+    current = Span(stage, _current_request.get(), False, attributes)
+    started = time.perf_counter()
+    try:
+        yield current
+    except BaseException as e:
+        current.attributes["error"] = type(e).__name__
+        raise
+    finally:
+        _record(current, time.perf_counter() - started)
+
+@contextmanager
+def request(name, **attributes):
+    """
+    Marks a whole user-facing request (a chat turn, an upload). Spans started
+    inside it on the same thread are grouped under it on the dashboard.
+    """
+    if not TRACING_ENABLED:
+        yield _NOOP_SPAN
+        return
+    token = _current_request.set(uuid.uuid4().hex[:12])
+    try:
+        with span(name, **attributes) as current:
+            current.is_request = True
+            yield current
+    finally:
+        _current_request.reset(token)
+
+def traced(stage=None):
+    """
+    Decorator form of span(); the stage defaults to the function's name.
+    """
+    def decorate(function):
+        name = stage or function.__name__
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not TRACING_ENABLED:
+                return function(*args, **kwargs)
+            with span(name):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorate
+
+def in_request(function):
+    """
+    Wraps `function` to run under the current request, for handing work to a
+    thread pool: pool.submit(in_request(work), ...). Spans started in the worker
+    are then grouped with the request that queued the work.
+    """
+    request_id = _current_request.get()
+    if request_id is None:
+        return function
+
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        token = _current_request.set(request_id)
+        try:
+            return function(*args, **kwargs)
+        finally:
+            _current_request.reset(token)
+    return wrapper
+
+def _record(current, duration):
+    record = {
+        "request_id": current.request_id,
+        "stage": current.stage,
+        "is_request": current.is_request,
+        "started_at": current.started_at,
+        "duration_ms": duration * 1000,
+        "attributes": current.attributes,
+    }
+    global _flusher
+    with _lock:
+        recent_spans.append(record)
+        _pending.append(record)
+        full = len(_pending) >= TRACE_FLUSH_BATCH
+        # The database write never happens on the request's own thread
+        if _flusher is None:
+            _flusher = threading.Thread(target=_flush_loop, name="trace-flusher", daemon=True)
+            _flusher.start()
+            atexit.register(flush)
+    if full:
+        _flush_wanted.set()
+
+def _flush_loop():
+    while True:
+        _flush_wanted.wait(TRACE_FLUSH_SECONDS)
+        _flush_wanted.clear()
+        try:
+            flush()
+        except Exception as e:
+            print(f"Could not write trace spans: {e}")
+
+def flush():
+    """
+    Writes the spans not yet stored to the trace_spans table. The background
+    thread calls this every TRACE_FLUSH_SECONDS, or sooner once
+    TRACE_FLUSH_BATCH spans are waiting, and once more at exit. Processes that
+    end without running exit handlers (pool workers) call it themselves.
+    """
+    with _lock:
+        batch = _pending[:]
+        _pending.clear()
+    if not batch:
+        return
+    # Imported here: database_utils is itself traced
+    from database_utils import add_trace_spans
+    add_trace_spans([(r["request_id"], r["stage"], int(r["is_request"]), r["started_at"], r["duration_ms"],
+                      json.dumps(r["attributes"], default=str)) for r in batch], TRACE_MAX_ROWS)
@@ -1,23 +1,206 @@
 import sqlite3
+from vector_store import save_index_bytes
 DATABASE_NAME = 'thesis_database.db'
 
-def upgrade():
-    print("Connecting to database to add 'faiss_index' column...")
-    conn = sqlite3.connect(DATABASE_NAME)
-    cursor = conn.cursor()
+def add_column(cursor, table, column_name, column_definition):
+    """
+    Adds a column to a table, skipping it quietly if it is already there.
+    """
     try:
-        # Add a new column to the documents table to store the binary FAISS index
-        cursor.execute("ALTER TABLE documents ADD COLUMN faiss_index BLOB")
-        print("Successfully added 'faiss_index' column to 'documents' table.")
+        cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column_name} {column_definition}")
+        print(f"Successfully added '{column_name}' column to '{table}' table.")
     except sqlite3.OperationalError as e:
         # This error happens if the column already exists, which is okay.
         if "duplicate column name" in str(e):
-            print("Column 'faiss_index' already exists. No changes needed.")
+            print(f"Column '{column_name}' already exists. No changes needed.")
         else:
             raise e # Re-raise other operational errors
+
+def allow_shared_storage_paths(cursor):
+    """
+    Drops the UNIQUE constraint on documents.storage_path. SQLite can't alter a
+    constraint, so the table is rebuilt with the same columns and data.
+    """
+    cursor.execute("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'documents'")
+    table_sql = cursor.fetchone()[0]
+    if "storage_path TEXT NOT NULL UNIQUE" not in table_sql:
+        print("Documents can already share storage paths. No changes needed.")
+        return
+    cursor.execute("PRAGMA table_info(documents)")
+    columns = ", ".join(row[1] for row in cursor.fetchall())
+    rebuilt_sql = table_sql.replace("storage_path TEXT NOT NULL UNIQUE", "storage_path TEXT NOT NULL", 1)
+    rebuilt_sql = rebuilt_sql.replace("CREATE TABLE documents", "CREATE TABLE documents_rebuilt", 1)
+    # Ids of deleted documents must never be handed out again
+    cursor.execute("SELECT seq FROM sqlite_sequence WHERE name = 'documents'")
+    row = cursor.fetchone()
+    cursor.execute(rebuilt_sql)
+    cursor.execute(f"INSERT INTO documents_rebuilt ({columns}) SELECT {columns} FROM documents")
+    cursor.execute("DROP TABLE documents")
+    cursor.execute("ALTER TABLE documents_rebuilt RENAME TO documents")
+    if row:
+        cursor.execute("UPDATE sqlite_sequence SET seq = MAX(seq, ?) WHERE name = 'documents'", (row[0],))
+        if cursor.rowcount == 0:
+            cursor.execute("INSERT INTO sqlite_sequence (name, seq) VALUES ('documents', ?)", (row[0],))
+    # Dropping the table dropped its indexes too
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_documents_user_uploaded ON documents (user_id, uploaded_at)")
+    print("Rebuilt 'documents' so documents can share a stored file.")
+
+def upgrade(database_name=DATABASE_NAME):
+    print("Connecting to database to apply upgrades...")
+    conn = sqlite3.connect(database_name)
+    cursor = conn.cursor()
+    try:
+        # Add a new column to the documents table to store the binary FAISS index
+        add_column(cursor, "documents", "faiss_index", "BLOB")
+
+        # Hash of the uploaded file, so cached text can be matched to the exact content
+        add_column(cursor, "documents", "content_hash", "TEXT")
+
+        # Extracted text and chunks, compressed, so pages never have to re-read the PDF
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS document_texts (
+                document_id INTEGER NOT NULL,
+                content_hash TEXT NOT NULL,
+                full_text BLOB NOT NULL,
+                chunks BLOB NOT NULL,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                PRIMARY KEY (document_id, content_hash),
+                FOREIGN KEY (document_id) REFERENCES documents (id)
+            )
+        ''')
+        print("Table 'document_texts' is ready.")
+
+        # Chunk embeddings, so the same text is never paid for twice
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS embedding_cache (
+                model TEXT NOT NULL,
+                task_type TEXT NOT NULL,
+                text_hash TEXT NOT NULL,
+                embedding BLOB NOT NULL,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                PRIMARY KEY (model, task_type, text_hash)
+            )
+        ''')
+        print("Table 'embedding_cache' is ready.")
+        # Summaries of document sections, so a re-run only pays for sections that changed
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS section_summaries (
+                model TEXT NOT NULL,
+                prompt_version INTEGER NOT NULL,
+                section_hash TEXT NOT NULL,
+                summary TEXT NOT NULL,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                PRIMARY KEY (model, prompt_version, section_hash)
+            )
+        ''')
+        print("Table 'section_summaries' is ready.")
+        # Generated insights and audio summaries, shared by every process and replica
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS artifacts (
+                content_hash TEXT NOT NULL,
+                artifact_type TEXT NOT NULL,
+                prompt_version INTEGER NOT NULL,
+                model TEXT NOT NULL,
+                payload TEXT NOT NULL,
+                file_path TEXT,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                PRIMARY KEY (content_hash, artifact_type, prompt_version, model)
+            )
+        ''')
+        print("Table 'artifacts' is ready.")
+        # Uploads waiting for, or being processed by, the background ingest workers
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS ingest_jobs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                user_id INTEGER NOT NULL,
+                original_filename TEXT NOT NULL,
+                storage_path TEXT NOT NULL,
+                file_type TEXT NOT NULL,
+                content_hash TEXT,
+                status TEXT NOT NULL DEFAULT 'queued', -- queued, running, done or failed
+                stage TEXT,
+                pages_total INTEGER DEFAULT 0,
+                pages_read INTEGER DEFAULT 0,
+                pages_rendered INTEGER DEFAULT 0,
+                pages_ocrd INTEGER DEFAULT 0,
+                chunks_embedded INTEGER DEFAULT 0,
+                attempts INTEGER DEFAULT 0,
+                worker_id TEXT,
+                heartbeat_at TIMESTAMP,
+                document_id INTEGER,
+                error TEXT,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                FOREIGN KEY (user_id) REFERENCES users (id)
+            )
+        ''')
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_ingest_jobs_status ON ingest_jobs (status, id)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_ingest_jobs_user ON ingest_jobs (user_id, id)")
+        print("Table 'ingest_jobs' is ready.")
+
+        # Per-stage timings from tracing.py, read by the latency dashboard
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS trace_spans (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                request_id TEXT,
+                stage TEXT NOT NULL,
+                is_request INTEGER DEFAULT 0,
+                started_at REAL NOT NULL,
+                duration_ms REAL NOT NULL,
+                attributes TEXT
+            )
+        ''')
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_trace_spans_started ON trace_spans (started_at)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_trace_spans_request ON trace_spans (request_id)")
+        print("Table 'trace_spans' is ready.")
+
+        # Per-file checkpoints of bulk_ingest.py, so an interrupted run picks up where it stopped
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS bulk_ingest_files (
+                user_id INTEGER NOT NULL,
+                source_path TEXT NOT NULL,
+                size INTEGER,
+                modified_at REAL,
+                status TEXT NOT NULL, -- 'done' or 'failed'
+                document_id INTEGER,
+                pages INTEGER DEFAULT 0,
+                error TEXT,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                PRIMARY KEY (user_id, source_path),
+                FOREIGN KEY (user_id) REFERENCES users (id)
+            )
+        ''')
+        print("Table 'bulk_ingest_files' is ready.")
+
+        # Vectors move out of the documents table into the memory-mapped vector store
+        add_column(cursor, "documents", "vector_hash", "TEXT")
+        cursor.execute("SELECT id FROM documents WHERE faiss_index IS NOT NULL AND vector_hash IS NULL")
+        doc_ids = [row[0] for row in cursor.fetchall()]
+        for doc_id in doc_ids:
+            # One row at a time, so only one index is ever in memory
+            cursor.execute("SELECT faiss_index FROM documents WHERE id = ?", (doc_id,))
+            vector_hash = save_index_bytes(cursor.fetchone()[0])
+            cursor.execute("UPDATE documents SET vector_hash = ?, faiss_index = NULL WHERE id = ?", (vector_hash, doc_id))
+        print(f"Moved {len(doc_ids)} document index(es) to the vector store.")
+
+        # How each document's vectors are encoded (see vector_store.INDEX_TYPES); NULL = flat
+        add_column(cursor, "documents", "index_type", "TEXT")
+
+        # Name of the embedder that made each document's vectors; NULL = not recorded
+        add_column(cursor, "documents", "embedding_model", "TEXT")
+
+        # Uploads are stored under their content hash, so several documents can point
+        # at the same file and share its text and vectors
+        allow_shared_storage_paths(cursor)
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_documents_content_hash ON documents (content_hash)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_documents_storage_path ON documents (storage_path)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_document_texts_content_hash ON document_texts (content_hash)")
+        conn.commit()
+        if doc_ids:
+            # Give the space the old BLOBs used back to the file system
+            cursor.execute("VACUUM")
     finally:
         conn.close()
         print("Database connection closed.")
 
 if __name__ == '__main__':
-    upgrade()
\ No newline at end of file
+    upgrade()
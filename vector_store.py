@@ -0,0 +1,143 @@
+import hashlib
+import os
+import numpy as np
+from settings import get_setting
+
+# Serialized FAISS indexes live here, one file per distinct index, named by content hash
+VECTOR_STORE_DIR = "vector_store"
+
+# --- Index types ---
+# A document's vectors are encoded according to how many there are: exact float32
+# while small, scalar-quantized codes (fp16 = 2 bytes, int8 = 1 byte per dimension)
+# for medium documents, and product quantization for very large ones.
+VECTOR_FLAT_MAX_VECTORS = get_setting("VECTOR_FLAT_MAX_VECTORS", 500)
+VECTOR_SQ_MAX_VECTORS = get_setting("VECTOR_SQ_MAX_VECTORS", 50000)
+# "fp16" or "int8"
+VECTOR_SQ_TYPE = get_setting("VECTOR_SQ_TYPE", "int8")
+# PQ code size; rounded down to a divisor of the dimension
+VECTOR_PQ_BYTES = get_setting("VECTOR_PQ_BYTES", 64)
+# Optionally re-rank PQ candidates with 4-bit scalar codes. That adds dimension / 2
+# bytes per vector, so even with them a large document stays smaller than as sq_int8.
+VECTOR_PQ_RERANK = get_setting("VECTOR_PQ_RERANK", False)
+VECTOR_RERANK_K_FACTOR = get_setting("VECTOR_RERANK_K_FACTOR", 4)
+# PQ codebooks are trained on at most this many vectors
+VECTOR_PQ_TRAIN_SAMPLE = 16384
+
+INDEX_TYPES = ("flat", "sq_fp16", "sq_int8", "pq", "pq_rerank")
+
+os.makedirs(VECTOR_STORE_DIR, exist_ok=True)
+
+def vector_path(vector_hash):
+    # Two-character fan-out keeps any one directory from growing huge
+    return os.path.join(VECTOR_STORE_DIR, vector_hash[:2], f"{vector_hash}.faiss")
+
+def save_index_bytes(faiss_index_data):
+    """
+    Stores a serialized index and returns its content hash.
+    Identical indexes are stored once.
+    """
+    vector_hash = hashlib.sha256(faiss_index_data).hexdigest()
+    path = vector_path(vector_hash)
+    if not os.path.exists(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        with open(temp_path, "wb") as f:
+            f.write(faiss_index_data)
+        os.replace(temp_path, path)
+    return vector_hash
+
+def load_index(vector_hash, index_type=None):
+    """
+    Opens a stored index memory-mapped and read-only: the vectors are paged in by
+    the OS on demand instead of being copied into Python memory.
+    `index_type` is the type recorded for the document (None for older, flat ones).
+    """
+    import faiss
+    # Older FAISS builds only know the generic mmap flag
+    mmap_flag = getattr(faiss, "IO_FLAG_MMAP_IFC", faiss.IO_FLAG_MMAP)
+    index = faiss.read_index(vector_path(vector_hash), mmap_flag | faiss.IO_FLAG_READ_ONLY)
+    return configure_index(index, index_type or "flat")
+
+def choose_vector_index_type(vector_count):
+    if vector_count <= VECTOR_FLAT_MAX_VECTORS:
+        return "flat"
+    if vector_count <= VECTOR_SQ_MAX_VECTORS:
+        return f"sq_{VECTOR_SQ_TYPE}"
+    return "pq_rerank" if VECTOR_PQ_RERANK else "pq"
+
+def _factory_string(index_type, dimension):
+    if index_type == "flat":
+        return "Flat"
+    if index_type == "sq_fp16":
+        return "SQfp16"
+    if index_type == "sq_int8":
+        return "SQ8"
+    pq_bytes = max(m for m in range(1, min(VECTOR_PQ_BYTES, dimension) + 1) if dimension % m == 0)
+    return f"PQ{pq_bytes}x8,Refine(SQ4)" if index_type == "pq_rerank" else f"PQ{pq_bytes}x8"
+
+def build_vector_index(vectors, index_type=None):
+    """
+    Builds a document index over `vectors` (float32, one row per chunk, row i is
+    chunk i), encoded as `index_type` or as choose_vector_index_type picks for
+    its size. Returns (index, index_type).
+    """
+    import faiss
+    vectors = np.ascontiguousarray(vectors, dtype='float32')
+    index_type = index_type or choose_vector_index_type(len(vectors))
+    index = faiss.index_factory(vectors.shape[1], _factory_string(index_type, vectors.shape[1]))
+    if not index.is_trained:
+        sample = vectors
+        if len(vectors) > VECTOR_PQ_TRAIN_SAMPLE:
+            rows = np.random.default_rng(0).choice(len(vectors), VECTOR_PQ_TRAIN_SAMPLE, replace=False)
+            sample = vectors[np.sort(rows)]
+        index.train(sample)
+    index.add(vectors)
+    configure_index(index, index_type)
+    return index, index_type
+
+def configure_index(index, index_type):
+    """
+    Applies the search-time settings an index type needs; they are not all
+    kept in the serialized index. Returns the index.
+    """
+    import faiss
+    if index_type == "pq_rerank":
+        faiss.downcast_index(index).k_factor = VECTOR_RERANK_K_FACTOR
+    return index
+
+def read_index_bytes(vector_hash):
+    with open(vector_path(vector_hash), "rb") as f:
+        return f.read()
+
+def delete_index(vector_hash):
+    """
+    Removes a stored index. Indexes are shared by content, so only call this
+    once no document uses it (see database_utils.delete_document).
+    """
+    try:
+        os.remove(vector_path(vector_hash))
+    except FileNotFoundError:
+        pass
+
+def index_size(vector_hash):
+    return os.path.getsize(vector_path(vector_hash))
+
+def ensure_vector_hash(doc_info):
+    """
+    Returns the document's vector hash, first moving its index out of the
+    database row if it was uploaded before the vector store existed.
+    Returns None if the document has no index at all.
+    """
+    if doc_info.get('vector_hash'):
+        return doc_info['vector_hash']
+    from database_utils import get_document_faiss_blob, get_single_document, set_document_vector_hash
+    faiss_index_data = get_document_faiss_blob(doc_info['id'])
+    if faiss_index_data:
+        vector_hash = save_index_bytes(faiss_index_data)
+        set_document_vector_hash(doc_info['id'], vector_hash)
+    else:
+        # Another session may have moved it since this row was read
+        document = get_single_document(doc_info['id'])
+        vector_hash = document['vector_hash'] if document else None
+    doc_info['vector_hash'] = vector_hash
+    return vector_hash
@@ -0,0 +1,138 @@
+import sys
+import threading
+import time
+from collections import OrderedDict
+from settings import get_setting
+
+# How much memory the process may spend keeping documents ready to search
+WORKING_SET_MAX_MB = get_setting("WORKING_SET_MAX_MB", 512)
+
+class MemoryBudgetLRU:
+    """
+    A thread-safe least-recently-used cache that evicts by total size in bytes
+    rather than by number of entries. Callers say how big each value is.
+    With `ttl_seconds`, entries also expire that long after they were stored.
+    Keeps hit/miss/eviction counters for the debug panel.
+    """
+
+    def __init__(self, max_bytes, ttl_seconds=None):
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()  # key -> (value, size_bytes, expires_at)
+        self._lock = threading.Lock()
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        with self._lock:
+            if key in self._entries:
+                value, size_bytes, expires_at = self._entries[key]
+                if expires_at is None or expires_at > time.monotonic():
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._entries[key]
+                self.current_bytes -= size_bytes
+            self.misses += 1
+            return None
+
+    def peek(self, key):
+        """
+        Returns the value for `key`, or None, without counting a hit or a miss
+        and without refreshing its position. For callers updating an entry.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or (entry[2] is not None and entry[2] <= time.monotonic()):
+                return None
+            return entry[0]
+
+    def put(self, key, value, size_bytes):
+        with self._lock:
+            if key in self._entries:
+                self.current_bytes -= self._entries.pop(key)[1]
+            # Something bigger than the whole budget is used once and not kept
+            if size_bytes > self.max_bytes:
+                return
+            expires_at = time.monotonic() + self.ttl_seconds if self.ttl_seconds else None
+            self._entries[key] = (value, size_bytes, expires_at)
+            self.current_bytes += size_bytes
+            while self.current_bytes > self.max_bytes:
+                _, (_, evicted_size, _) = self._entries.popitem(last=False)
+                self.current_bytes -= evicted_size
+                self.evictions += 1
+
+    def invalidate(self, match):
+        """
+        Drops every entry whose key makes `match(key)` true. Returns how many were dropped.
+        """
+        with self._lock:
+            stale = [key for key in self._entries if match(key)]
+            for key in stale:
+                self.current_bytes -= self._entries.pop(key)[1]
+            return len(stale)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self.current_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+            }
+
+# One cache for the whole process, shared by every browser session
+document_cache = MemoryBudgetLRU(WORKING_SET_MAX_MB * 1024 * 1024)
+
+def document_key(doc_info):
+    # The version changes when the content does, so an old entry can never be served
+    return doc_info['id'], doc_info.get('content_hash') or doc_info.get('uploaded_at')
+
+def _chunks_size(chunks):
+    if hasattr(chunks, "spans"):  # SpanChunks: the text plus an offsets array
+        return sys.getsizeof(chunks.full_text) + chunks.spans.nbytes
+    return sys.getsizeof(chunks) + sum(sys.getsizeof(chunk) for chunk in chunks)
+
+def get_document_working_set(doc_info):
+    """
+    Returns {"index": faiss index, "chunks": list of chunk texts, "embedding_model":
+    name of the embedder that built the index (None if not recorded)} for a document row,
+    ready to search. The first call memory-maps the index from the vector store and
+    loads the stored chunks; later calls, from any session, are a dictionary lookup.
+    Returns None if the document has no index or text.
+    """
+    key = document_key(doc_info)
+    entry = document_cache.get(key)
+    if entry is not None:
+        return entry
+
+    # Imported here so importing this module stays cheap
+    from document_store import load_document_text
+    from vector_store import ensure_vector_hash, load_index, index_size
+
+    vector_hash = ensure_vector_hash(doc_info)
+    if not vector_hash:
+        return None
+    _, chunks = load_document_text(doc_info)
+    if not chunks:
+        return None
+    entry = {"index": load_index(vector_hash, doc_info.get('index_type')), "chunks": chunks,
+             "embedding_model": doc_info.get('embedding_model')}
+    # The index is memory-mapped, so its file size is an upper bound on what it can pin
+    document_cache.put(key, entry, index_size(vector_hash) + _chunks_size(chunks))
+    return entry
+
+def invalidate_document(document_id):
+    """
+    Forgets every cached version of a document, and its cached chat answers,
+    e.g. after it is re-processed or deleted.
+    """
+    from chat_cache import invalidate_document_answers
+    invalidate_document_answers(document_id)
+    return document_cache.invalidate(lambda key: key[0] == document_id)